@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+# --------------------
+# MIRROR BLEED BENCHMARK
+# Times the pixel region and clipboard engines of the Mirror Bleed plugin on the synthetic page from bench_plugins,
+# using the GIMP stand-in in benchmarks/standin, and checks that both engines produce the same layers
+# The stand-in's pixel operations are much slower than GIMP's, so compare the engines with each other, not with GIMP
+# Usage: python benchmarks/bench_mirror_bleed.py [bench_plugins options]
+# --------------------
+
+from __future__ import print_function
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "standin"))
+import gimp
+import bench_plugins
+import benchutil
+
+ENGINES = ("clipboard", "pixels")
+
+def read_layers(img) :
+    layers = []
+    for layer in img.get_all_layers():
+        x, y = gimp.pdb.gimp_drawable_offsets(layer)
+        pixels = b"" if layer.is_group or layer.is_text else bytes(layer.pixels)
+        layers.append((layer.name, x, y, layer.width, layer.height, hashlib.sha1(pixels).hexdigest()))
+    return layers
+
+def main(args) :
+    options = bench_plugins.parse_options(args)
+    bleed = benchutil.load_plugin("dan200-mirror-bleed.py")
+    print("%d x %d page, %d layers, %d pixel margins" % (options.width, options.height, options.layers, options.margin))
+
+    rows = []
+    results = {}
+    for engine in ENGINES:
+        bleed.MIRROR_BLEED_ENGINE = engine
+        img, run = bench_plugins.run_bleed(bleed, options)
+        gimp.pdb.reset_counts()
+        with benchutil.Timer() as timer:
+            run()
+        calls = gimp.pdb.calls
+        rows.append([engine, "%.3f s" % timer.elapsed, sum(calls.values()), len(calls)])
+        results[engine] = read_layers(img)
+        gimp.pdb.gimp_image_delete(img)
+
+    print()
+    benchutil.print_table(["engine", "time", "PDB calls", "procedures"], rows)
+    print("results match" if results["clipboard"] == results["pixels"] else "RESULTS DIFFER")
+    return 0 if results["clipboard"] == results["pixels"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+# --------------------
+# OCR PARSE BENCHMARK
+# Times parsing large synthetic tesseract outputs in each format, against the nested findall walk
+# the Tesseract OCR plugin used to do for each OCR mode
+# Usage: python benchmarks/bench_ocr_parse.py [pages] [blocks] [lines] [words]
+# --------------------
+
+from __future__ import print_function
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dan200_comictools.ocrresults import parse_ocr_data
+
+ALTO_NS = { "alto" : "http://www.loc.gov/standards/alto/ns-v3#" }
+
+def generate_page_layout(numBlocks, numLines, numWords) :
+    # Lay out a grid of blocks, each containing some lines of words
+    wordW, wordH, spacing = 60, 20, 10
+    blocks = []
+    for blockIndex in range(numBlocks):
+        bx = (blockIndex % 8) * (numWords * (wordW + spacing) + 50)
+        by = (blockIndex // 8) * (numLines * (wordH + spacing) + 50)
+        lines = []
+        for lineIndex in range(numLines):
+            ly = by + lineIndex * (wordH + spacing)
+            words = []
+            for wordIndex in range(numWords):
+                wx = bx + wordIndex * (wordW + spacing)
+                words.append(("WORD" + str(wordIndex), wx, ly, wordW, wordH))
+            lines.append(((bx, ly, numWords * (wordW + spacing) - spacing, wordH), words))
+        blocks.append(((bx, by, numWords * (wordW + spacing) - spacing, numLines * (wordH + spacing) - spacing), lines))
+    return blocks
+
+def generate_alto(numPages, blocks) :
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<alto xmlns="http://www.loc.gov/standards/alto/ns-v3#"><Layout>']
+    for pageIndex in range(numPages):
+        parts.append('<Page WIDTH="10000" HEIGHT="10000" PHYSICAL_IMG_NR="%d" ID="page_%d"><PrintSpace HPOS="0" VPOS="0" WIDTH="10000" HEIGHT="10000">' % (pageIndex, pageIndex))
+        for (bx, by, bw, bh), lines in blocks:
+            box = 'HPOS="%d" VPOS="%d" WIDTH="%d" HEIGHT="%d"' % (bx, by, bw, bh)
+            parts.append('<ComposedBlock %s><TextBlock %s>' % (box, box))
+            for (lx, ly, lw, lh), words in lines:
+                parts.append('<TextLine HPOS="%d" VPOS="%d" WIDTH="%d" HEIGHT="%d">' % (lx, ly, lw, lh))
+                for text, wx, wy, ww, wh in words:
+                    parts.append('<String HPOS="%d" VPOS="%d" WIDTH="%d" HEIGHT="%d" WC="0.96" CONTENT="%s"/><SP WIDTH="10"/>' % (wx, wy, ww, wh, text))
+                parts.append('</TextLine>')
+            parts.append('</TextBlock></ComposedBlock>')
+        parts.append('</PrintSpace></Page>')
+    parts.append('</Layout></alto>\n')
+    return "".join(parts).encode("utf-8")
+
+def generate_tsv(numPages, blocks) :
+    rows = ["level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"]
+    for pageIndex in range(numPages):
+        rows.append("1\t%d\t0\t0\t0\t0\t0\t0\t10000\t10000\t-1\t" % (pageIndex + 1))
+        for blockIndex, ((bx, by, bw, bh), lines) in enumerate(blocks):
+            rows.append("2\t%d\t%d\t0\t0\t0\t%d\t%d\t%d\t%d\t-1\t" % (pageIndex + 1, blockIndex + 1, bx, by, bw, bh))
+            rows.append("3\t%d\t%d\t1\t0\t0\t%d\t%d\t%d\t%d\t-1\t" % (pageIndex + 1, blockIndex + 1, bx, by, bw, bh))
+            for lineIndex, ((lx, ly, lw, lh), words) in enumerate(lines):
+                rows.append("4\t%d\t%d\t1\t%d\t0\t%d\t%d\t%d\t%d\t-1\t" % (pageIndex + 1, blockIndex + 1, lineIndex + 1, lx, ly, lw, lh))
+                for wordIndex, (text, wx, wy, ww, wh) in enumerate(words):
+                    rows.append("5\t%d\t%d\t1\t%d\t%d\t%d\t%d\t%d\t%d\t96.0\t%s" % (pageIndex + 1, blockIndex + 1, lineIndex + 1, wordIndex + 1, wx, wy, ww, wh, text))
+    return ("\n".join(rows) + "\n").encode("utf-8")
+
+def generate_hocr(numPages, blocks) :
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<html xmlns="http://www.w3.org/1999/xhtml"><body>']
+    for pageIndex in range(numPages):
+        parts.append('<div class="ocr_page" id="page_%d" title="image &quot;page.png&quot;; bbox 0 0 10000 10000; ppageno %d">' % (pageIndex + 1, pageIndex))
+        for (bx, by, bw, bh), lines in blocks:
+            bbox = "bbox %d %d %d %d" % (bx, by, bx + bw, by + bh)
+            parts.append('<div class="ocr_carea" title="%s"><p class="ocr_par" title="%s">' % (bbox, bbox))
+            for (lx, ly, lw, lh), words in lines:
+                parts.append('<span class="ocr_line" title="bbox %d %d %d %d; baseline 0 0">' % (lx, ly, lx + lw, ly + lh))
+                for text, wx, wy, ww, wh in words:
+                    parts.append('<span class="ocrx_word" title="bbox %d %d %d %d; x_wconf 96">%s</span> ' % (wx, wy, wx + ww, wy + wh, text))
+                parts.append('</span>')
+            parts.append('</p></div>')
+        parts.append('</div>')
+    parts.append('</body></html>\n')
+    return "".join(parts).encode("utf-8")
+
+def walk_alto_with_findall(data) :
+    # The old approach: parse the whole document, then walk it once for each OCR mode
+    ns = ALTO_NS
+    layoutObj = ET.fromstring(data).find("alto:Layout", ns)
+    results = []
+    for pageObj in layoutObj.findall("alto:Page", ns):
+        for printSpaceObj in pageObj.findall("alto:PrintSpace", ns):
+            for composedBlockObj in printSpaceObj.findall("alto:ComposedBlock", ns):
+                for textBlockObj in composedBlockObj.findall("alto:TextBlock", ns):
+                    for textLineObj in textBlockObj.findall("alto:TextLine", ns):
+                        for stringObj in textLineObj.findall("alto:String", ns):
+                            results.append(stringObj.get("CONTENT"))
+    for pageObj in layoutObj.findall("alto:Page", ns):
+        for printSpaceObj in pageObj.findall("alto:PrintSpace", ns):
+            for composedBlockObj in printSpaceObj.findall("alto:ComposedBlock", ns):
+                for textBlockObj in composedBlockObj.findall("alto:TextBlock", ns):
+                    for textLineObj in textBlockObj.findall("alto:TextLine", ns):
+                        content = ""
+                        for stringObj in textLineObj.findall("alto:String", ns):
+                            content = content + stringObj.get("CONTENT") + " "
+                        results.append(content.strip(" "))
+    for pageObj in layoutObj.findall("alto:Page", ns):
+        for printSpaceObj in pageObj.findall("alto:PrintSpace", ns):
+            for composedBlockObj in printSpaceObj.findall("alto:ComposedBlock", ns):
+                content = ""
+                for textBlockObj in composedBlockObj.findall("alto:TextBlock", ns):
+                    for textLineObj in textBlockObj.findall("alto:TextLine", ns):
+                        for stringObj in textLineObj.findall("alto:String", ns):
+                            content = content + stringObj.get("CONTENT") + " "
+                        content = content.strip(" ") + "\n"
+                results.append(content.strip("\n"))
+    return results
+
+def walk_parsed(data, outputFormat) :
+    # The new approach: parse once, then derive every OCR mode from the result
+    results = []
+    pages = parse_ocr_data(data, outputFormat)
+    for page in pages:
+        for block in page.blocks:
+            for line in block.lines:
+                for word in line.words:
+                    results.append(word.text)
+    for page in pages:
+        for block in page.blocks:
+            for line in block.lines:
+                results.append(line.text)
+    for page in pages:
+        for block in page.blocks:
+            results.append(block.text)
+    return results
+
+def time_it(function, repeats) :
+    best = None
+    for _ in range(repeats):
+        start = time.time()
+        result = function()
+        elapsed = time.time() - start
+        best = elapsed if best == None else min(best, elapsed)
+    return best, result
+
+def main() :
+    args = [int(arg) for arg in sys.argv[1:]]
+    numPages, numBlocks, numLines, numWords = (args + [40, 16, 6, 8][len(args):])[:4]
+    repeats = 3
+
+    blocks = generate_page_layout(numBlocks, numLines, numWords)
+    documents = {
+        "alto" : generate_alto(numPages, blocks),
+        "tsv" : generate_tsv(numPages, blocks),
+        "hocr" : generate_hocr(numPages, blocks),
+    }
+    print("%d pages x %d blocks x %d lines x %d words (%d words total), best of %d" % (numPages, numBlocks, numLines, numWords, numPages * numBlocks * numLines * numWords, repeats))
+
+    baselineTime, expected = time_it(lambda: walk_alto_with_findall(documents["alto"]), repeats)
+    print("%-24s %8d bytes %8.1f ms" % ("alto (findall x3)", len(documents["alto"]), baselineTime * 1000.0))
+    for outputFormat in ("alto", "tsv", "hocr"):
+        elapsed, result = time_it(lambda: walk_parsed(documents[outputFormat], outputFormat), repeats)
+        status = "" if result == expected else "  MISMATCH"
+        print("%-24s %8d bytes %8.1f ms  %.2fx%s" % (outputFormat + " (single pass)", len(documents[outputFormat]), elapsed * 1000.0, baselineTime / elapsed, status))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+# --------------------
+# OCR PREPROCESS BENCHMARK
+# Times OCRing synthetic coloured balloons scanned at several resolutions, sending tesseract either the masked
+# colour crop as before or the crop after preprocess_ocr_crop, and checks the lines found in both agree once
+# the preprocessed boxes are scaled back
+# Each balloon is tried with and without a dark outline, which must not be mistaken for text when sizing the crop
+# Usage: python benchmarks/bench_ocr_preprocess.py [balloons] [target line height] [min scale] [max scale]
+# --------------------
+
+from __future__ import print_function
+import os
+import subprocess
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+from dan200_comictools.ocrpreprocess import preprocess_ocr_crop
+from dan200_comictools.ocrresults import parse_ocr_data, scale_page
+from dan200_comictools.pixels import encode_pnm
+
+FAKE_TESSERACT = os.path.join(BENCHMARK_DIR, "standin", "fake_tesseract.py")
+
+# The scan resolutions to try, as multiples of a balloon with 30 pixel high lines
+SCAN_SCALES = [1, 2, 3, 4]
+
+def generate_balloon(scale, outlined) :
+    # A pale yellow balloon with three lines of dark blue text, on a transparent background
+    lineHeight, lineGap, margin = 30 * scale, 12 * scale, 20 * scale
+    lineWidths = [220 * scale, 300 * scale, 160 * scale]
+    width = max(lineWidths) + margin * 2
+    height = len(lineWidths) * (lineHeight + lineGap) - lineGap + margin * 2
+    data = bytearray(b"\xff\xf0\xa0\xff" * (width * height))
+    for y in range(height):
+        for x in (0, 1, width - 2, width - 1):
+            data[(y * width + x) * 4 + 3] = 0
+    for lineIndex, lineWidth in enumerate(lineWidths):
+        x1 = (width - lineWidth) // 2
+        y1 = margin + lineIndex * (lineHeight + lineGap)
+        for y in range(y1, y1 + lineHeight):
+            # Letters are drawn as dark bars with gaps between them
+            for x in range(x1, x1 + lineWidth):
+                if (x - x1) % (8 * scale) < 6 * scale:
+                    data[(y * width + x) * 4:(y * width + x) * 4 + 3] = b"\x20\x30\x80"
+    if outlined:
+        # A black outline, inside the edge of the crop
+        inset, thickness = margin // 2, 3 * scale
+        for y in range(inset, height - inset):
+            for x in range(inset, width - inset):
+                if min(x - inset, y - inset, width - inset - 1 - x, height - inset - 1 - y) < thickness:
+                    data[(y * width + x) * 4:(y * width + x) * 4 + 3] = b"\x00\x00\x00"
+    return data, width, height
+
+def run_tesseract(imageData) :
+    process = subprocess.Popen([sys.executable, FAKE_TESSERACT, "stdin", "stdout", "tsv"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    output, _ = process.communicate(imageData)
+    return parse_ocr_data(output, "tsv")[0]
+
+def get_line_boxes(page) :
+    return [(line.x, line.y, line.w, line.h) for block in page.blocks for line in block.lines]
+
+def boxes_match(expected, actual, tolerance) :
+    if len(expected) != len(actual):
+        return False
+    for expectedBox, actualBox in zip(expected, actual):
+        for expectedValue, actualValue in zip(expectedBox, actualBox):
+            if abs(expectedValue - actualValue) > tolerance:
+                return False
+    return True
+
+def main() :
+    args = sys.argv[1:]
+    numBalloons = int(args[0]) if len(args) > 0 else 4
+    targetLineHeight = int(args[1]) if len(args) > 1 else 40
+    minScale = float(args[2]) if len(args) > 2 else 0.25
+    maxScale = float(args[3]) if len(args) > 3 else 1.0
+    print("%d balloons per resolution, target line height %d, scale %.2f to %.2f" % (numBalloons, targetLineHeight, minScale, maxScale))
+
+    for scale, outlined in [(scale, outlined) for scale in SCAN_SCALES for outlined in (False, True)]:
+        data, width, height = generate_balloon(scale, outlined)
+
+        start = time.time()
+        for _ in range(numBalloons):
+            rawPage = run_tesseract(encode_pnm(data, width, height, 4))
+        rawTime = (time.time() - start) / numBalloons
+
+        start = time.time()
+        preprocessTime = 0.0
+        for _ in range(numBalloons):
+            preprocessStart = time.time()
+            binary, ocrW, ocrH = preprocess_ocr_crop(data, width, height, 4, targetLineHeight, minScale, maxScale)
+            imageData = encode_pnm(binary, ocrW, ocrH, 1)
+            preprocessTime = preprocessTime + time.time() - preprocessStart
+            page = run_tesseract(imageData)
+            page = scale_page(page, float(width) / float(ocrW), float(height) / float(ocrH))
+        preprocessedTime = (time.time() - start) / numBalloons
+        preprocessTime = preprocessTime / numBalloons
+
+        # Resizing can move the edges of each line by a pixel or so either way, in the preprocessed image
+        tolerance = 2.0 * max(float(width) / float(ocrW), 1.0)
+        status = "" if boxes_match(get_line_boxes(rawPage), get_line_boxes(page), tolerance) else "  MISMATCH"
+        print("%-8s %4dx%-4d -> %4dx%-4d  raw %7.1f ms  preprocessed %7.1f ms (%5.1f ms preprocessing)  %.2fx%s" % ("outlined" if outlined else "plain", width, height, ocrW, ocrH, rawTime * 1000.0, preprocessedTime * 1000.0, preprocessTime * 1000.0, rawTime / preprocessedTime, status))
+
+if __name__ == "__main__":
+    main()
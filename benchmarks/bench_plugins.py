@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+# --------------------
+# PLUGIN BENCHMARK
+# Runs each plugin on a synthetic comic page, using the GIMP stand-in and fake executables in benchmarks/standin,
+# and reports the wall time, PDB calls and subprocess launches of each
+# The ocr-batch and bleed-batch runs save the page as PNG files and run the batch procedures on them with one worker,
+# as the stand-in can't start gimp-console workers
+# The stand-in's pixel operations are much slower than GIMP's, so compare times between runs of this script, not with GIMP
+# Usage: python benchmarks/bench_plugins.py [--balloons N] [--layers M] [--guides K] [--plugins ocr,upscale,bleed,ocr-batch,bleed-batch] ...
+# --------------------
+
+from __future__ import print_function
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "standin"))
+import gimp
+from gimpenums import *
+import fakes
+import benchutil
+
+def fill_rect(layer, x, y, w, h, color) :
+    # Fill a rectangle of the layer with an opaque colour
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + w, layer.width), min(y + h, layer.height)
+    if x2 > x1 and y2 > y1:
+        rgn = layer.get_pixel_rgn(0, 0, layer.width, layer.height, True, False)
+        rgn[x1:x2, y1:y2] = gimp.get_color_pixel(color, layer.bpp) * ((x2 - x1) * (y2 - y1))
+
+def add_layer(img, name, x, y, w, h, layerType, parent=None) :
+    layer = gimp.pdb.gimp_layer_new(img, w, h, layerType, name, 100, LAYER_MODE_NORMAL)
+    gimp.pdb.gimp_image_insert_layer(img, layer, parent, len(parent.children if parent != None else img.layers))
+    gimp.pdb.gimp_layer_set_offsets(layer, x, y)
+    return layer
+
+def create_page(options) :
+    # Create a page with a background, some ink layers which only cover part of the page, some text layers,
+    # a lettering layer with balloons of text on it, and some guides
+    random.seed(options.seed)
+    width, height = options.width, options.height
+    img = gimp.pdb.gimp_image_new(width, height, RGB)
+
+    background = add_layer(img, "Background", 0, 0, width, height, RGB_IMAGE)
+    gimp.pdb.gimp_drawable_fill(background, FILL_WHITE)
+    for _ in range(6):
+        fill_rect(background, random.randrange(width), random.randrange(height), random.randrange(50, 300), random.randrange(50, 300), (random.randrange(256),) * 3)
+
+    group = None
+    for index in range(max(options.layers - 2, 0)):
+        if index % 3 == 2:
+            textLayer = gimp.pdb.gimp_text_layer_new(img, "SFX " + str(index), "Arial", 40, PIXELS)
+            gimp.pdb.gimp_image_insert_layer(img, textLayer, None, 0)
+            gimp.pdb.gimp_layer_set_offsets(textLayer, random.randrange(width // 2), random.randrange(height // 2))
+            continue
+        if index == 3:
+            group = gimp.pdb.gimp_layer_group_new(img)
+            gimp.pdb.gimp_image_insert_layer(img, group, None, 0)
+        ink = add_layer(img, "Ink " + str(index), 0, 0, width, height, RGBA_IMAGE, group)
+        for _ in range(4):
+            fill_rect(ink, random.randrange(width // 2), random.randrange(height // 2), random.randrange(40, width // 2), random.randrange(40, height // 4), (0, 0, 0))
+
+    # Lay the balloons out in a grid, each with a few lines of text
+    letters = add_layer(img, "Letters", 0, 0, width, height, RGBA_IMAGE)
+    columns = max(int(options.balloons ** 0.5), 1)
+    rows = (options.balloons + columns - 1) // columns
+    cellW, cellH = width // columns, height // max(rows, 1)
+    balloons = []
+    for index in range(options.balloons):
+        bw, bh = int(cellW * 0.8), int(cellH * 0.7)
+        bx = (index % columns) * cellW + (cellW - bw) // 2
+        by = (index // columns) * cellH + (cellH - bh) // 2
+        fill_rect(letters, bx, by, bw, bh, (255, 255, 255))
+        lineH = max(bh // 8, 4)
+        for line in range(3):
+            lineW = int(bw * random.uniform(0.5, 0.8))
+            fill_rect(letters, bx + (bw - lineW) // 2, by + bh // 4 + line * lineH * 3 // 2, lineW, lineH, (0, 0, 0))
+        balloons.append((bx, by, bw, bh))
+
+    for index in range(options.guides):
+        if index % 2 == 0:
+            gimp.pdb.gimp_image_add_hguide(img, random.randrange(height))
+        else:
+            gimp.pdb.gimp_image_add_vguide(img, random.randrange(width))
+    return img, letters, balloons
+
+def load_plugins(subprocessStandIn) :
+    ocr = benchutil.load_plugin("dan200-tesseract-ocr.py")
+    ocr.TESSERACT_PATH = fakes.FAKE_TESSERACT_PATH
+    ocr.subprocess = subprocessStandIn
+    upscale = benchutil.load_plugin("dan200-realesrgan-upscale.py")
+    upscale.REALESRGAN_PATH = fakes.FAKE_REALESRGAN_PATH
+    upscale.subprocess = subprocessStandIn
+    bleed = benchutil.load_plugin("dan200-mirror-bleed.py")
+    return { "ocr" : ocr, "upscale" : upscale, "bleed" : bleed, "ocr-batch" : ocr, "bleed-batch" : bleed }
+
+def run_ocr(plugin, options) :
+    img, letters, balloons = create_page(options)
+    gimp.pdb.gimp_selection_none(img)
+    for bx, by, bw, bh in balloons:
+        gimp.pdb.gimp_image_select_rectangle(img, CHANNEL_OP_ADD, bx, by, bw, bh)
+    return img, lambda : plugin.dan200_tesseract_ocr(img, letters, "Arial", "OCR", not options.blocks, options.auto_spacing, options.workers)
+
+def run_upscale(plugin, options) :
+    img, _, _ = create_page(options)
+    return img, lambda : plugin.dan200_realesrgan_upscale(img, img.layers[0], options.scale, False, options.tile_size, options.tile_overlap, options.low_memory)
+
+def run_bleed(plugin, options) :
+    img, _, _ = create_page(options)
+    margin = options.margin
+    return img, lambda : plugin.dan200_mirror_bleed(img, img.layers[0], margin, margin, margin, margin, options.low_memory)
+
+def write_pages(options) :
+    # Save copies of the page, flattened like a scan, into a new directory for the batch procedures to load
+    img, _, _ = create_page(options)
+    flattened = gimp.pdb.gimp_image_duplicate(img)
+    layer = gimp.pdb.gimp_image_merge_visible_layers(flattened, CLIP_TO_IMAGE)
+    pagesPath = tempfile.mkdtemp(prefix="pages-", dir=gimp.tempDirectory)
+    for index in range(options.pages):
+        pagePath = os.path.join(pagesPath, "page%03d.png" % (index + 1))
+        gimp.pdb.file_png_save_defaults(flattened, layer, pagePath, pagePath)
+    gimp.pdb.gimp_image_delete(flattened)
+    return img, pagesPath, os.path.join(pagesPath, "output")
+
+def run_ocr_batch(plugin, options) :
+    img, pagesPath, outputPath = write_pages(options)
+    return img, lambda : plugin.dan200_tesseract_ocr_batch(pagesPath, outputPath, "", "", "Arial", "OCR", not options.blocks, options.auto_spacing, 1)
+
+def run_bleed_batch(plugin, options) :
+    img, pagesPath, outputPath = write_pages(options)
+    margin = options.margin
+    return img, lambda : plugin.dan200_mirror_bleed_batch(pagesPath, outputPath, margin, margin, margin, margin, 1)
+
+RUNNERS = { "ocr" : run_ocr, "upscale" : run_upscale, "bleed" : run_bleed, "ocr-batch" : run_ocr_batch, "bleed-batch" : run_bleed_batch }
+
+def parse_options(args) :
+    parser = argparse.ArgumentParser(description="Benchmark the Comic Tools plugins on synthetic pages, without GIMP")
+    parser.add_argument("--plugins", default="ocr,upscale,bleed", help="comma separated plugins to run: ocr, upscale, bleed, ocr-batch, bleed-batch")
+    parser.add_argument("--balloons", type=int, default=12, help="number of speech balloons on the page")
+    parser.add_argument("--layers", type=int, default=6, help="number of layers on the page")
+    parser.add_argument("--guides", type=int, default=4, help="number of guides on the page")
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=1130)
+    parser.add_argument("--workers", type=int, default=4, help="tesseract processes")
+    parser.add_argument("--auto-spacing", action="store_true", help="adjust the spacing of the OCR text automatically")
+    parser.add_argument("--blocks", action="store_true", help="output each OCR block as one text layer, instead of each line")
+    parser.add_argument("--scale", type=int, default=2, help="upscale factor")
+    parser.add_argument("--tile-size", type=int, default=512)
+    parser.add_argument("--tile-overlap", type=int, default=16)
+    parser.add_argument("--margin", type=int, default=36, help="bleed margin")
+    parser.add_argument("--pages", type=int, default=2, help="number of pages for the batch runs")
+    parser.add_argument("--low-memory", action="store_true", help="run upscale and bleed on a duplicate of the page without undo")
+    parser.add_argument("--top", type=int, default=8, help="number of the most called procedures to list")
+    parser.add_argument("--seed", type=int, default=200)
+    return parser.parse_args(args)
+
+def main(args) :
+    options = parse_options(args)
+
+    subprocessStandIn = fakes.FakeSubprocess()
+    plugins = load_plugins(subprocessStandIn)
+    print("%d x %d page, %d balloons, %d layers, %d guides" % (options.width, options.height, options.balloons, options.layers, options.guides))
+
+    rows = []
+    details = []
+    for name in options.plugins.split(","):
+        img, run = RUNNERS[name](plugins[name], options)
+        gimp.pdb.reset_counts()
+        subprocessStandIn.reset_counts()
+        del gimp.messages[:]
+        with benchutil.Timer() as timer:
+            run()
+        calls = gimp.pdb.calls
+        launches = subprocessStandIn.launches
+        rows.append([name, "%.3f s" % timer.elapsed, sum(calls.values()), len(calls), sum(launches.values())])
+        details.append((name, calls.most_common(options.top), list(gimp.messages)))
+        gimp.pdb.gimp_image_delete(img)
+
+    print()
+    benchutil.print_table(["plugin", "time", "PDB calls", "procedures", "subprocesses"], rows)
+    for name, topCalls, messages in details:
+        print()
+        print(name + ":")
+        benchutil.print_table(["procedure", "calls"], [[procedureName, count] for procedureName, count in topCalls])
+        for message in messages:
+            print("message: " + message)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
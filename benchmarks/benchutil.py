@@ -0,0 +1,47 @@
+# --------------------
+# BENCHMARK UTILITIES
+# Helpers shared by the benchmark scripts
+# --------------------
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_plugin(fileName) :
+    # Load one of the plugin scripts as a module, without running its main()
+    path = os.path.join(ROOT_PATH, fileName)
+    moduleName = os.path.splitext(fileName)[0].replace("-", "_")
+    try:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(moduleName, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except ImportError:
+        import imp
+        module = imp.load_source(moduleName, path)
+    return module
+
+class Timer(object) :
+    def __init__(self) :
+        self.start = None
+        self.elapsed = None
+
+    def __enter__(self) :
+        self.start = time.time()
+        return self
+
+    def __exit__(self, excType, excValue, traceback) :
+        self.elapsed = time.time() - self.start
+        return False
+
+def print_table(headings, rows) :
+    # Print the rows in left aligned columns
+    widths = [len(heading) for heading in headings]
+    for row in rows:
+        widths = [max(width, len(str(value))) for width, value in zip(widths, row)]
+    for row in [headings] + rows:
+        print("  ".join([str(value).ljust(width) for width, value in zip(widths, row)]))
+    sys.stdout.flush()
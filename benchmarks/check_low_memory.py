@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+# --------------------
+# LOW MEMORY CHECK
+# Runs the upscale and mirror bleed plugins in low memory mode on the GIMP stand-in, which can't open displays, like
+# GIMP run non-interactively. Checks the page is left as it was, and the result is left open as a new image with the
+# same layers as a normal run gives. Mirror bleed with the pixels engine works in place instead, so that checks the page
+# has the same layers as a normal run gives, and no new image is left open
+# Usage: python benchmarks/check_low_memory.py [bench_plugins options]
+# --------------------
+
+from __future__ import print_function
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "standin"))
+import gimp
+import bench_plugins
+import fakes
+
+def get_layer_summary(img) :
+    summary = []
+    for layer in img.get_all_layers():
+        x, y = gimp.pdb.gimp_drawable_offsets(layer)
+        pixels = b"" if layer.is_group or layer.is_text else bytes(layer.pixels)
+        summary.append((layer.name, x, y, layer.width, layer.height, hashlib.sha1(pixels).hexdigest()))
+    return summary
+
+def check_plugin(name, plugin, options, inPlace) :
+    # A normal run gives the layers the result should have
+    options.low_memory = False
+    img, run = bench_plugins.RUNNERS[name](plugin, options)
+    run()
+    expected = get_layer_summary(img)
+    gimp.pdb.gimp_image_delete(img)
+
+    options.low_memory = True
+    img, run = bench_plugins.RUNNERS[name](plugin, options)
+    original = get_layer_summary(img)
+    oldImages = set([image.ID for image in gimp.image_list()])
+    del gimp.messages[:]
+    run()
+    newImages = [image for image in gimp.image_list() if image.ID not in oldImages]
+
+    failures = []
+    if inPlace:
+        if get_layer_summary(img) != expected:
+            failures.append("the page doesn't match a normal run")
+        if len(newImages) != 0:
+            failures.append("%d new images were left open" % len(newImages))
+        expectedMessage = "Low memory mode saves no memory"
+    else:
+        if get_layer_summary(img) != original:
+            failures.append("the page was changed")
+        if len(newImages) != 1:
+            failures.append("%d new images were left open" % len(newImages))
+        elif get_layer_summary(newImages[0]) != expected:
+            failures.append("the result doesn't match a normal run")
+        expectedMessage = "The result has been left open"
+    if len([message for message in gimp.messages if message.startswith(expectedMessage)]) != 1:
+        failures.append("unexpected messages " + repr(gimp.messages))
+    for image in [img] + newImages:
+        gimp.pdb.gimp_image_delete(image)
+    return failures
+
+def main(args) :
+    options = bench_plugins.parse_options(args)
+    plugins = bench_plugins.load_plugins(fakes.FakeSubprocess())
+    numFailed = 0
+    for name, engine, inPlace in (("upscale", None, False), ("bleed", "clipboard", False), ("bleed", "pixels", True)):
+        plugin = plugins[name]
+        label = name
+        if engine != None:
+            plugin.MIRROR_BLEED_ENGINE = engine
+            label = name + " (" + engine + " engine)"
+        failures = check_plugin(name, plugin, options, inPlace)
+        print(label + ": " + ("ok" if len(failures) == 0 else "FAILED, " + ", ".join(failures)))
+        if len(failures) > 0:
+            numFailed = numFailed + 1
+    return 1 if numFailed > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+# --------------------
+# FAKE REAL-ESRGAN
+# Stands in for realesrgan-ncnn-vulkan when benchmarking. It takes the same arguments, and upscales
+# PNG files or folders of PNG files with nearest neighbour scaling, after waiting about as long as Real-ESRGAN would
+# Usage: fake_realesrgan.py -i <input file or folder> -o <output file or folder> [-s scale] [-f png]
+# --------------------
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+import imagefiles
+
+# How long Real-ESRGAN takes to start up and load its model, and how long it spends on each output megapixel
+STARTUP_SECONDS = float(os.environ.get("FAKE_REALESRGAN_STARTUP_SECONDS", "0.5"))
+SECONDS_PER_MEGAPIXEL = float(os.environ.get("FAKE_REALESRGAN_SECONDS_PER_MEGAPIXEL", "0.25"))
+
+def scale_pixels(width, height, bpp, data, scale) :
+    # Repeat each pixel across, then repeat each row down
+    stride = width * bpp
+    scaledStride = stride * scale
+    rows = []
+    for y in range(height):
+        row = data[y * stride:(y + 1) * stride]
+        scaledRow = bytearray(scaledStride)
+        for repeat in range(scale):
+            for channel in range(bpp):
+                scaledRow[repeat * bpp + channel::scale * bpp] = row[channel::bpp]
+        rows.extend([bytes(scaledRow)] * scale)
+    return b"".join(rows)
+
+def upscale_file(inputPath, outputPath, scale) :
+    width, height, bpp, data = imagefiles.read_image(inputPath)
+    imagefiles.write_png(outputPath, width * scale, height * scale, bpp, scale_pixels(width, height, bpp, data, scale))
+    return width * height * scale * scale
+
+def parse_args(args) :
+    options = { "-s" : "4", "-f" : "png" }
+    for index in range(0, len(args) - 1, 2):
+        options[args[index]] = args[index + 1]
+    return options
+
+def main(args) :
+    options = parse_args(args)
+    if "-i" not in options or "-o" not in options:
+        print("Usage: fake_realesrgan.py -i <input file or folder> -o <output file or folder> [-s scale] [-f png]", file=sys.stderr)
+        return 1
+    inputPath, outputPath, scale = options["-i"], options["-o"], int(options["-s"])
+
+    startTime = time.time()
+    if os.path.isdir(inputPath):
+        numPixels = 0
+        for name in sorted(os.listdir(inputPath)):
+            outputName = os.path.splitext(name)[0] + "." + options["-f"]
+            numPixels = numPixels + upscale_file(os.path.join(inputPath, name), os.path.join(outputPath, outputName), scale)
+    else:
+        numPixels = upscale_file(inputPath, outputPath, scale)
+
+    # Wait for whatever is left of the time the real upscaler would take
+    delay = STARTUP_SECONDS + SECONDS_PER_MEGAPIXEL * numPixels / 1000000.0 - (time.time() - startTime)
+    if delay > 0:
+        time.sleep(delay)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+# --------------------
+# FAKE TESSERACT
+# Stands in for tesseract when benchmarking. It takes the same arguments and reads the same images,
+# finds the rows of dark pixels in each one, and writes them out as lines of words in the requested format,
+# after waiting about as long as tesseract would
+# Usage: fake_tesseract.py <image, image list or "stdin"> <output base or "stdout"> [-l language] [alto|tsv|hocr]
+#        fake_tesseract.py --version
+# --------------------
+
+from __future__ import print_function
+import os
+import re
+import sys
+import time
+
+import imagefiles
+
+# How long tesseract takes to start up and load its language model, and how long it spends on each image
+STARTUP_SECONDS = float(os.environ.get("FAKE_TESSERACT_STARTUP_SECONDS", "0.2"))
+SECONDS_PER_IMAGE = float(os.environ.get("FAKE_TESSERACT_SECONDS_PER_IMAGE", "0.02"))
+SECONDS_PER_MEGAPIXEL = float(os.environ.get("FAKE_TESSERACT_SECONDS_PER_MEGAPIXEL", "0.5"))
+
+VERSION = "tesseract 5.3.0 (fake)"
+
+OUTPUT_EXTENSIONS = { "alto" : "xml", "tsv" : "tsv", "hocr" : "hocr" }
+WORDS = ["THE", "QUICK", "BROWN", "FOX", "JUMPS", "OVER", "LAZY", "DOG", "PAGE", "BALLOON"]
+DARK = bytes(bytearray([1 if value < 128 else 0 for value in range(256)]))
+DARK_RUN = re.compile(b"\x01+")
+
+def find_lines(width, height, bpp, data) :
+    # Each band of rows containing dark pixels is a line, as wide as the dark pixels in it
+    stride = width * bpp
+    lines = []
+    line = None
+    for y in range(height):
+        dark = bytes(data[y * stride:(y + 1) * stride:bpp]).translate(DARK)
+        runs = [(match.start(), match.end()) for match in DARK_RUN.finditer(dark)]
+        if len(runs) == 0:
+            line = None
+            continue
+        x1, x2 = runs[0][0], runs[-1][1]
+        if line == None:
+            line = [x1, y, x2, y + 1]
+            lines.append(line)
+        else:
+            line[0], line[2], line[3] = min(line[0], x1), max(line[2], x2), y + 1
+    return lines
+
+def recognise(width, height, bpp, data) :
+    # Split each line into words about three line heights wide
+    page = []
+    wordIndex = 0
+    for x1, y1, x2, y2 in find_lines(width, height, bpp, data):
+        lineHeight = y2 - y1
+        numWords = max((x2 - x1) // max(lineHeight * 3, 1), 1)
+        wordWidth = (x2 - x1) // numWords
+        words = []
+        for index in range(numWords):
+            wx = x1 + index * wordWidth
+            words.append((WORDS[wordIndex % len(WORDS)], wx, y1, wordWidth - (lineHeight // 3 if index < numWords - 1 else 0), lineHeight))
+            wordIndex = wordIndex + 1
+        page.append(((x1, y1, x2 - x1, lineHeight), words))
+    return width, height, page
+
+def get_block_box(lines) :
+    x1 = min([box[0] for box, _ in lines])
+    y1 = min([box[1] for box, _ in lines])
+    x2 = max([box[0] + box[2] for box, _ in lines])
+    y2 = max([box[1] + box[3] for box, _ in lines])
+    return x1, y1, x2 - x1, y2 - y1
+
+def write_tsv(pages) :
+    rows = ["level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"]
+    for pageNum, (width, height, lines) in enumerate(pages, 1):
+        rows.append("1\t%d\t0\t0\t0\t0\t0\t0\t%d\t%d\t-1\t" % (pageNum, width, height))
+        if len(lines) == 0:
+            continue
+        bx, by, bw, bh = get_block_box(lines)
+        rows.append("2\t%d\t1\t0\t0\t0\t%d\t%d\t%d\t%d\t-1\t" % (pageNum, bx, by, bw, bh))
+        rows.append("3\t%d\t1\t1\t0\t0\t%d\t%d\t%d\t%d\t-1\t" % (pageNum, bx, by, bw, bh))
+        for lineNum, ((lx, ly, lw, lh), words) in enumerate(lines, 1):
+            rows.append("4\t%d\t1\t1\t%d\t0\t%d\t%d\t%d\t%d\t-1\t" % (pageNum, lineNum, lx, ly, lw, lh))
+            for wordNum, (text, wx, wy, ww, wh) in enumerate(words, 1):
+                rows.append("5\t%d\t1\t1\t%d\t%d\t%d\t%d\t%d\t%d\t91.5\t%s" % (pageNum, lineNum, wordNum, wx, wy, ww, wh, text))
+    return "\n".join(rows) + "\n"
+
+def write_alto(pages) :
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<alto xmlns="http://www.loc.gov/standards/alto/ns-v3#"><Layout>']
+    for pageIndex, (width, height, lines) in enumerate(pages):
+        parts.append('<Page WIDTH="%d" HEIGHT="%d" PHYSICAL_IMG_NR="%d" ID="page_%d"><PrintSpace HPOS="0" VPOS="0" WIDTH="%d" HEIGHT="%d">' % (width, height, pageIndex, pageIndex, width, height))
+        if len(lines) > 0:
+            box = 'HPOS="%d" VPOS="%d" WIDTH="%d" HEIGHT="%d"' % get_block_box(lines)
+            parts.append('<ComposedBlock %s><TextBlock %s>' % (box, box))
+            for (lx, ly, lw, lh), words in lines:
+                parts.append('<TextLine HPOS="%d" VPOS="%d" WIDTH="%d" HEIGHT="%d">' % (lx, ly, lw, lh))
+                for text, wx, wy, ww, wh in words:
+                    parts.append('<String HPOS="%d" VPOS="%d" WIDTH="%d" HEIGHT="%d" WC="0.91" CONTENT="%s"/><SP WIDTH="10"/>' % (wx, wy, ww, wh, text))
+                parts.append('</TextLine>')
+            parts.append('</TextBlock></ComposedBlock>')
+        parts.append('</PrintSpace></Page>')
+    parts.append('</Layout></alto>\n')
+    return "".join(parts)
+
+def write_hocr(pages) :
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<html xmlns="http://www.w3.org/1999/xhtml"><body>']
+    for pageIndex, (width, height, lines) in enumerate(pages):
+        parts.append('<div class="ocr_page" id="page_%d" title="bbox 0 0 %d %d; ppageno %d">' % (pageIndex + 1, width, height, pageIndex))
+        if len(lines) > 0:
+            bx, by, bw, bh = get_block_box(lines)
+            bbox = "bbox %d %d %d %d" % (bx, by, bx + bw, by + bh)
+            parts.append('<div class="ocr_carea" title="%s"><p class="ocr_par" title="%s">' % (bbox, bbox))
+            for (lx, ly, lw, lh), words in lines:
+                parts.append('<span class="ocr_line" title="bbox %d %d %d %d; baseline 0 0">' % (lx, ly, lx + lw, ly + lh))
+                for text, wx, wy, ww, wh in words:
+                    parts.append('<span class="ocrx_word" title="bbox %d %d %d %d; x_wconf 91">%s</span> ' % (wx, wy, wx + ww, wy + wh, text))
+                parts.append('</span>')
+            parts.append('</p></div>')
+        parts.append('</div>')
+    parts.append('</body></html>\n')
+    return "".join(parts)
+
+OUTPUT_WRITERS = { "alto" : write_alto, "tsv" : write_tsv, "hocr" : write_hocr }
+
+def read_inputs(inputPath) :
+    # The input is an image, a file listing one image per line, or an image piped to stdin
+    if inputPath == "stdin":
+        stdin = getattr(sys.stdin, "buffer", sys.stdin)
+        return [imagefiles.read_image_data(stdin.read())]
+    with open(inputPath, "rb") as f:
+        data = f.read()
+    if imagefiles.is_image_data(data):
+        return [imagefiles.read_image_data(data)]
+    return [imagefiles.read_image(line.strip()) for line in data.decode("utf-8").splitlines() if line.strip() != ""]
+
+def main(args) :
+    if len(args) > 0 and args[0] == "--version":
+        print(VERSION)
+        return 0
+
+    # The language makes no difference to the fake
+    if "-l" in args:
+        languageIndex = args.index("-l")
+        args = args[:languageIndex] + args[languageIndex + 2:]
+    if len(args) < 2:
+        print("Usage: fake_tesseract.py <image, image list or stdin> <output base or stdout> [-l language] [alto|tsv|hocr]", file=sys.stderr)
+        return 1
+    inputPath, outputBase = args[0], args[1]
+    outputFormat = args[2] if len(args) > 2 else "tsv"
+    if outputFormat not in OUTPUT_WRITERS:
+        print("Unsupported output format " + outputFormat, file=sys.stderr)
+        return 1
+
+    images = read_inputs(inputPath)
+    pages = [recognise(*image) for image in images]
+    numPixels = sum([image[0] * image[1] for image in images])
+    time.sleep(STARTUP_SECONDS + SECONDS_PER_IMAGE * len(images) + SECONDS_PER_MEGAPIXEL * numPixels / 1000000.0)
+
+    output = OUTPUT_WRITERS[outputFormat](pages).encode("utf-8")
+    if outputBase == "stdout":
+        stdout = getattr(sys.stdout, "buffer", sys.stdout)
+        stdout.write(output)
+        stdout.flush()
+    else:
+        with open(outputBase + "." + OUTPUT_EXTENSIONS[outputFormat], "wb") as f:
+            f.write(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
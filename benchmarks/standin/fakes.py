@@ -0,0 +1,45 @@
+# --------------------
+# FAKE EXECUTABLES
+# A replacement for the subprocess module, which runs the fake executables with python and counts every launch
+# Install it in a plugin by replacing the plugin's subprocess module, and pointing its executable paths at the fakes
+# --------------------
+
+import collections
+import os
+import subprocess
+import sys
+
+STANDIN_PATH = os.path.dirname(os.path.abspath(__file__))
+FAKE_TESSERACT_PATH = os.path.join(STANDIN_PATH, "fake_tesseract.py")
+FAKE_REALESRGAN_PATH = os.path.join(STANDIN_PATH, "fake_realesrgan.py")
+
+class FakeSubprocess(object) :
+    PIPE = subprocess.PIPE
+    STDOUT = subprocess.STDOUT
+    CalledProcessError = subprocess.CalledProcessError
+
+    def __init__(self) :
+        self.launches = collections.Counter()
+
+    def reset_counts(self) :
+        self.launches = collections.Counter()
+
+    def get_command(self, args, executable) :
+        # Python scripts are run with this python, with the same arguments
+        program = executable if executable != None else args[0]
+        self.launches[os.path.basename(program)] += 1
+        if program.endswith(".py"):
+            return [sys.executable, program] + list(args[1:])
+        return list(args)
+
+    def Popen(self, args, executable=None, **kwargs) :
+        return subprocess.Popen(self.get_command(args, executable), **kwargs)
+
+    def call(self, args, executable=None, **kwargs) :
+        return subprocess.call(self.get_command(args, executable), **kwargs)
+
+    def check_call(self, args, executable=None, **kwargs) :
+        return subprocess.check_call(self.get_command(args, executable), **kwargs)
+
+    def check_output(self, args, executable=None, **kwargs) :
+        return subprocess.check_output(self.get_command(args, executable), **kwargs)
@@ -0,0 +1,327 @@
+# --------------------
+# GIMP STAND-IN
+# An in-memory stand-in for the parts of GIMP's python API which the Comic Tools plugins use,
+# so that the plugins can be run and benchmarked without GIMP. Every PDB call is counted
+# Only 8 bit RGB and greyscale images are supported, text is drawn as solid bars, and a few
+# operations are approximated, so the pixels produced will not exactly match GIMP's
+# --------------------
+
+import atexit
+import collections
+import itertools
+import os
+import shutil
+import tempfile
+
+from gimpenums import *
+
+# Temporary files are created in a directory which is deleted on exit
+tempDirectory = tempfile.mkdtemp(prefix="gimp-standin-")
+atexit.register(shutil.rmtree, tempDirectory, True)
+
+# The GIMP profile directory, where the plugins keep their caches
+# It is empty each run unless GIMP_STANDIN_DIRECTORY is set, so the caches start cold
+directory = os.environ.get("GIMP_STANDIN_DIRECTORY") or os.path.join(tempDirectory, "profile")
+
+# Messages shown to the user are collected here
+messages = []
+
+LAYER_TYPE_BPP = { RGB_IMAGE : 3, RGBA_IMAGE : 4, GRAY_IMAGE : 1, GRAYA_IMAGE : 2 }
+BPP_LAYER_TYPE = { 3 : RGB_IMAGE, 4 : RGBA_IMAGE, 1 : GRAY_IMAGE, 2 : GRAYA_IMAGE }
+
+class error(RuntimeError) :
+    pass
+
+def message(text) :
+    messages.append(text)
+
+def image_list() :
+    return list(_images.values())
+
+def progress_init(text=None) :
+    pass
+
+def progress_update(fraction) :
+    pass
+
+def convert_pixels(data, fromBpp, toBpp) :
+    # Add or remove an alpha channel
+    if fromBpp == toBpp:
+        return bytearray(data)
+    if (fromBpp in (1, 2)) != (toBpp in (1, 2)):
+        raise NotImplementedError("The GIMP stand-in can't convert between RGB and greyscale")
+    numPixels = len(data) // fromBpp
+    converted = bytearray(numPixels * toBpp)
+    for channel in range(min(fromBpp, toBpp)):
+        converted[channel::toBpp] = data[channel::fromBpp]
+    if toBpp > fromBpp:
+        converted[toBpp - 1::toBpp] = b"\xff" * numPixels
+    return converted
+
+def get_color_pixel(color, bpp) :
+    # Convert an (r, g, b) colour into the bytes of one opaque pixel
+    r, g, b = [int(value) for value in color[0:3]]
+    if bpp <= 2:
+        pixel = bytearray([(r * 77 + g * 150 + b * 29) >> 8])
+    else:
+        pixel = bytearray([r, g, b])
+    if bpp == 2 or bpp == 4:
+        pixel.append(255)
+    return bytes(pixel)
+
+# --------------------
+# Items
+# --------------------
+
+_items = {}
+_nextItemId = itertools.count(1)
+_images = {}
+_nextImageId = itertools.count(1)
+
+class Image(object) :
+    def __init__(self, width, height, baseType=RGB) :
+        self.ID = next(_nextImageId)
+        self.width = width
+        self.height = height
+        self.base_type = baseType
+        self.layers = []
+        self.channels = []
+        self.guides = collections.OrderedDict()
+        self.filename = None
+        self.selection = Channel(self, width, height, "Selection")
+        _images[self.ID] = self
+
+    @property
+    def active_layer(self) :
+        return self.layers[0] if len(self.layers) > 0 else None
+
+    @property
+    def active_drawable(self) :
+        return self.active_layer
+
+    def get_all_layers(self) :
+        layers = []
+        stack = list(reversed(self.layers))
+        while len(stack) > 0:
+            layer = stack.pop()
+            layers.append(layer)
+            if layer.is_group:
+                stack.extend(reversed(layer.children))
+        return layers
+
+    def delete(self) :
+        for layer in self.get_all_layers():
+            layer.delete()
+        self.selection.delete()
+        _images.pop(self.ID, None)
+
+class Item(object) :
+    def __init__(self, image, name) :
+        self.ID = next(_nextItemId)
+        self.image = image
+        self.name = name
+        self.parent = None
+        self.tattoo = self.ID
+        _items[self.ID] = self
+
+    @staticmethod
+    def from_id(itemId) :
+        return _items[itemId]
+
+    def delete(self) :
+        _items.pop(self.ID, None)
+
+class Drawable(Item) :
+    def __init__(self, image, width, height, bpp, name) :
+        Item.__init__(self, image, name)
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        self.offsets = (0, 0)
+        self._pixels = None
+        self._shadow = None
+
+    @property
+    def pixels(self) :
+        # The pixels aren't allocated until they are needed, as most text layers never need them
+        if self._pixels == None:
+            self._pixels = bytearray(self.width * self.height * self.bpp)
+        return self._pixels
+
+    @pixels.setter
+    def pixels(self, data) :
+        self._pixels = data
+
+    @property
+    def has_alpha(self) :
+        return self.bpp == 2 or self.bpp == 4
+
+    @property
+    def is_rgb(self) :
+        return self.bpp >= 3
+
+    @property
+    def is_gray(self) :
+        return self.bpp <= 2
+
+    @property
+    def type(self) :
+        return BPP_LAYER_TYPE[self.bpp]
+
+    def get_shadow(self) :
+        # Like GIMP's, the shadow buffer starts out holding whatever was in memory, so pixels that are never written show up
+        if self._shadow == None or len(self._shadow) != self.width * self.height * self.bpp:
+            self._shadow = bytearray(b"\xcd" * (self.width * self.height * self.bpp))
+        return self._shadow
+
+    def get_pixel_rgn(self, x, y, width, height, dirty=True, shadow=False) :
+        return PixelRegion(self, x, y, width, height, shadow)
+
+    def read_rect(self, x, y, w, h, shadow=False) :
+        stride = self.width * self.bpp
+        pixels = self.get_shadow() if shadow else self.pixels
+        return b"".join([bytes(pixels[row * stride + x * self.bpp:row * stride + (x + w) * self.bpp]) for row in range(y, y + h)])
+
+    def write_rect(self, x, y, w, h, data, shadow=False) :
+        stride = self.width * self.bpp
+        rowLength = w * self.bpp
+        if len(data) != rowLength * h:
+            raise ValueError("Pixel data is the wrong size for the region")
+        pixels = self.get_shadow() if shadow else self.pixels
+        for row in range(h):
+            pixels[(y + row) * stride + x * self.bpp:(y + row) * stride + (x + w) * self.bpp] = data[row * rowLength:(row + 1) * rowLength]
+
+    def set_type(self, bpp) :
+        if bpp != self.bpp:
+            if self._pixels != None:
+                self._pixels = convert_pixels(self._pixels, self.bpp, bpp)
+            self.bpp = bpp
+
+    def flush(self) :
+        pass
+
+    def update(self, x, y, width, height) :
+        pass
+
+    def merge_shadow(self, undo=False) :
+        if self._shadow != None:
+            self._pixels = self._shadow
+            self._shadow = None
+
+class Layer(Drawable) :
+    def __init__(self, image, name, width, height, layerType=RGB_IMAGE, opacity=100, mode=LAYER_MODE_NORMAL) :
+        Drawable.__init__(self, image, width, height, LAYER_TYPE_BPP[layerType], name)
+        self.opacity = opacity
+        self.mode = mode
+        self.is_group = False
+        self.is_text = False
+        self.children = []
+        self.floatingTarget = None
+
+    @property
+    def layers(self) :
+        return self.children
+
+class GroupLayer(Layer) :
+    def __init__(self, image, name="Layer Group") :
+        Layer.__init__(self, image, name, 1, 1, RGBA_IMAGE)
+        self.is_group = True
+
+class TextLayer(Layer) :
+    def __init__(self, image, text, fontName, fontSize, width, height) :
+        Layer.__init__(self, image, text, width, height, RGBA_IMAGE)
+        self.is_text = True
+        self.text = text
+        self.font = fontName
+        self.fontSize = fontSize
+        self.fontSizeUnit = PIXELS
+        self.justification = TEXT_JUSTIFY_LEFT
+        self.indent = 0.0
+        self.letterSpacing = 0.0
+        self.lineSpacing = 0.0
+
+class Channel(Drawable) :
+    def __init__(self, image, width, height, name) :
+        Drawable.__init__(self, image, width, height, 1, name)
+
+class PixelRegion(object) :
+    # Pixel regions are indexed with drawable coordinates, by a pair of slices or a single pixel
+    def __init__(self, drawable, x, y, width, height, shadow=False) :
+        self.drawable = drawable
+        self.x = x
+        self.y = y
+        self.w = width
+        self.h = height
+        self.bpp = drawable.bpp
+        self.shadow = shadow
+
+    def get_rect(self, key) :
+        xs, ys = key
+        if isinstance(xs, slice):
+            x1, x2 = xs.start, xs.stop
+        else:
+            x1, x2 = xs, xs + 1
+        if isinstance(ys, slice):
+            y1, y2 = ys.start, ys.stop
+        else:
+            y1, y2 = ys, ys + 1
+        if x1 < self.x or y1 < self.y or x2 > self.x + self.w or y2 > self.y + self.h or x2 < x1 or y2 < y1:
+            raise IndexError("Pixel region index out of range")
+        return x1, y1, x2 - x1, y2 - y1
+
+    def __getitem__(self, key) :
+        x, y, w, h = self.get_rect(key)
+        return self.drawable.read_rect(x, y, w, h, self.shadow)
+
+    def __setitem__(self, key, data) :
+        x, y, w, h = self.get_rect(key)
+        self.drawable.write_rect(x, y, w, h, data, self.shadow)
+
+# --------------------
+# PDB
+# --------------------
+
+class PDB(object) :
+    # Looks up procedures by name, counting each call
+    def __init__(self) :
+        self.procedures = {}
+        self.calls = collections.Counter()
+
+    def add_procedure(self, name, function) :
+        self.procedures[name] = function
+
+    def reset_counts(self) :
+        self.calls = collections.Counter()
+
+    def __getattr__(self, name) :
+        registered = self.__dict__.get("procedures", {})
+        if name not in registered:
+            raise AttributeError("The GIMP stand-in does not implement pdb." + name)
+        function = registered[name]
+        calls = self.calls
+        def call(*args) :
+            calls[name] += 1
+            return function(*args)
+        return call
+
+pdb = PDB()
+
+# The state shared by the PDB procedures
+class Context(object) :
+    def __init__(self) :
+        self.foreground = (0, 0, 0)
+        self.background = (255, 255, 255)
+        self.feather = False
+        self.sampleThreshold = 15
+
+    def copy(self) :
+        context = Context()
+        context.__dict__.update(self.__dict__)
+        return context
+
+context = Context()
+contextStack = []
+clipboard = None
+
+import procedures
+procedures.add_procedures(pdb)
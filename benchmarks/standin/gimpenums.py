@@ -0,0 +1,63 @@
+# --------------------
+# GIMP STAND-IN ENUMS
+# The GIMP enum values used by the Comic Tools plugins, matching GIMP 2.10's gimpenums module
+# --------------------
+
+FALSE = 0
+TRUE = 1
+
+# Image base types and layer types
+RGB = 0
+GRAY = 1
+INDEXED = 2
+
+RGB_IMAGE = 0
+RGBA_IMAGE = 1
+GRAY_IMAGE = 2
+GRAYA_IMAGE = 3
+
+# Units
+PIXELS = 0
+
+# Fill types
+FILL_FOREGROUND = 0
+FILL_BACKGROUND = 1
+FILL_WHITE = 2
+FILL_TRANSPARENT = 3
+FILL_PATTERN = 4
+
+# Selection operations
+CHANNEL_OP_ADD = 0
+CHANNEL_OP_SUBTRACT = 1
+CHANNEL_OP_REPLACE = 2
+CHANNEL_OP_INTERSECT = 3
+
+ORIENTATION_HORIZONTAL = 0
+ORIENTATION_VERTICAL = 1
+
+TEXT_JUSTIFY_LEFT = 0
+TEXT_JUSTIFY_RIGHT = 1
+TEXT_JUSTIFY_CENTER = 2
+TEXT_JUSTIFY_FILL = 3
+
+ADD_MASK_WHITE = 0
+ADD_MASK_BLACK = 1
+ADD_MASK_ALPHA = 2
+
+MASK_APPLY = 0
+MASK_DISCARD = 1
+
+LAYER_MODE_NORMAL = 28
+LAYER_MODE_MULTIPLY = 30
+
+GRADIENT_LINEAR = 0
+
+HISTOGRAM_VALUE = 0
+HISTOGRAM_RED = 1
+HISTOGRAM_GREEN = 2
+HISTOGRAM_BLUE = 3
+HISTOGRAM_ALPHA = 4
+
+EXPAND_AS_NECESSARY = 0
+CLIP_TO_IMAGE = 1
+CLIP_TO_BOTTOM_LAYER = 2
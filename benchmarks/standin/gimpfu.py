@@ -0,0 +1,32 @@
+# --------------------
+# GIMP STAND-IN GIMPFU
+# The parts of gimpfu used by the Comic Tools plugins: the gimp module, the PDB, the enums and register()
+# Registered plugins are added to the PDB as python_fu_ procedures, so they can call each other
+# --------------------
+
+import gimp
+from gimpenums import *
+
+pdb = gimp.pdb
+
+PF_INT = 0
+PF_FLOAT = 3
+PF_STRING = 4
+PF_BOOL = 6
+PF_FONT = 16
+PF_FILE = 18
+PF_DIRNAME = 21
+PF_SPINNER = 23
+PF_SLIDER = 24
+
+registeredPlugins = {}
+
+def register(procName, blurb, help, author, copyright, date, label, imagetypes, params, results, function, menu=None, domain=None, on_query=None, on_run=None) :
+    name = procName.replace("-", "_")
+    if not name.startswith("python_fu_"):
+        name = "python_fu_" + name
+    registeredPlugins[name] = function
+    pdb.add_procedure(name, function)
+
+def main() :
+    pass
@@ -0,0 +1,115 @@
+# --------------------
+# IMAGE IO
+# Minimal PNG and PNM reading and writing for the GIMP stand-in and the fake executables
+# PNGs are written unfiltered; reading supports every PNG filter, but only 8 bit grey/RGB/alpha images
+# --------------------
+
+import struct
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_COLOR_TYPES = { 1 : 0, 2 : 4, 3 : 2, 4 : 6 }
+PNG_CHANNELS = { 0 : 1, 4 : 2, 2 : 3, 6 : 4 }
+
+def write_png_chunk(f, chunkType, data) :
+    f.write(struct.pack(">I", len(data)))
+    f.write(chunkType)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(chunkType + data) & 0xffffffff))
+
+def write_png(path, width, height, bpp, data) :
+    stride = width * bpp
+    data = bytes(data)
+    raw = b"".join([b"\x00" + data[row * stride:(row + 1) * stride] for row in range(height)])
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE)
+        write_png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, PNG_COLOR_TYPES[bpp], 0, 0, 0))
+        write_png_chunk(f, b"IDAT", zlib.compress(raw, 1))
+        write_png_chunk(f, b"IEND", b"")
+
+def paeth(a, b, c) :
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+def unfilter_row(filterType, row, previous, bpp) :
+    if filterType == 0:
+        return row
+    row = bytearray(row)
+    for i in range(len(row)):
+        a = row[i - bpp] if i >= bpp else 0
+        b = previous[i]
+        c = previous[i - bpp] if i >= bpp else 0
+        if filterType == 1:
+            row[i] = (row[i] + a) & 0xff
+        elif filterType == 2:
+            row[i] = (row[i] + b) & 0xff
+        elif filterType == 3:
+            row[i] = (row[i] + ((a + b) >> 1)) & 0xff
+        else:
+            row[i] = (row[i] + paeth(a, b, c)) & 0xff
+    return row
+
+def read_png_data(data) :
+    if data[0:8] != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file")
+    offset = 8
+    idat = []
+    width = height = bpp = None
+    while offset < len(data):
+        length, = struct.unpack(">I", data[offset:offset + 4])
+        chunkType = data[offset + 4:offset + 8]
+        chunk = data[offset + 8:offset + 8 + length]
+        offset = offset + 12 + length
+        if chunkType == b"IHDR":
+            width, height, depth, colorType, _, _, interlace = struct.unpack(">IIBBBBB", chunk)
+            if depth != 8 or interlace != 0 or colorType not in PNG_CHANNELS:
+                raise ValueError("Unsupported PNG format")
+            bpp = PNG_CHANNELS[colorType]
+        elif chunkType == b"IDAT":
+            idat.append(chunk)
+        elif chunkType == b"IEND":
+            break
+
+    raw = zlib.decompress(b"".join(idat))
+    stride = width * bpp
+    rows = []
+    previous = bytearray(stride)
+    for row in range(height):
+        start = row * (stride + 1)
+        filterType = bytearray(raw[start:start + 1])[0]
+        previous = unfilter_row(filterType, raw[start + 1:start + 1 + stride], previous, bpp)
+        rows.append(bytes(previous))
+    return width, height, bpp, bytearray(b"".join(rows))
+
+def read_pnm_data(data) :
+    # Read the header fields, which are separated by whitespace
+    fields = []
+    offset = 0
+    while len(fields) < 4:
+        while data[offset:offset + 1].isspace():
+            offset = offset + 1
+        start = offset
+        while not data[offset:offset + 1].isspace():
+            offset = offset + 1
+        fields.append(data[start:offset])
+    offset = offset + 1
+    magic, width, height = fields[0], int(fields[1]), int(fields[2])
+    bpp = 1 if magic == b"P5" else 3
+    return width, height, bpp, bytearray(data[offset:offset + width * height * bpp])
+
+def read_image_data(data) :
+    if data[0:8] == PNG_SIGNATURE:
+        return read_png_data(data)
+    if data[0:2] in (b"P5", b"P6"):
+        return read_pnm_data(data)
+    raise ValueError("Unsupported image format")
+
+def read_image(path) :
+    with open(path, "rb") as f:
+        return read_image_data(f.read())
+
+def is_image_data(data) :
+    return data[0:8] == PNG_SIGNATURE or data[0:2] in (b"P5", b"P6")
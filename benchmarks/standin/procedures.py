@@ -0,0 +1,824 @@
+# --------------------
+# GIMP STAND-IN PROCEDURES
+# The PDB procedures used by the Comic Tools plugins, working on the stand-in's in-memory images
+# Approximations: contiguous colour selection selects every pixel of the colour, growing or shrinking a
+# selection does nothing, every layer is visible, and XCF files are saved as a PNG of one drawable
+# There are no displays, as when GIMP is run non-interactively, and the batch procedures can only be run with
+# one worker, as there is no gimp-console to start more
+# --------------------
+
+import collections
+import copy
+import itertools
+import math
+import os
+import re
+
+import gimp
+import imagefiles
+from gimpenums import *
+
+_nextTempId = itertools.count(1)
+_nextGuideId = itertools.count(1)
+
+SELECTED_RUN = re.compile(b"[^\x00]+")
+MASK_FROM_ALPHA = bytes(bytearray([0] + [255] * 255))
+INVERT_MASK = bytes(bytearray([255 - value for value in range(256)]))
+
+# The procedures are added to the PDB by the gimp module, once they have all been defined
+PROCEDURES = []
+
+def procedure(function) :
+    PROCEDURES.append(function)
+    return function
+
+def add_procedures(pdb) :
+    for function in PROCEDURES:
+        pdb.add_procedure(function.__name__, function)
+
+# --------------------
+# Pixel helpers
+# --------------------
+
+def get_row(drawable, x, y, w) :
+    start = (y * drawable.width + x) * drawable.bpp
+    return drawable.pixels[start:start + w * drawable.bpp]
+
+def set_row(drawable, x, y, data) :
+    start = (y * drawable.width + x) * drawable.bpp
+    drawable.pixels[start:start + len(data)] = data
+
+def intersect(x1, y1, x2, y2, bx1, by1, bx2, by2) :
+    x1, y1, x2, y2 = max(x1, bx1), max(y1, by1), min(x2, bx2), min(y2, by2)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
+
+def get_mask_bounds(channel) :
+    # Find the bounding box of the non-zero pixels in a channel
+    if channel._pixels == None:
+        return None
+    w = channel.width
+    pixels = channel.pixels
+    x1, y1, x2, y2 = w, None, 0, None
+    for row in range(channel.height):
+        rowData = pixels[row * w:(row + 1) * w]
+        stripped = rowData.lstrip(b"\x00")
+        if len(stripped) == 0:
+            continue
+        if y1 == None:
+            y1 = row
+        y2 = row + 1
+        x1 = min(x1, w - len(stripped))
+        x2 = max(x2, len(rowData.rstrip(b"\x00")))
+    if y1 == None:
+        return None
+    return x1, y1, x2, y2
+
+def get_selected_region(drawable) :
+    # Find the part of the drawable inside the selection bounds, in image coordinates
+    # Returns the region, and whether it is only partly selected
+    dx, dy = drawable.offsets
+    drawableBox = (dx, dy, dx + drawable.width, dy + drawable.height)
+    image = drawable.image
+    bounds = get_mask_bounds(image.selection) if image != None and drawable is not image.selection else None
+    if bounds == None:
+        return drawableBox, False
+    return intersect(*(bounds + drawableBox)), True
+
+def get_mask_row(image, x1, y, x2) :
+    return image.selection.pixels[y * image.width + x1:y * image.width + x2]
+
+def is_fully_selected(image, x1, y1, x2, y2) :
+    full = b"\xff" * (x2 - x1)
+    for y in range(y1, y2):
+        if get_mask_row(image, x1, y, x2) != full:
+            return False
+    return True
+
+def fill_selection(drawable, pixel) :
+    # Fill the selected part of the drawable, or all of it if nothing is selected
+    region, partial = get_selected_region(drawable)
+    if region == None:
+        return
+    if not partial:
+        drawable.pixels = bytearray(pixel * (drawable.width * drawable.height))
+        return
+    dx, dy = drawable.offsets
+    x1, y1, x2, y2 = region
+    image = drawable.image
+    for y in range(y1, y2):
+        maskRow = bytes(get_mask_row(image, x1, y, x2))
+        for run in SELECTED_RUN.finditer(maskRow):
+            set_row(drawable, x1 + run.start() - dx, y - dy, pixel * (run.end() - run.start()))
+
+def get_fill_pixel(drawable, fillType) :
+    if fillType == FILL_TRANSPARENT and drawable.has_alpha:
+        return b"\x00" * drawable.bpp
+    if fillType == FILL_FOREGROUND:
+        return gimp.get_color_pixel(gimp.context.foreground, drawable.bpp)
+    if fillType == FILL_WHITE:
+        return gimp.get_color_pixel((255, 255, 255), drawable.bpp)
+    return gimp.get_color_pixel(gimp.context.background, drawable.bpp)
+
+def blend_row(src, dst, srcBpp, dstBpp) :
+    # Composite a row of pixels with alpha over another row, one pixel at a time
+    numChannels = srcBpp - 1
+    blended = bytearray(dst)
+    for index in range(len(src) // srcBpp):
+        s = index * srcBpp
+        d = index * dstBpp
+        a = src[s + numChannels]
+        if a == 0:
+            continue
+        if a == 255:
+            blended[d:d + numChannels] = src[s:s + numChannels]
+            if dstBpp > numChannels:
+                blended[d + numChannels] = 255
+            continue
+        for channel in range(numChannels):
+            blended[d + channel] = (src[s + channel] * a + dst[d + channel] * (255 - a) + 127) // 255
+        if dstBpp > numChannels:
+            blended[d + numChannels] = a + (dst[d + numChannels] * (255 - a) + 127) // 255
+    return blended
+
+def composite(src, dst) :
+    # Draw one layer over another, where they overlap
+    sx, sy = src.offsets
+    dx, dy = dst.offsets
+    region = intersect(sx, sy, sx + src.width, sy + src.height, dx, dy, dx + dst.width, dy + dst.height)
+    if region == None:
+        return
+    x1, y1, x2, y2 = region
+    w = x2 - x1
+    srcBpp, dstBpp = src.bpp, dst.bpp
+    opaque = b"\xff" * w
+    transparent = b"\x00" * w
+    for y in range(y1, y2):
+        srcRow = get_row(src, x1 - sx, y - sy, w)
+        if src.has_alpha:
+            alpha = bytes(srcRow[srcBpp - 1::srcBpp])
+            if alpha == transparent:
+                continue
+            if alpha != opaque:
+                dstRow = get_row(dst, x1 - dx, y - dy, w)
+                if not dst.has_alpha or bytes(dstRow[dstBpp - 1::dstBpp]) != transparent:
+                    set_row(dst, x1 - dx, y - dy, blend_row(srcRow, dstRow, srcBpp, dstBpp))
+                    continue
+        set_row(dst, x1 - dx, y - dy, gimp.convert_pixels(srcRow, srcBpp, dstBpp))
+
+def flip_drawable(drawable, orientation) :
+    w, h, bpp = drawable.width, drawable.height, drawable.bpp
+    stride = w * bpp
+    pixels = drawable.pixels
+    rows = [pixels[row * stride:(row + 1) * stride] for row in range(h)]
+    if orientation == ORIENTATION_HORIZONTAL:
+        flippedRows = []
+        for row in rows:
+            flipped = bytearray(stride)
+            for channel in range(bpp):
+                flipped[channel::bpp] = row[channel::bpp][::-1]
+            flippedRows.append(flipped)
+        rows = flippedRows
+    else:
+        rows.reverse()
+    drawable.pixels = bytearray(b"".join([bytes(row) for row in rows]))
+
+def get_offsets(item) :
+    # Group layers cover all of their children
+    if item.is_group:
+        children = [child for child in item.image.get_all_layers() if not child.is_group and is_descendant(child, item)]
+        if len(children) == 0:
+            return 0, 0
+        return min([child.offsets[0] for child in children]), min([child.offsets[1] for child in children])
+    return item.offsets
+
+def is_descendant(item, ancestor) :
+    parent = item.parent
+    while parent != None:
+        if parent is ancestor:
+            return True
+        parent = parent.parent
+    return False
+
+def get_text_extents(text, size) :
+    # Every glyph is treated as being the same width
+    lines = text.split("\n")
+    width = int(math.ceil(max([len(line) for line in lines]) * size * 0.55))
+    lineHeight = int(math.ceil(size * 1.2))
+    return max(width, 1), lineHeight * len(lines), int(size * 0.9), int(size * 0.3)
+
+def draw_text(layer, text, size) :
+    # Draw each line as a solid bar, which reaches up to the ascenders and down to the descenders
+    lineHeight = int(math.ceil(size * 1.2))
+    glyphWidth = size * 0.55
+    ink = gimp.get_color_pixel(gimp.context.foreground, layer.bpp)
+    for lineIndex, line in enumerate(text.split("\n")):
+        visible = line.rstrip()
+        if visible == "":
+            continue
+        tall = any([c.isupper() or c.isdigit() or c in "bdfhklt" for c in visible])
+        deep = any([c in "gjpqy" for c in visible])
+        top = lineIndex * lineHeight + int(lineHeight * (0.15 if tall else 0.35))
+        bottom = lineIndex * lineHeight + int(lineHeight * (0.95 if deep else 0.75))
+        left = int(glyphWidth * (len(visible) - len(visible.lstrip())))
+        right = min(int(math.ceil(glyphWidth * len(visible))), layer.width)
+        for y in range(top, min(bottom, layer.height)):
+            set_row(layer, left, y, ink * (right - left))
+
+# --------------------
+# Images and layers
+# --------------------
+
+@procedure
+def gimp_image_new(width, height, baseType) :
+    return gimp.Image(width, height, baseType)
+
+@procedure
+def gimp_image_delete(image) :
+    image.delete()
+
+def duplicate_item(item, image, parent) :
+    # Copy an item and everything in it into another image, keeping its tattoo
+    duplicate = copy.copy(item)
+    duplicate.ID = next(gimp._nextItemId)
+    gimp._items[duplicate.ID] = duplicate
+    duplicate.image = image
+    duplicate.parent = parent
+    if isinstance(item, gimp.Drawable):
+        duplicate._pixels = bytearray(item._pixels) if item._pixels != None else None
+        duplicate._shadow = None
+    if isinstance(item, gimp.Layer):
+        duplicate.children = [duplicate_item(child, image, duplicate) for child in item.children]
+    return duplicate
+
+@procedure
+def gimp_image_duplicate(image) :
+    duplicate = gimp.Image(image.width, image.height, image.base_type)
+    duplicate.layers = [duplicate_item(layer, duplicate, None) for layer in image.layers]
+    duplicate.channels = [duplicate_item(channel, duplicate, None) for channel in image.channels]
+    duplicate.guides = collections.OrderedDict(image.guides)
+    if image.selection._pixels != None:
+        duplicate.selection.pixels = bytearray(image.selection._pixels)
+    duplicate.filename = image.filename
+    return duplicate
+
+@procedure
+def gimp_item_get_tattoo(item) :
+    return item.tattoo
+
+@procedure
+def gimp_image_get_layer_by_tattoo(image, tattoo) :
+    for layer in image.get_all_layers():
+        if layer.tattoo == tattoo:
+            return layer
+    return None
+
+@procedure
+def gimp_layer_new(image, width, height, layerType, name, opacity, mode) :
+    return gimp.Layer(image, name, width, height, layerType, opacity, mode)
+
+@procedure
+def gimp_layer_group_new(image) :
+    return gimp.GroupLayer(image)
+
+@procedure
+def gimp_image_insert_layer(image, layer, parent, position) :
+    siblings = parent.children if parent != None else image.layers
+    position = max(min(position, len(siblings)), 0)
+    siblings.insert(position, layer)
+    layer.image = image
+    layer.parent = parent
+
+@procedure
+def gimp_image_get_layer_by_name(image, name) :
+    for layer in image.get_all_layers():
+        if layer.name == name:
+            return layer
+    return None
+
+@procedure
+def gimp_item_get_children(item) :
+    return len(item.children), [child.ID for child in item.children]
+
+@procedure
+def gimp_item_get_name(item) :
+    return item.name
+
+@procedure
+def gimp_layer_set_name(layer, name) :
+    layer.name = name
+
+@procedure
+def gimp_item_is_layer(item) :
+    return isinstance(item, gimp.Layer)
+
+@procedure
+def gimp_item_is_text_layer(item) :
+    return isinstance(item, gimp.Layer) and item.is_text
+
+@procedure
+def gimp_drawable_offsets(drawable) :
+    return get_offsets(drawable)
+
+@procedure
+def gimp_layer_set_offsets(layer, x, y) :
+    layer.offsets = (int(x), int(y))
+
+@procedure
+def gimp_drawable_has_alpha(drawable) :
+    return drawable.has_alpha
+
+@procedure
+def gimp_layer_add_alpha(layer) :
+    if not layer.has_alpha:
+        layer.set_type(layer.bpp + 1)
+
+@procedure
+def gimp_drawable_fill(drawable, fillType) :
+    pixel = get_fill_pixel(drawable, fillType)
+    drawable.pixels = bytearray(pixel * (drawable.width * drawable.height))
+
+@procedure
+def gimp_drawable_edit_fill(drawable, fillType) :
+    fill_selection(drawable, get_fill_pixel(drawable, fillType))
+
+@procedure
+def gimp_edit_clear(drawable) :
+    fill_selection(drawable, get_fill_pixel(drawable, FILL_TRANSPARENT))
+
+@procedure
+def gimp_layer_resize(layer, width, height, offsetX, offsetY) :
+    # Keep the existing pixels where they are on the canvas
+    if layer._pixels != None:
+        resized = gimp.Layer(None, layer.name, width, height, layer.type)
+        region = intersect(offsetX, offsetY, offsetX + layer.width, offsetY + layer.height, 0, 0, width, height)
+        if region != None:
+            x1, y1, x2, y2 = region
+            for y in range(y1, y2):
+                set_row(resized, x1, y, get_row(layer, x1 - offsetX, y - offsetY, x2 - x1))
+        layer.pixels = resized.pixels
+        resized.delete()
+    layer.width = width
+    layer.height = height
+    x, y = layer.offsets
+    gimp_layer_set_offsets(layer, x - offsetX, y - offsetY)
+
+@procedure
+def gimp_image_resize(image, width, height, offsetX, offsetY) :
+    image.width = width
+    image.height = height
+    image.selection.width = width
+    image.selection.height = height
+    image.selection.pixels = None
+    for layer in image.get_all_layers():
+        x, y = layer.offsets
+        gimp_layer_set_offsets(layer, x + offsetX, y + offsetY)
+    for guide, (orientation, position) in list(image.guides.items()):
+        image.guides[guide] = (orientation, position + (offsetY if orientation == ORIENTATION_HORIZONTAL else offsetX))
+
+@procedure
+def gimp_image_resize_to_layers(image) :
+    layers = [layer for layer in image.get_all_layers() if not layer.is_group]
+    if len(layers) == 0:
+        return
+    x1 = min([layer.offsets[0] for layer in layers])
+    y1 = min([layer.offsets[1] for layer in layers])
+    x2 = max([layer.offsets[0] + layer.width for layer in layers])
+    y2 = max([layer.offsets[1] + layer.height for layer in layers])
+    gimp_image_resize(image, x2 - x1, y2 - y1, -x1, -y1)
+
+@procedure
+def gimp_item_transform_flip_simple(item, orientation, autoCenter, axis) :
+    flip_drawable(item, orientation)
+    return item
+
+# --------------------
+# Text
+# --------------------
+
+@procedure
+def gimp_text_get_extents_fontname(text, size, sizeType, fontName) :
+    return get_text_extents(text, size)
+
+@procedure
+def gimp_text_fontname(image, drawable, x, y, text, border, antialias, size, sizeType, fontName) :
+    w, h, _, _ = get_text_extents(text, size)
+    layer = gimp.Layer(image, "Text", w + 2 * max(border, 0), h + 2 * max(border, 0), RGBA_IMAGE)
+    draw_text(layer, text, size)
+    layer.offsets = (int(x), int(y))
+    if drawable == None:
+        gimp_image_insert_layer(image, layer, None, 0)
+    else:
+        layer.floatingTarget = drawable
+    return layer
+
+@procedure
+def gimp_text_layer_new(image, text, fontName, size, unit) :
+    w, h, _, _ = get_text_extents(text, size)
+    return gimp.TextLayer(image, text, fontName, size, w, h)
+
+@procedure
+def gimp_text_layer_resize(layer, width, height) :
+    layer.width = int(width)
+    layer.height = int(height)
+    layer.pixels = None
+
+@procedure
+def gimp_text_layer_set_justification(layer, justification) :
+    layer.justification = justification
+
+@procedure
+def gimp_text_layer_get_font_size(layer) :
+    return layer.fontSize, layer.fontSizeUnit
+
+@procedure
+def gimp_text_layer_set_font_size(layer, fontSize, unit) :
+    layer.fontSize = fontSize
+    layer.fontSizeUnit = unit
+
+@procedure
+def gimp_text_layer_get_indent(layer) :
+    return layer.indent
+
+@procedure
+def gimp_text_layer_set_indent(layer, indent) :
+    layer.indent = indent
+
+@procedure
+def gimp_text_layer_get_letter_spacing(layer) :
+    return layer.letterSpacing
+
+@procedure
+def gimp_text_layer_set_letter_spacing(layer, letterSpacing) :
+    layer.letterSpacing = letterSpacing
+
+@procedure
+def gimp_text_layer_get_line_spacing(layer) :
+    return layer.lineSpacing
+
+@procedure
+def gimp_text_layer_set_line_spacing(layer, lineSpacing) :
+    layer.lineSpacing = lineSpacing
+
+# --------------------
+# Selections and paths
+# --------------------
+
+def combine_selection(image, operation, mask) :
+    selection = image.selection
+    if operation == CHANNEL_OP_REPLACE:
+        selection.pixels = mask
+        return
+    old = selection.pixels
+    if operation == CHANNEL_OP_ADD:
+        combined = bytearray(max(a, b) for a, b in zip(old, mask))
+    elif operation == CHANNEL_OP_SUBTRACT:
+        combined = bytearray(min(a, 255 - b) for a, b in zip(old, mask))
+    else:
+        combined = bytearray(min(a, b) for a, b in zip(old, mask))
+    selection.pixels = combined
+
+def select_rectangles(image, operation, rectangles) :
+    # Rectangles are drawn straight into the selection, a row at a time
+    iw, ih = image.width, image.height
+    if operation == CHANNEL_OP_REPLACE or operation == CHANNEL_OP_INTERSECT:
+        old = image.selection.pixels
+        image.selection.pixels = bytearray(iw * ih)
+    pixels = image.selection.pixels
+    for x, y, w, h in rectangles:
+        region = intersect(int(x), int(y), int(x + w), int(y + h), 0, 0, iw, ih)
+        if region == None:
+            continue
+        x1, y1, x2, y2 = region
+        for row in range(y1, y2):
+            start = row * iw
+            if operation == CHANNEL_OP_INTERSECT:
+                pixels[start + x1:start + x2] = old[start + x1:start + x2]
+            else:
+                pixels[start + x1:start + x2] = (b"\x00" if operation == CHANNEL_OP_SUBTRACT else b"\xff") * (x2 - x1)
+
+@procedure
+def gimp_image_select_rectangle(image, operation, x, y, width, height) :
+    select_rectangles(image, operation, [(x, y, width, height)])
+
+@procedure
+def gimp_image_select_item(image, operation, item) :
+    # Channels select their values, and other drawables select their alpha channel
+    iw, ih = image.width, image.height
+    mask = bytearray(iw * ih)
+    if isinstance(item, gimp.Channel):
+        for row in range(min(item.height, ih)):
+            mask[row * iw:row * iw + min(item.width, iw)] = get_row(item, 0, row, min(item.width, iw))
+        combine_selection(image, operation, mask)
+        return
+    x, y = item.offsets
+    region = intersect(x, y, x + item.width, y + item.height, 0, 0, iw, ih)
+    if region != None:
+        x1, y1, x2, y2 = region
+        for row in range(y1, y2):
+            if item.has_alpha:
+                rowData = get_row(item, x1 - x, row - y, x2 - x1)
+                mask[row * iw + x1:row * iw + x2] = bytes(rowData[item.bpp - 1::item.bpp]).translate(MASK_FROM_ALPHA)
+            else:
+                mask[row * iw + x1:row * iw + x2] = b"\xff" * (x2 - x1)
+    combine_selection(image, operation, mask)
+
+@procedure
+def gimp_image_select_contiguous_color(image, operation, drawable, x, y) :
+    # Select every pixel matching the colour at the point
+    bpp = drawable.bpp
+    seed = bytes(get_row(drawable, int(x), int(y), 1))
+    iw, ih = image.width, image.height
+    mask = bytearray(iw * ih)
+    dx, dy = drawable.offsets
+    region = intersect(dx, dy, dx + drawable.width, dy + drawable.height, 0, 0, iw, ih)
+    if region != None:
+        x1, y1, x2, y2 = region
+        for row in range(y1, y2):
+            rowData = bytes(get_row(drawable, x1 - dx, row - dy, x2 - x1))
+            mask[row * iw + x1:row * iw + x2] = bytearray([255 if rowData[i:i + bpp] == seed else 0 for i in range(0, len(rowData), bpp)])
+    combine_selection(image, operation, mask)
+
+@procedure
+def gimp_selection_none(image) :
+    image.selection.pixels = None
+
+@procedure
+def gimp_selection_invert(image) :
+    image.selection.pixels = bytearray(bytes(image.selection.pixels).translate(INVERT_MASK))
+
+@procedure
+def gimp_image_select_color(image, operation, drawable, color) :
+    # Select every pixel whose colour channels are all within the sample threshold of the colour
+    threshold = gimp.context.sampleThreshold
+    bpp = drawable.bpp
+    target = bytearray(gimp.get_color_pixel(color, bpp))[0:bpp - 1 if drawable.has_alpha else bpp]
+    tables = [bytes(bytearray([255 if abs(value - channel) <= threshold else 0 for value in range(256)])) for channel in target]
+    iw, ih = image.width, image.height
+    mask = bytearray(iw * ih)
+    dx, dy = drawable.offsets
+    region = intersect(dx, dy, dx + drawable.width, dy + drawable.height, 0, 0, iw, ih)
+    if region != None:
+        x1, y1, x2, y2 = region
+        for row in range(y1, y2):
+            rowData = bytes(get_row(drawable, x1 - dx, row - dy, x2 - x1))
+            rowMask = bytearray(rowData[0::bpp].translate(tables[0]))
+            for channel in range(1, len(tables)):
+                channelMask = bytearray(rowData[channel::bpp].translate(tables[channel]))
+                rowMask = bytearray([min(a, b) for a, b in zip(rowMask, channelMask)])
+            mask[row * iw + x1:row * iw + x2] = rowMask
+    combine_selection(image, operation, mask)
+
+@procedure
+def gimp_selection_grow(image, steps) :
+    pass
+
+@procedure
+def gimp_selection_shrink(image, steps) :
+    pass
+
+@procedure
+def gimp_selection_bounds(image) :
+    bounds = get_mask_bounds(image.selection)
+    if bounds == None:
+        return False, 0, 0, image.width, image.height
+    return (True,) + bounds
+
+@procedure
+def gimp_channel_new(image, width, height, name, opacity, color) :
+    return gimp.Channel(image, width, height, name)
+
+@procedure
+def gimp_image_insert_channel(image, channel, parent, position) :
+    image.channels.insert(max(min(position, len(image.channels)), 0), channel)
+
+@procedure
+def gimp_image_remove_channel(image, channel) :
+    image.channels.remove(channel)
+    channel.delete()
+
+# --------------------
+# Clipboard
+# --------------------
+
+@procedure
+def gimp_edit_copy(drawable) :
+    region, partial = get_selected_region(drawable)
+    if region == None:
+        raise gimp.error("Cannot copy because the selected region is empty")
+    x1, y1, x2, y2 = region
+    w, h = x2 - x1, y2 - y1
+    dx, dy = drawable.offsets
+    data = bytearray(drawable.read_rect(x1 - dx, y1 - dy, w, h))
+    bpp = drawable.bpp
+
+    # Pixels outside the selection are made transparent
+    image = drawable.image
+    if partial and not is_fully_selected(image, x1, y1, x2, y2):
+        if not drawable.has_alpha:
+            data = gimp.convert_pixels(data, bpp, bpp + 1)
+            bpp = bpp + 1
+        stride = w * bpp
+        for row in range(h):
+            maskRow = get_mask_row(image, x1, y1 + row, x2)
+            alpha = data[row * stride + bpp - 1:(row + 1) * stride:bpp]
+            data[row * stride + bpp - 1:(row + 1) * stride:bpp] = bytearray(min(a, m) for a, m in zip(alpha, maskRow))
+    gimp.clipboard = (w, h, bpp, data, x1, y1)
+    return True
+
+def create_pasted_layer(image) :
+    w, h, bpp, data, x, y = gimp.clipboard
+    layer = gimp.Layer(image, "Pasted Layer", w, h, gimp.BPP_LAYER_TYPE[bpp])
+    layer.pixels = bytearray(data)
+    layer.offsets = (x, y)
+    return layer
+
+@procedure
+def gimp_edit_paste(drawable, pasteInto) :
+    if gimp.clipboard == None:
+        raise gimp.error("The clipboard is empty")
+    layer = create_pasted_layer(drawable.image)
+    layer.floatingTarget = drawable
+    return layer
+
+@procedure
+def gimp_floating_sel_anchor(layer) :
+    composite(layer, layer.floatingTarget)
+    layer.delete()
+
+# --------------------
+# Histograms
+# --------------------
+
+@procedure
+def gimp_drawable_histogram(drawable, channel, startRange, endRange) :
+    if channel != HISTOGRAM_ALPHA:
+        raise NotImplementedError("The GIMP stand-in only measures alpha histograms")
+    region, partial = get_selected_region(drawable)
+    if region == None:
+        return 0.0, 0.0, 0.0, 0, 0, 0.0
+    low, high = int(round(startRange * 255)), int(round(endRange * 255))
+    x1, y1, x2, y2 = region
+    dx, dy = drawable.offsets
+    image = drawable.image
+    bpp = drawable.bpp
+    numPixels = 0
+    count = 0
+    for y in range(y1, y2):
+        if drawable.has_alpha:
+            values = bytearray(get_row(drawable, x1 - dx, y - dy, x2 - x1)[bpp - 1::bpp])
+        else:
+            values = bytearray(b"\xff" * (x2 - x1))
+        if partial:
+            maskRow = get_mask_row(image, x1, y, x2)
+            values = bytearray(v for v, m in zip(values, maskRow) if m != 0)
+        numPixels = numPixels + len(values)
+        if low <= 1 and high >= 255:
+            count = count + len(values) - values.count(b"\x00")
+        else:
+            count = count + len([v for v in values if low <= v <= high])
+    return 0.0, 0.0, 0.0, numPixels, count, (float(count) / float(numPixels) if numPixels > 0 else 0.0)
+
+# --------------------
+# Guides
+# --------------------
+
+def add_guide(image, orientation, position) :
+    guide = next(_nextGuideId)
+    image.guides[guide] = (orientation, position)
+    return guide
+
+@procedure
+def gimp_image_add_hguide(image, position) :
+    return add_guide(image, ORIENTATION_HORIZONTAL, position)
+
+@procedure
+def gimp_image_add_vguide(image, position) :
+    return add_guide(image, ORIENTATION_VERTICAL, position)
+
+@procedure
+def gimp_image_delete_guide(image, guide) :
+    del image.guides[guide]
+
+@procedure
+def gimp_image_find_next_guide(image, guide) :
+    guides = list(image.guides.keys())
+    index = guides.index(guide) + 1 if guide != 0 else 0
+    return guides[index] if index < len(guides) else 0
+
+@procedure
+def gimp_image_get_guide_orientation(image, guide) :
+    return image.guides[guide][0]
+
+@procedure
+def gimp_image_get_guide_position(image, guide) :
+    return image.guides[guide][1]
+
+# --------------------
+# Files
+# --------------------
+
+@procedure
+def gimp_temp_name(extension) :
+    return os.path.join(gimp.tempDirectory, "temp-" + str(next(_nextTempId)) + "." + extension)
+
+@procedure
+def file_png_save_defaults(image, drawable, filename, rawFilename) :
+    imagefiles.write_png(filename, drawable.width, drawable.height, drawable.bpp, drawable.pixels)
+
+@procedure
+def file_png_load(filename, rawFilename) :
+    w, h, bpp, data = imagefiles.read_image(filename)
+    image = gimp.Image(w, h, RGB if bpp >= 3 else GRAY)
+    layer = gimp.Layer(image, os.path.basename(filename), w, h, gimp.BPP_LAYER_TYPE[bpp])
+    layer.pixels = data
+    gimp_image_insert_layer(image, layer, None, 0)
+    image.filename = filename
+    return image
+
+@procedure
+def gimp_file_load(filename, rawFilename) :
+    return file_png_load(filename, rawFilename)
+
+@procedure
+def gimp_file_save(image, drawable, filename, rawFilename) :
+    file_png_save_defaults(image, drawable, filename, rawFilename)
+
+@procedure
+def gimp_xcf_save(dummy, image, drawable, filename, rawFilename) :
+    file_png_save_defaults(image, drawable, filename, rawFilename)
+
+@procedure
+def gimp_image_merge_visible_layers(image, mergeType) :
+    # Draw every layer onto one layer covering the image, from the bottom up
+    merged = gimp.Layer(image, "Merged", image.width, image.height, RGBA_IMAGE if image.base_type == RGB else GRAYA_IMAGE)
+    layers = image.get_all_layers()
+    for layer in reversed(layers):
+        if not layer.is_group:
+            composite(layer, merged)
+    for layer in layers:
+        layer.delete()
+    image.layers = []
+    gimp_image_insert_layer(image, merged, None, 0)
+    return merged
+
+# --------------------
+# Context, undo and display
+# --------------------
+
+@procedure
+def gimp_context_push() :
+    gimp.contextStack.append(gimp.context.copy())
+
+@procedure
+def gimp_context_pop() :
+    gimp.context = gimp.contextStack.pop()
+
+@procedure
+def gimp_context_set_feather(feather) :
+    gimp.context.feather = feather
+
+@procedure
+def gimp_context_set_sample_threshold_int(threshold) :
+    gimp.context.sampleThreshold = threshold
+
+@procedure
+def gimp_image_undo_group_start(image) :
+    pass
+
+@procedure
+def gimp_image_undo_group_end(image) :
+    pass
+
+@procedure
+def gimp_image_undo_disable(image) :
+    return True
+
+@procedure
+def gimp_image_undo_enable(image) :
+    return True
+
+@procedure
+def gimp_display_new(image) :
+    raise gimp.error("Displays can't be created when GIMP is run non-interactively")
+
+@procedure
+def gimp_displays_flush() :
+    pass
+
+@procedure
+def gimp_progress_end() :
+    pass
+
+@procedure
+def gimp_progress_set_text(message) :
+    pass
+
+@procedure
+def gimp_image_freeze_layers(image) :
+    pass
+
+@procedure
+def gimp_image_thaw_layers(image) :
+    pass
@@ -7,8 +7,25 @@
 
 from gimpfu import *
 import math
+import os
+import sys
+import time
 
-def copy_move_and_flip(img, layer, x, y, w, h, newX, newY, flipAxis) :
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from dan200_comictools import batch, instrument
+from dan200_comictools.layertree import LAYER_KIND_GROUP, LAYER_KIND_RASTER, snapshot_layer_tree
+from dan200_comictools.lowmemory import cancel_low_memory_run, finish_low_memory_run, start_low_memory_run
+from dan200_comictools.pixels import crop_pixels, flip_horizontal, flip_vertical
+
+# How the mirrored margins are drawn
+# "pixels" reads and writes the layer's pixels directly, which is much faster on pages with many layers
+# "clipboard" copies, flips and pastes each margin using the clipboard
+MIRROR_BLEED_ENGINE = "pixels"
+
+# The name of the manifest written to the output folder by batch runs
+MIRROR_BLEED_MANIFEST_NAME = "mirror-bleed-manifest.jsonl"
+
+def copy_move_and_flip(img, layer, layerX, layerY, x, y, w, h, newX, newY, flipAxis) :
     # Make sure the region requested is in range
     iw, ih = img.width, img.height
     if x < 0:
@@ -23,88 +40,163 @@ def copy_move_and_flip(img, layer, x, y, w, h, newX, newY, flipAxis) :
     h = min(h, ih - y)
 
     # Perform the copy/flip/paste
-    if w > 0 and h > 0:
-        gimp.pdb.gimp_image_select_rectangle(img, CHANNEL_OP_REPLACE, x, y, w, h)
-        gimp.pdb.gimp_edit_copy(layer)
-        fltLayer = gimp.pdb.gimp_edit_paste(layer, False)
-        gimp.pdb.gimp_item_transform_flip_simple(fltLayer, flipAxis, True, 0)
-        gimp.pdb.gimp_layer_set_offsets(fltLayer, newX, newY)
-        gimp.pdb.gimp_floating_sel_anchor(fltLayer)
-
-
-def add_bleed_to_layer(img, layer, left, right, top, bottom) :
-    if gimp.pdb.gimp_item_is_group(layer):
-        # Bleed children
-        numChildren, childIDs = gimp.pdb.gimp_item_get_children(layer)
-        for childID in childIDs:
-            child = gimp.Item.from_id(childID)
-            add_bleed_to_layer(img, child, left, right, top, bottom)
+    with instrument.stage("mirror"):
+        if w > 0 and h > 0 and MIRROR_BLEED_ENGINE == "pixels":
+            copy_move_and_flip_pixels(layer, layerX, layerY, x, y, w, h, newX, newY, flipAxis)
+        elif w > 0 and h > 0:
+            gimp.pdb.gimp_image_select_rectangle(img, CHANNEL_OP_REPLACE, x, y, w, h)
+            gimp.pdb.gimp_edit_copy(layer)
+            fltLayer = gimp.pdb.gimp_edit_paste(layer, False)
+            gimp.pdb.gimp_item_transform_flip_simple(fltLayer, flipAxis, True, 0)
+            gimp.pdb.gimp_layer_set_offsets(fltLayer, newX, newY)
+            gimp.pdb.gimp_floating_sel_anchor(fltLayer)
+
+
+def copy_move_and_flip_pixels(layer, layerX, layerY, x, y, w, h, newX, newY, flipAxis) :
+    # Convert the regions to layer coordinates
+    lw, lh = layer.width, layer.height
+    x, y = x - layerX, y - layerY
+    newX, newY = newX - layerX, newY - layerY
+
+    # Like the clipboard, only copy the part of the region which is inside the layer
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + w, lw), min(y + h, lh)
+    w, h = x2 - x1, y2 - y1
+    if w <= 0 or h <= 0:
+        return
 
+    # Read the region and flip it
+    bpp = layer.bpp
+    rgn = layer.get_pixel_rgn(0, 0, lw, lh, True, False)
+    data = rgn[x1:x2, y1:y2]
+    if flipAxis == ORIENTATION_HORIZONTAL:
+        data = flip_horizontal(data, w, h, bpp)
     else:
-        # Get layer box
-        x, y = gimp.pdb.gimp_drawable_offsets(layer)
-        w, h = layer.width, layer.height
-        iw, ih = img.width, img.height
-
-        # Move the layer into the center
-        gimp.pdb.gimp_layer_set_offsets(layer, x + left, y + top)
-        x = x + left
-        y = y + top
-
-        if not gimp.pdb.gimp_item_is_text_layer(layer):
-            gimp.pdb.gimp_context_set_feather(False)
-
-            # Calculate how much bleed to add
-            leftMargin = 0
-            rightMargin = 0
-            topMargin = 0
-            bottomMargin = 0
+        data = flip_vertical(data, w, h, bpp)
+
+    # Write the flipped pixels into the part of the destination which is inside the layer
+    dstX1, dstY1 = max(newX, 0), max(newY, 0)
+    dstX2, dstY2 = min(newX + w, lw), min(newY + h, lh)
+    if dstX2 <= dstX1 or dstY2 <= dstY1:
+        return
+    if (dstX1, dstY1, dstX2, dstY2) != (newX, newY, newX + w, newY + h):
+        data = crop_pixels(data, w, bpp, dstX1 - newX, dstY1 - newY, dstX2 - dstX1, dstY2 - dstY1)
+    rgn[dstX1:dstX2, dstY1:dstY2] = bytes(data)
+
+class BleedJob(object) :
+    __slots__ = ("record", "leftMargin", "rightMargin", "topMargin", "bottomMargin")
+
+    def __init__(self, record) :
+        self.record = record
+        self.leftMargin = 0
+        self.rightMargin = 0
+        self.topMargin = 0
+        self.bottomMargin = 0
+
+def plan_bleed_jobs(records, iw, ih, left, right, top, bottom) :
+    # Work out how much bleed each layer needs from the snapshot of the layer tree, without asking GIMP anything
+    # Text layers are only moved
+    jobs = []
+    for record in records:
+        if record.kind == LAYER_KIND_GROUP:
+            continue
+        job = BleedJob(record)
+        if record.kind == LAYER_KIND_RASTER:
+            x, y = record.x + left, record.y + top
+            w, h = record.w, record.h
             if x > 0 and x <= left:
-                leftMargin = x
+                job.leftMargin = x
             if (x + w) >= (iw - right) and (x + w) < iw:
-                rightMargin = iw - (x + w)
+                job.rightMargin = iw - (x + w)
             if y > 0 and y <= top:
-                 topMargin = y
+                job.topMargin = y
             if (y + h) >= (ih - bottom) and (y + h) < ih:
-                bottomMargin = ih - (y + h)
+                job.bottomMargin = ih - (y + h)
+        jobs.append(job)
+    return jobs
 
-            if (leftMargin + rightMargin + topMargin + bottomMargin) > 0:
-                # Resize and reposition the layer
-                gimp.pdb.gimp_layer_resize(layer, w + leftMargin + rightMargin, h + topMargin + bottomMargin, leftMargin, topMargin)
+def add_bleed_to_single_layer(img, job, left, top) :
+    # Get layer box
+    layer = job.record.layer
+    x, y = job.record.x, job.record.y
+    w, h = job.record.w, job.record.h
 
-                # Add left margin
-                if leftMargin > 0:
-                    copy_move_and_flip(img, layer, x + 1, y, leftMargin, h, x - leftMargin, y, ORIENTATION_HORIZONTAL)
+    # Move the layer into the center
+    gimp.pdb.gimp_layer_set_offsets(layer, x + left, y + top)
+    x = x + left
+    y = y + top
 
-                # Add right margin
-                if rightMargin > 0:
-                    copy_move_and_flip(img, layer, x + w - rightMargin - 1, y, rightMargin, h, x + w, y, ORIENTATION_HORIZONTAL)
+    leftMargin, rightMargin = job.leftMargin, job.rightMargin
+    topMargin, bottomMargin = job.topMargin, job.bottomMargin
+    if (leftMargin + rightMargin + topMargin + bottomMargin) > 0:
+        # Resize and reposition the layer
+        with instrument.stage("resize"):
+            gimp.pdb.gimp_layer_resize(layer, w + leftMargin + rightMargin, h + topMargin + bottomMargin, leftMargin, topMargin)
+        layerX, layerY = x - leftMargin, y - topMargin
 
-                x = x - leftMargin
-                w = w + leftMargin + rightMargin
+        # Add left margin
+        if leftMargin > 0:
+            copy_move_and_flip(img, layer, layerX, layerY, x + 1, y, leftMargin, h, x - leftMargin, y, ORIENTATION_HORIZONTAL)
 
-                # Add top margin
-                if topMargin > 0:
-                    copy_move_and_flip(img, layer, x, y + 1, w, topMargin, x, y - topMargin, ORIENTATION_VERTICAL)
+        # Add right margin
+        if rightMargin > 0:
+            copy_move_and_flip(img, layer, layerX, layerY, x + w - rightMargin - 1, y, rightMargin, h, x + w, y, ORIENTATION_HORIZONTAL)
 
-                # Add bottom margin
-                if bottomMargin > 0:
-                    copy_move_and_flip(img, layer, x, y + h - bottomMargin - 1, w, bottomMargin, x, y + h, ORIENTATION_VERTICAL)
+        x = x - leftMargin
+        w = w + leftMargin + rightMargin
 
-def dan200_mirror_bleed(img, layer, left, right, top, bottom) :
-    # Start
-    gimp.progress_init("Please wait ...")
-    gimp.pdb.gimp_image_undo_group_start(img)
+        # Add top margin
+        if topMargin > 0:
+            copy_move_and_flip(img, layer, layerX, layerY, x, y + 1, w, topMargin, x, y - topMargin, ORIENTATION_VERTICAL)
 
-    try:
-        # Resize the image canvas
+        # Add bottom margin
+        if bottomMargin > 0:
+            copy_move_and_flip(img, layer, layerX, layerY, x, y + h - bottomMargin - 1, w, bottomMargin, x, y + h, ORIENTATION_VERTICAL)
+
+        # Send any pixels written directly to the layer back to GIMP
+        if MIRROR_BLEED_ENGINE == "pixels":
+            with instrument.stage("flush"):
+                layer.flush()
+                layer.update(0, 0, layer.width, layer.height)
+
+def add_bleed_to_layers(img, layers, left, right, top, bottom) :
+    # Snapshot the layers and everything in their groups, and plan every layer's bleed before changing any of them
+    # The canvas must already have been resized
+    with instrument.stage("snapshot layers"):
+        records = snapshot_layer_tree(gimp, layers)
+    jobs = plan_bleed_jobs(records, img.width, img.height, left, right, top, bottom)
+
+    gimp.pdb.gimp_context_set_feather(False)
+    for job in jobs:
+        with instrument.item(job.record.layer.name):
+            add_bleed_to_single_layer(img, job, left, top)
+    return jobs
+
+def estimate_undo_bytes(jobs) :
+    # Resizing a layer keeps its old pixels on the undo stack
+    # The clipboard engine also keeps each margin it pastes, and the part of the layer the margin was anchored over
+    numBytes = 0
+    for job in jobs:
+        horizontal = job.leftMargin + job.rightMargin
+        vertical = job.topMargin + job.bottomMargin
+        if horizontal + vertical == 0:
+            continue
+        w, h, bpp = job.record.w, job.record.h, job.record.layer.bpp
+        numBytes = numBytes + w * h * bpp
+        if MIRROR_BLEED_ENGINE == "clipboard":
+            numBytes = numBytes + 2 * (horizontal * h + vertical * (w + horizontal)) * bpp
+    return numBytes
+
+def add_mirror_bleed(img, left, right, top, bottom) :
+    # Resize the image canvas
+    with instrument.stage("resize canvas"):
         gimp.pdb.gimp_image_resize(img, img.width + left + right, img.height + top + bottom, 0, 0)
 
-        # Add bleed to each layer
-        gimp.pdb.gimp_selection_none(img)
-        for layer in img.layers:
-            add_bleed_to_layer(img, layer, left, right, top, bottom)
+    # Add bleed to each layer
+    gimp.pdb.gimp_selection_none(img)
+    jobs = add_bleed_to_layers(img, img.layers, left, right, top, bottom)
 
+    with instrument.stage("guides"):
         # Move all guides
         new_guides = []
         guide = gimp.pdb.gimp_image_find_next_guide(img, 0)
@@ -130,12 +222,108 @@ def dan200_mirror_bleed(img, layer, left, right, top, bottom) :
             gimp.pdb.gimp_image_add_vguide(img, left)
         if right > 0:
             gimp.pdb.gimp_image_add_vguide(img, img.width - right)
+    return jobs
+
+def dan200_mirror_bleed(img, layer, left, right, top, bottom, lowMemory=False) :
+    # Start
+    gimp.progress_init("Please wait ...")
+    instrument.start_run("mirror-bleed", gimp)
+    if lowMemory and MIRROR_BLEED_ENGINE == "pixels":
+        # The pixels engine only leaves each layer as it was before resizing on the undo stack, which is no more than a
+        # duplicate of the image would need, so the bleed is added in place as one undo step
+        lowMemory = False
+        gimp.message("Low memory mode saves no memory with the pixels engine, so the bleed is added to the image in place, as one undo step")
+    if lowMemory:
+        # Work on a duplicate of the image without undo, leaving the original as it was
+        img, layer, duplicateBytes = start_low_memory_run(gimp, img, layer)
+    else:
+        gimp.pdb.gimp_image_undo_group_start(img)
+
+    try:
+        jobs = add_mirror_bleed(img, left, right, top, bottom)
+        if lowMemory:
+            finish_low_memory_run(gimp, img, estimate_undo_bytes(jobs), duplicateBytes)
 
     except Exception as err:
         gimp.message("Unexpected error: " + str(err))
+        if lowMemory:
+            cancel_low_memory_run(gimp, img)
 
     # Finish
-    pdb.gimp_image_undo_group_end(img)
+    if not lowMemory:
+        pdb.gimp_image_undo_group_end(img)
+    pdb.gimp_progress_end()
+    instrument.finish_run()
+
+def save_page(img, path) :
+    if os.path.splitext(path)[1].lower() == ".xcf":
+        gimp.pdb.gimp_xcf_save(0, img, img.layers[0], path, path)
+    else:
+        # Other formats can only store one layer
+        layer = gimp.pdb.gimp_image_merge_visible_layers(img, CLIP_TO_IMAGE)
+        gimp.pdb.gimp_file_save(img, layer, path, path)
+
+def bleed_page(pagePath, outputPath, left, right, top, bottom) :
+    img = gimp.pdb.gimp_file_load(pagePath, pagePath)
+    try:
+        # There is nothing to undo in a batch, so don't spend memory on it
+        gimp.pdb.gimp_image_undo_disable(img)
+        add_mirror_bleed(img, left, right, top, bottom)
+        save_page(img, outputPath)
+    finally:
+        gimp.pdb.gimp_image_delete(img)
+
+def dan200_mirror_bleed_batch(pages, outputDir, left, right, top, bottom, workers) :
+    # Find the pages
+    pagePaths = batch.find_pages(pages)
+    if len(pagePaths) == 0:
+        gimp.message("No pages found in " + pages)
+        return
+    outputDir = os.path.abspath(outputDir)
+    for pagePath in pagePaths:
+        if os.path.dirname(pagePath) == outputDir:
+            gimp.message("The output folder must be different to the folder containing the pages")
+            return
+    if not os.path.isdir(outputDir):
+        os.makedirs(outputDir)
+
+    # Skip any pages which a previous run has already finished
+    manifest = batch.Manifest(os.path.join(outputDir, MIRROR_BLEED_MANIFEST_NAME))
+    settings = { "left" : left, "right" : right, "top" : top, "bottom" : bottom }
+    pendingPagePaths = [pagePath for pagePath in pagePaths if not manifest.is_done(pagePath, settings)]
+
+    gimp.progress_init("Adding bleed to " + str(len(pendingPagePaths)) + " pages ...")
+    if workers > 1 and len(pendingPagePaths) > 1:
+        # Share the pages between several GIMP processes, each of which runs this procedure on its own share
+        listPaths = []
+        pythonCodes = []
+        try:
+            for shard in batch.split_into_shards(pendingPagePaths, workers):
+                listPath = gimp.pdb.gimp_temp_name("txt")
+                listPaths.append(listPath)
+                pythonCodes.append("pdb.python_fu_dan200_mirror_bleed_batch(%r, %r, %d, %d, %d, %d, 1)" % (batch.write_page_list(shard, listPath), outputDir, left, right, top, bottom))
+            batch.run_gimp_workers(pythonCodes, loadFonts=False)
+        finally:
+            for listPath in listPaths:
+                if os.path.exists(listPath):
+                    os.remove(listPath)
+        manifest.load()
+
+    else:
+        # Bleed each page in turn, recording it in the manifest as soon as it is saved
+        for index, pagePath in enumerate(pendingPagePaths):
+            startTime = time.time()
+            try:
+                bleed_page(pagePath, batch.get_output_path(pagePath, outputDir), left, right, top, bottom)
+                manifest.add_record(pagePath, "done", settings, seconds=time.time() - startTime)
+            except Exception as err:
+                manifest.add_record(pagePath, "failed", settings, error=str(err))
+            gimp.progress_update(float(index + 1) / float(len(pendingPagePaths)))
+
+    # Report the results
+    numDone = manifest.count(pagePaths, "done", settings)
+    numFailed = manifest.count(pagePaths, "failed", settings)
+    gimp.message("Added bleed to " + str(numDone) + " of " + str(len(pagePaths)) + " pages" + (", " + str(numFailed) + " failed" if numFailed > 0 else ""))
     pdb.gimp_progress_end()
 
 register(
@@ -152,8 +340,32 @@ register(
         (PF_INT, "right", "Right", 43),
         (PF_INT, "top", "Top", 43),
         (PF_INT, "bottom", "Bottom", 43),
+        (PF_BOOL, "lowMemory", "Low memory (clipboard engine only: no undo, opens the result as a new image)", False),
     ],
     [],
     dan200_mirror_bleed)
 
-main()
+register(
+    "dan200-mirror-bleed-batch",
+    "Add a mirrored bleed margin to many pages",
+    "Add a mirrored bleed margin to every page in a folder, or every page matching a pattern, and save them to an output folder. Finished pages are recorded in a manifest in the output folder, so an interrupted run can be resumed",
+    "Daniel Ratcliffe",
+    "Daniel Ratcliffe",
+    "2022",
+    "Add Mirror Bleed (Batch)...",
+    "",
+    [
+        (PF_STRING, "pages", "Pages (folder or pattern)", ""),
+        (PF_DIRNAME, "outputDir", "Output folder", ""),
+        (PF_INT, "left", "Left", 43),
+        (PF_INT, "right", "Right", 43),
+        (PF_INT, "top", "Top", 43),
+        (PF_INT, "bottom", "Bottom", 43),
+        (PF_SPINNER, "workers", "GIMP processes", 4, (1, 32, 1)),
+    ],
+    [],
+    dan200_mirror_bleed_batch,
+    menu="<Image>/Tools/Comic Tools")
+
+if __name__ == "__main__":
+    main()
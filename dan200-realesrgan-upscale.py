@@ -9,6 +9,16 @@ from gimpfu import *
 import math
 import subprocess
 import os
+import sys
+import hashlib
+import shutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from dan200_comictools import instrument
+from dan200_comictools.cache import DirectoryCache
+from dan200_comictools.layertree import LAYER_KIND_RASTER, LAYER_KIND_TEXT, snapshot_layer_tree
+from dan200_comictools.lowmemory import cancel_low_memory_run, finish_low_memory_run, start_low_memory_run
+from dan200_comictools.pixels import blend_over, crop_pixels
 
 # The location of the Real-ESRGAN EXE
 # Edit these variables if realesgran is installed in a different location
@@ -16,66 +26,443 @@ import os
 REALESRGAN_EXE = "realesrgan-ncnn-vulkan.exe"
 REALESRGAN_PATH = os.path.dirname(__file__) + "\\realesrgan\\" + REALESRGAN_EXE
 
-def upscale_layer(img, layer, scale) :
-    if gimp.pdb.gimp_item_is_group(layer):
-        # Upscale children
-        numChildren, childIDs = gimp.pdb.gimp_item_get_children(layer)
-        for childID in childIDs:
-            child = gimp.Item.from_id(childID)
-            upscale_layer(img, child, scale)
+# Upscaled layers are cached on disk, keyed by a hash of their pixels and the upscaler settings
+# The least recently used results are deleted when the cache grows beyond the size limit. Set the limit to 0 to disable the cache
+UPSCALE_CACHE_PATH = os.path.join(gimp.directory, "dan200-comictools", "upscale-cache")
+UPSCALE_CACHE_SIZE_MB = 2048
 
-    else:
-        # Get layer box
-        x, y = gimp.pdb.gimp_drawable_offsets(layer)
-        w, h = layer.width, layer.height
+# Layers are exported, upscaled and imported in chunks, so that GIMP can export the next chunk and import the last one
+# while the upscaler works on the current one. Each chunk holds whole layers, and is closed once it has this many pixels to upscale
+UPSCALE_CHUNK_PIXELS = 8 * 1024 * 1024
+
+# The most chunks which can be waiting on disk at once, to limit the disk space used by the staging directory
+UPSCALE_PIPELINE_DEPTH = 2
+
+# Upscaled tiles are written into the layer this many rows at a time
+UPSCALE_STRIP_HEIGHT = 64
+
+upscaleCache = DirectoryCache(UPSCALE_CACHE_PATH, UPSCALE_CACHE_SIZE_MB * 1024 * 1024, "png")
+
+def get_tile_spans(length, tileSize, overlap) :
+    # Split a length into spans of at most tileSize, where each span overlaps the previous one
+    if tileSize <= 0 or length <= tileSize:
+        return [(0, length)]
+    overlap = max(min(overlap, tileSize // 2), 0)
+    spans = []
+    start = 0
+    while True:
+        end = min(start + tileSize, length)
+        spans.append((start, end - start))
+        if end >= length:
+            return spans
+        start = end - overlap
+
+def export_layer_region(layer, x, y, w, h, path) :
+    # Copy the region into a new image, without going through the clipboard
+    tempImage = gimp.pdb.gimp_image_new(w, h, RGB if layer.is_rgb else GRAY)
+    try:
+        tempLayer = gimp.pdb.gimp_layer_new(tempImage, w, h, layer.type, "Tile", 100, 0)
+        gimp.pdb.gimp_image_insert_layer(tempImage, tempLayer, None, 0)
+        srcRgn = layer.get_pixel_rgn(x, y, w, h, False, False)
+        dstRgn = tempLayer.get_pixel_rgn(0, 0, w, h, True, False)
+        dstRgn[0:w, 0:h] = srcRgn[x:x + w, y:y + h]
+        tempLayer.flush()
+
+        # Save it to disk
+        gimp.pdb.file_png_save_defaults( tempImage, tempLayer, path, path )
+
+    finally:
+        gimp.pdb.gimp_image_delete(tempImage)
+
+def get_feather_weights(length, overlap) :
+    # Fade in linearly across the overlap, sampling at the centre of each pixel like GIMP's gradients
+    return [min((index + 0.5) / float(overlap), 1.0) if overlap > 0 else 1.0 for index in range(length)]
+
+def match_layer_format(tempImage, tempLayer, layer) :
+    # Give the loaded tile the same channels as the layer it will be written into
+    if layer.is_rgb and not tempLayer.is_rgb:
+        gimp.pdb.gimp_image_convert_rgb(tempImage)
+    elif not layer.is_rgb and tempLayer.is_rgb:
+        gimp.pdb.gimp_image_convert_grayscale(tempImage)
+    if layer.has_alpha and not tempLayer.has_alpha:
+        gimp.pdb.gimp_layer_add_alpha(tempLayer)
+    elif not layer.has_alpha and tempLayer.has_alpha:
+        gimp.pdb.gimp_image_flatten(tempImage)
+
+def clear_layer_region(layer, dstRgn, x, y, w, h) :
+    # Write transparent pixels into the region a strip at a time
+    for stripY in range(y, y + h, UPSCALE_STRIP_HEIGHT):
+        stripHeight = min(UPSCALE_STRIP_HEIGHT, y + h - stripY)
+        dstRgn[x:x + w, stripY:stripY + stripHeight] = b"\x00" * (w * stripHeight * layer.bpp)
+
+def paste_upscaled_tile(layer, dstRgn, path, x, y, leftOverlap, topOverlap) :
+    # Load it back in, to write into the pixel region at x, y in the layer's own coordinates
+    tempImage = gimp.pdb.file_png_load(path, path)
+    try:
+        match_layer_format(tempImage, tempImage.layers[0], layer)
+        tempLayer = tempImage.layers[0]
+
+        # Only write the part of the tile which is inside the layer
+        w, h = min(tempLayer.width, layer.width - x), min(tempLayer.height, layer.height - y)
+        if w <= 0 or h <= 0:
+            return
+        leftOverlap, topOverlap = min(leftOverlap, w), min(topOverlap, h)
+
+        # Write the tile straight into the layer a strip at a time, without going through the clipboard
+        # The tile fades in over the tiles to its left and above it, and replaces the cleared pixels everywhere else
+        bpp = layer.bpp
+        srcRgn = tempLayer.get_pixel_rgn(0, 0, w, h, False, False)
+        columnWeights = get_feather_weights(w, leftOverlap)
+        rowWeights = get_feather_weights(h, topOverlap)
+        for stripY in range(0, h, UPSCALE_STRIP_HEIGHT):
+            stripHeight = min(UPSCALE_STRIP_HEIGHT, h - stripY)
+            strip = srcRgn[0:w, stripY:stripY + stripHeight]
+            numBandRows = max(min(topOverlap - stripY, stripHeight), 0)
+            if numBandRows > 0:
+                band = crop_pixels(strip, w, bpp, 0, 0, w, numBandRows)
+                dst = dstRgn[x:x + w, y + stripY:y + stripY + numBandRows]
+                dstRgn[x:x + w, y + stripY:y + stripY + numBandRows] = bytes(blend_over(band, dst, w, numBandRows, bpp, columnWeights, rowWeights[stripY:stripY + numBandRows]))
+            restY, restHeight = stripY + numBandRows, stripHeight - numBandRows
+            if restHeight <= 0:
+                continue
+            if leftOverlap > 0:
+                band = crop_pixels(strip, w, bpp, 0, numBandRows, leftOverlap, restHeight)
+                dst = dstRgn[x:x + leftOverlap, y + restY:y + restY + restHeight]
+                dstRgn[x:x + leftOverlap, y + restY:y + restY + restHeight] = bytes(blend_over(band, dst, leftOverlap, restHeight, bpp, columnWeights[0:leftOverlap], [1.0] * restHeight))
+            if leftOverlap < w:
+                rest = strip if (leftOverlap, numBandRows) == (0, 0) else crop_pixels(strip, w, bpp, leftOverlap, numBandRows, w - leftOverlap, restHeight)
+                dstRgn[x + leftOverlap:x + w, y + restY:y + restY + restHeight] = bytes(rest)
+
+    finally:
+        gimp.pdb.gimp_image_delete(tempImage)
+
+def can_find_layer_content(img, record) :
+    # Transparent pixels are found using the selection, which can't extend outside the image
+    if record.x < 0 or record.y < 0 or (record.x + record.w) > img.width or (record.y + record.h) > img.height:
+        return False
+    return gimp.pdb.gimp_drawable_has_alpha(record.layer)
+
+def get_layer_content_bounds(img, record) :
+    # Select the layer's alpha channel, and measure it
+    gimp.pdb.gimp_image_select_item(img, CHANNEL_OP_REPLACE, record.layer)
+    nonEmpty, x1, y1, x2, y2 = gimp.pdb.gimp_selection_bounds(img)
+    gimp.pdb.gimp_selection_none(img)
+    if not nonEmpty:
+        return None
+    return x1 - record.x, y1 - record.y, x2 - x1, y2 - y1
+
+def is_layer_region_empty(img, record, x, y, w, h) :
+    # Count the pixels in the region which aren't fully transparent
+    gimp.pdb.gimp_image_select_rectangle(img, CHANNEL_OP_REPLACE, record.x + x, record.y + y, w, h)
+    _, _, _, _, count, _ = gimp.pdb.gimp_drawable_histogram(record.layer, HISTOGRAM_ALPHA, 1.0 / 255.0, 1.0)
+    return count == 0
+
+def get_upscaler_args(scale) :
+    return ["-s", str(scale), "-f", "png"]
+
+def start_upscaler(inputPath, outputPath, scale) :
+    # The input and output paths can be files, or directories to upscale every file in a directory
+    # The upscaler runs in the background, so call wait() on the process returned to wait for it to finish
+    instrument.count_subprocess()
+    return subprocess.Popen([REALESRGAN_EXE, "-i", inputPath, "-o", outputPath] + get_upscaler_args(scale), executable=REALESRGAN_PATH)
+
+def get_upscaler_version() :
+    # Changing the upscaler executable invalidates the cache
+    try:
+        stat = os.stat(REALESRGAN_PATH)
+        return str(stat.st_size) + ":" + str(int(stat.st_mtime))
+    except OSError:
+        return ""
+
+def hash_layer_region(layer, x, y, w, h, scale) :
+    # Hash the upscaler settings
+    hasher = hashlib.sha1()
+    settings = [REALESRGAN_EXE, get_upscaler_version()] + get_upscaler_args(scale) + [str(w), str(h), str(layer.bpp)]
+    hasher.update("|".join(settings).encode("utf-8"))
+
+    # Hash the pixels a strip at a time, so the whole region is never in memory at once
+    stripHeight = 64
+    rgn = layer.get_pixel_rgn(x, y, w, h, False, False)
+    for stripY in range(y, y + h, stripHeight):
+        hasher.update(rgn[x:x + w, stripY:min(stripY + stripHeight, y + h)])
+    return hasher.hexdigest()
+
+def scale_text_layer(record, scale) :
+    # Get layer box
+    layer = record.layer
+    x, y = record.x, record.y
+    w, h = record.w, record.h
+
+    # Scale the bounding box
+    gimp.pdb.gimp_layer_set_offsets(layer, x * scale, y * scale)
+    gimp.pdb.gimp_text_layer_resize(layer, w * scale, h * scale)
+
+    # Scale the text properties
+    fontSize, fontSizeUnit = gimp.pdb.gimp_text_layer_get_font_size(layer)
+    gimp.pdb.gimp_text_layer_set_font_size(layer, fontSize * scale, fontSizeUnit)
+
+    indent = gimp.pdb.gimp_text_layer_get_indent(layer)
+    gimp.pdb.gimp_text_layer_set_indent(layer, indent * scale)
 
-        if gimp.pdb.gimp_item_is_text_layer(layer):
-            # Scale the bounding box
-            gimp.pdb.gimp_layer_set_offsets(layer, x * scale, y * scale)
-            gimp.pdb.gimp_text_layer_resize(layer, w * scale, h * scale)
+    lineSpacing = gimp.pdb.gimp_text_layer_get_line_spacing(layer)
+    gimp.pdb.gimp_text_layer_set_line_spacing(layer, lineSpacing * scale)
 
-            # Scale the text properties
-            fontSize, fontSizeUnit = gimp.pdb.gimp_text_layer_get_font_size(layer)
-            gimp.pdb.gimp_text_layer_set_font_size(layer, fontSize * scale, fontSizeUnit)
+    letterSpacing = gimp.pdb.gimp_text_layer_get_letter_spacing(layer)
+    gimp.pdb.gimp_text_layer_set_letter_spacing(layer, letterSpacing * scale)
 
-            indent = gimp.pdb.gimp_text_layer_get_indent(layer)
-            gimp.pdb.gimp_text_layer_set_indent(layer, indent * scale)
+class UpscaleJob(object) :
+    __slots__ = ("layer", "x", "y", "w", "h", "tiles", "keys", "emptyRegions")
 
-            lineSpacing = gimp.pdb.gimp_text_layer_get_line_spacing(layer)
-            gimp.pdb.gimp_text_layer_set_line_spacing(layer, lineSpacing * scale)
+    def __init__(self, layer, x, y, w, h, tiles, keys, emptyRegions) :
+        self.layer = layer
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.tiles = tiles
+        self.keys = keys
+        self.emptyRegions = emptyRegions
 
-            letterSpacing = gimp.pdb.gimp_text_layer_get_letter_spacing(layer)
-            gimp.pdb.gimp_text_layer_set_letter_spacing(layer, letterSpacing * scale)
+def plan_upscale_jobs(img, records, scale, tileSize, tileOverlap) :
+    # Plan a job for each raster layer in the snapshot of the layer tree
+    jobs = []
+    for record in records:
+        if record.kind == LAYER_KIND_TEXT:
+            # Text layers don't need the upscaler, so they can be scaled straight away
+            with instrument.item(record.layer.name), instrument.stage("scale text"):
+                scale_text_layer(record, scale)
 
+        elif record.kind == LAYER_KIND_RASTER:
+            with instrument.item(record.layer.name):
+                jobs.append(plan_raster_layer_job(img, record, scale, tileSize, tileOverlap))
+    return jobs
+
+def plan_raster_layer_job(img, record, scale, tileSize, tileOverlap) :
+    # Get layer box
+    layer = record.layer
+    x, y = record.x, record.y
+    w, h = record.w, record.h
+
+    # Find the part of the layer which isn't transparent
+    with instrument.stage("find content"):
+        canSkipTransparency = can_find_layer_content(img, record)
+        if canSkipTransparency:
+            content = get_layer_content_bounds(img, record)
         else:
-            # Save the layer to disk
-            tempImagePath = gimp.pdb.gimp_temp_name("png")
-            gimp.pdb.file_png_save_defaults( img, layer, tempImagePath, tempImagePath )
-
-            # Upscale it
-            tempOutputImagePath = gimp.pdb.gimp_temp_name("png")
-            subprocess.call([REALESRGAN_EXE, "-i", tempImagePath, "-o", tempOutputImagePath, "-s", str(scale)], executable=REALESRGAN_PATH)
-
-            # Load it back in
-            tempImage = gimp.pdb.file_png_load(tempOutputImagePath, tempOutputImagePath)
-            tempLayer = tempImage.layers[0]
-
-            # Resize and clear the original layer
-            gimp.pdb.gimp_layer_resize(layer, w * scale, h * scale, 0, 0)
-            gimp.pdb.gimp_layer_set_offsets(layer, x * scale, y * scale)
-            gimp.pdb.gimp_edit_clear(layer)
-
-            # Copy the loaded image into the original layer
-            gimp.pdb.gimp_edit_copy(tempLayer)
-            fltLayer = gimp.pdb.gimp_edit_paste(layer, False)
-            gimp.pdb.gimp_floating_sel_anchor(fltLayer)
-
-            # Clean up
-            gimp.pdb.gimp_image_delete(tempImage)
-            os.remove(tempImagePath)
-            os.remove(tempOutputImagePath)
-
-def dan200_realesrgan_upscale(img, layer, scale, currentLayerOnly) :
+            content = (0, 0, w, h)
+
+    # Split it into overlapping tiles, so the upscaler never has to hold the whole layer in memory
+    # Each tile fades in over the tiles to its left and above it
+    tiles = []
+    if content != None:
+        cx, cy, cw, ch = content
+        for ty, th in get_tile_spans(ch, tileSize, tileOverlap):
+            for tx, tw in get_tile_spans(cw, tileSize, tileOverlap):
+                leftOverlap = tileOverlap if tx > 0 else 0
+                topOverlap = tileOverlap if ty > 0 else 0
+                tiles.append((cx + tx, cy + ty, tw, th, leftOverlap, topOverlap))
+
+    # Skip any tiles which are completely transparent
+    # The parts of the layer outside its content and the skipped tiles are left transparent when it is upscaled
+    emptyRegions = []
+    if content != None:
+        cx, cy, cw, ch = content
+        emptyRegions = [(0, 0, w, cy), (0, cy + ch, w, h - cy - ch), (0, cy, cx, ch), (cx + cw, cy, w - cx - cw, ch)]
+        emptyRegions = [region for region in emptyRegions if region[2] > 0 and region[3] > 0]
+    if canSkipTransparency and len(tiles) > 1:
+        with instrument.stage("skip empty tiles"):
+            emptyTiles = [tile for tile in tiles if is_layer_region_empty(img, record, *tile[0:4])]
+            gimp.pdb.gimp_selection_none(img)
+        tiles = [tile for tile in tiles if tile not in emptyTiles]
+        emptyRegions.extend([tile[0:4] for tile in emptyTiles])
+
+    # Hash each tile, to find it in the cache
+    with instrument.stage("hash"):
+        keys = [hash_layer_region(layer, tx, ty, tw, th, scale) for tx, ty, tw, th, _, _ in tiles]
+    return UpscaleJob(layer, x, y, w, h, tiles, keys, emptyRegions)
+
+class UpscaleChunk(object) :
+    __slots__ = ("jobs", "tiles", "numPixels", "inputPath", "process")
+
+    def __init__(self) :
+        self.jobs = []
+        self.tiles = []
+        self.numPixels = 0
+        self.inputPath = None
+        self.process = None
+
+def plan_upscale_chunks(jobs) :
+    # Group the layers into chunks. Each tile which isn't cached is upscaled in the first chunk which needs it,
+    # so identical tiles are only saved and upscaled once
+    chunks = []
+    chunk = None
+    plannedKeys = set()
+    for job in jobs:
+        if chunk == None:
+            chunk = UpscaleChunk()
+            chunks.append(chunk)
+        chunk.jobs.append(job)
+        for tile, key in zip(job.tiles, job.keys):
+            if key in plannedKeys or upscaleCache.get_path(key) != None:
+                continue
+            plannedKeys.add(key)
+            chunk.tiles.append((job, tile, key))
+            chunk.numPixels = chunk.numPixels + tile[2] * tile[3]
+        if chunk.numPixels >= UPSCALE_CHUNK_PIXELS:
+            chunk = None
+    return chunks
+
+def export_upscale_chunk(img, chunk, inputPath) :
+    # Save every tile in the chunk to its own input directory, named after its hash
+    chunk.inputPath = inputPath
+    os.makedirs(inputPath)
+    for job, (tx, ty, tw, th, _, _), key in chunk.tiles:
+        with instrument.item(job.layer.name), instrument.stage("export"):
+            tempImagePath = os.path.join(inputPath, key + ".png")
+            if (tx, ty, tw, th) == (0, 0, job.w, job.h):
+                gimp.pdb.file_png_save_defaults( img, job.layer, tempImagePath, tempImagePath )
+            else:
+                export_layer_region(job.layer, tx, ty, tw, th, tempImagePath)
+
+def finish_upscale_chunk(chunk, outputPath) :
+    # Wait for the upscaler, then cache its output
+    if chunk.process != None:
+        with instrument.stage("upscaler"):
+            chunk.process.wait()
+        chunk.process = None
+        with instrument.stage("cache store"):
+            for _, _, key in chunk.tiles:
+                tempOutputImagePath = os.path.join(outputPath, key + ".png")
+                if os.path.exists(tempOutputImagePath):
+                    upscaleCache.put_file(key, tempOutputImagePath)
+    shutil.rmtree(chunk.inputPath, ignore_errors=True)
+
+def import_upscaled_job(job, outputPath, scale) :
+    with instrument.item(job.layer.name):
+        # Resize the original layer
+        layer = job.layer
+        with instrument.stage("resize"):
+            gimp.pdb.gimp_layer_resize(layer, job.w * scale, job.h * scale, 0, 0)
+            gimp.pdb.gimp_layer_set_offsets(layer, job.x * scale, job.y * scale)
+
+            # Layers which are completely transparent have no tiles, so are just cleared
+            if len(job.tiles) == 0:
+                gimp.pdb.gimp_edit_clear(layer)
+                return
+
+        # pygimp keeps the drawable it made the first time the layer's pixels were read, at the layer's old size,
+        # so look the layer up again to get one at its new size
+        layer = gimp.Item.from_id(layer.ID)
+
+        # Every pixel of the layer is written to its shadow buffer, then merged into it in one step which can be undone
+        dstRgn = layer.get_pixel_rgn(0, 0, layer.width, layer.height, True, True)
+        with instrument.stage("clear"):
+            for rx, ry, rw, rh in job.emptyRegions:
+                clear_layer_region(layer, dstRgn, rx * scale, ry * scale, rw * scale, rh * scale)
+
+        # Copy each upscaled tile into the shadow buffer
+        for (tx, ty, tw, th, leftOverlap, topOverlap), key in zip(job.tiles, job.keys):
+            tempOutputImagePath = os.path.join(outputPath, key + ".png")
+            if not os.path.exists(tempOutputImagePath):
+                tempOutputImagePath = upscaleCache.get_path(key)
+                if tempOutputImagePath == None:
+                    raise Exception("Real-ESRGAN did not upscale " + key + ".png")
+            with instrument.stage("paste"):
+                paste_upscaled_tile(layer, dstRgn, tempOutputImagePath, tx * scale, ty * scale, leftOverlap * scale, topOverlap * scale)
+
+        with instrument.stage("merge"):
+            layer.flush()
+            layer.merge_shadow(True)
+            layer.update(0, 0, layer.width, layer.height)
+
+def upscale_layers(img, layers, scale, tileSize=0, tileOverlap=0) :
+    # Find every raster layer which needs upscaling
+    tileOverlap = max(min(tileOverlap, tileSize // 2), 0)
+    with instrument.stage("snapshot layers"):
+        records = snapshot_layer_tree(gimp, layers)
+    jobs = plan_upscale_jobs(img, records, scale, tileSize, tileOverlap)
+    if len(jobs) == 0:
+        return jobs
+    chunks = plan_upscale_chunks(jobs)
+
+    # Work out which chunk each layer is in, and which layer is the last to use each tile
+    jobChunks = []
+    for chunkIndex, chunk in enumerate(chunks):
+        jobChunks.extend([chunkIndex] * len(chunk.jobs))
+    lastUses = {}
+    for jobIndex, job in enumerate(jobs):
+        for key in job.keys:
+            lastUses[key] = jobIndex
+
+    # Create a staging directory for the upscaler's input and output
+    stagingPath = gimp.pdb.gimp_temp_name("dir")
+    outputPath = os.path.join(stagingPath, "output")
+    os.makedirs(outputPath)
+
+    numExported = 0
+    numStarted = 0
+    numFinished = 0
+    numImported = 0
+    try:
+        while numImported < len(jobs):
+            # As soon as the upscaler finishes a chunk, start it on the next one
+            if numFinished < numStarted and chunks[numFinished].process.poll() != None:
+                finish_upscale_chunk(chunks[numFinished], outputPath)
+                numFinished = numFinished + 1
+            while numStarted == numFinished and numStarted < numExported:
+                chunk = chunks[numStarted]
+                numStarted = numStarted + 1
+                if len(chunk.tiles) > 0:
+                    chunk.process = start_upscaler(chunk.inputPath, outputPath, scale)
+                else:
+                    # Everything in the chunk is cached already
+                    finish_upscale_chunk(chunk, outputPath)
+                    numFinished = numFinished + 1
+
+            # Import the next layer once its chunk has been upscaled
+            if jobChunks[numImported] < numFinished:
+                job = jobs[numImported]
+                import_upscaled_job(job, outputPath, scale)
+                for key in job.keys:
+                    tempOutputImagePath = os.path.join(outputPath, key + ".png")
+                    if lastUses[key] == numImported and os.path.exists(tempOutputImagePath):
+                        os.remove(tempOutputImagePath)
+                numImported = numImported + 1
+                gimp.progress_update(float(numImported) / float(len(jobs)))
+                continue
+
+            # Export the next chunk while the upscaler works, if there's room for it
+            numOnDisk = numExported - (jobChunks[numImported] if numImported < len(jobs) else len(chunks))
+            if numExported < len(chunks) and numOnDisk < UPSCALE_PIPELINE_DEPTH:
+                export_upscale_chunk(img, chunks[numExported], os.path.join(stagingPath, "input" + str(numExported)))
+                numExported = numExported + 1
+                continue
+
+            # Nothing else can be done until the upscaler finishes
+            finish_upscale_chunk(chunks[numFinished], outputPath)
+            numFinished = numFinished + 1
+
+    finally:
+        # Clean up
+        for chunk in chunks:
+            if chunk.process != None and chunk.process.poll() == None:
+                chunk.process.kill()
+                chunk.process.wait()
+        shutil.rmtree(stagingPath, ignore_errors=True)
+    return jobs
+
+def upscale_layer(img, layer, scale, tileSize=0, tileOverlap=0) :
+    return upscale_layers(img, [layer], scale, tileSize, tileOverlap)
+
+def estimate_undo_bytes(jobs, scale) :
+    # Resizing a layer keeps its old pixels on the undo stack, and merging the upscaled pixels into it keeps all of it again
+    numBytes = 0
+    for job in jobs:
+        bpp = job.layer.bpp
+        numBytes = numBytes + job.w * job.h * bpp + (job.w * scale) * (job.h * scale) * bpp
+    return numBytes
+
+def dan200_realesrgan_upscale(img, layer, scale, currentLayerOnly, tileSize, tileOverlap, lowMemory=False) :
     # Check realesrgan is installed
     if not os.path.exists(REALESRGAN_PATH):
         gimp.message("Could not find " + REALESRGAN_PATH + "\Real-ESRGAN can be downloaded from https://github.com/xinntao/Real-ESRGAN")
@@ -83,27 +470,38 @@ def dan200_realesrgan_upscale(img, layer, scale, currentLayerOnly) :
 
     # Start
     gimp.progress_init("Please wait ...")
-    gimp.pdb.gimp_image_undo_group_start(img)
+    instrument.start_run("realesrgan-upscale", gimp)
+    if lowMemory:
+        # Work on a duplicate of the image without undo, leaving the original as it was
+        img, layer, duplicateBytes = start_low_memory_run(gimp, img, layer)
+    else:
+        gimp.pdb.gimp_image_undo_group_start(img)
 
     try:
         gimp.pdb.gimp_selection_none(img)
         if currentLayerOnly:
             # Resize the current layer
-            upscale_layer(img, layer, scale)
+            jobs = upscale_layer(img, layer, scale, tileSize, tileOverlap)
         else:
-            # Resize each layer
-            for layer in img.layers:
-                upscale_layer(img, layer, scale)
+            # Resize every layer, upscaling them all together
+            jobs = upscale_layers(img, img.layers, scale, tileSize, tileOverlap)
 
             # Resize the image
             gimp.pdb.gimp_image_resize_to_layers(img)
 
+        if lowMemory:
+            finish_low_memory_run(gimp, img, estimate_undo_bytes(jobs, scale), duplicateBytes)
+
     except Exception as err:
         gimp.message("Unexpected error: " + str(err))
+        if lowMemory:
+            cancel_low_memory_run(gimp, img)
 
     # Finish
-    pdb.gimp_image_undo_group_end(img)
+    if not lowMemory:
+        pdb.gimp_image_undo_group_end(img)
     pdb.gimp_progress_end()
+    instrument.finish_run()
 
 register(
     "dan200-realesgran-upscale",
@@ -116,9 +514,13 @@ register(
     "RGB*, GRAY*",
     [
         (PF_SPINNER, "scale", "Scale", 4, (2, 4, 1)),
-        (PF_BOOL, "currentLayerOnly", "Current Layer Only", False)
+        (PF_BOOL, "currentLayerOnly", "Current Layer Only", False),
+        (PF_SPINNER, "tileSize", "Tile Size (0 for no tiling)", 1024, (0, 16384, 64)),
+        (PF_SPINNER, "tileOverlap", "Tile Overlap", 32, (0, 512, 4)),
+        (PF_BOOL, "lowMemory", "Low memory (no undo, opens the result as a new image)", False)
     ],
     [],
     dan200_realesrgan_upscale)
 
-main()
+if __name__ == "__main__":
+    main()
\ No newline at end of file
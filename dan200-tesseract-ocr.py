@@ -6,10 +6,21 @@
 # --------------------
 
 from gimpfu import *
+import hashlib
 import math
 import subprocess
 import os
-import xml.etree.ElementTree as ET
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from dan200_comictools import batch, instrument
+from dan200_comictools.cache import PersistentLRUCache
+from dan200_comictools.islands import IslandFinder, find_island_holes, get_filled_island_mask, remove_enclosed_islands
+from dan200_comictools.ocrpreprocess import preprocess_ocr_crop
+from dan200_comictools.ocrresults import OCR_FORMAT_EXTENSIONS, decode_page, encode_page, parse_ocr_data, parse_ocr_file, scale_page
+from dan200_comictools.pixels import apply_mask, crop_pixels, encode_pnm
+from dan200_comictools.textmetrics import GlyphAdvanceTable, MeasurementErrors
 
 # The location of tesseract.exe
 # Edit these variables if tesseeract is installed in a different location
@@ -17,10 +28,104 @@ import xml.etree.ElementTree as ET
 TESSERACT_EXE = "tesseract.exe"
 TESSERACT_PATH = "C:\\Program Files\\Tesseract-OCR\\" + TESSERACT_EXE
 
+# The language tesseract reads the text in
+TESSERACT_LANGUAGE = "eng"
+
 OCR_MODE_WORDS = 0
 OCR_MODE_LINES = 1
 OCR_MODE_BLOCKS = 2
 
+# The output format requested from tesseract: "alto", "tsv" or "hocr"
+# All three contain the same blocks, lines and words, but tsv is the quickest to parse
+TESSERACT_OUTPUT_FORMAT = "tsv"
+
+# How the selection islands are passed to tesseract
+# "file" saves each island to a temporary file, which lets several islands share one tesseract process
+# "pipe" streams each island through tesseract's stdin and stdout instead, which avoids the temporary files
+# but needs one tesseract process per island. If tesseract can't use pipes, temporary files are used instead
+TESSERACT_IO_MODE = "file"
+tesseractPipesAvailable = True
+
+# Each island is converted to black and white before it is sent to tesseract, and scaled so that its lines of text are
+# about OCR_TARGET_LINE_HEIGHT pixels high. The boxes tesseract returns are scaled back to the original size
+# Set OCR_TARGET_LINE_HEIGHT to 0 to keep every island at its original size, and OCR_MAX_SCALE above 1 to also enlarge small text
+# Islands are never shrunk below OCR_MIN_SCALE, however large their text seems to be
+OCR_PREPROCESS = True
+OCR_TARGET_LINE_HEIGHT = 40
+OCR_MIN_SCALE = 0.25
+OCR_MAX_SCALE = 1.0
+
+# The holes in each island of the selection are filled in, and the island is shrunk by a pixel to leave out its edge
+OCR_SHRINK_ISLANDS = True
+
+# The selection mask is read from GIMP this many rows at a time when looking for islands
+SELECTION_STRIP_HEIGHT = 64
+
+# OCR the selection islands in batches, one per tesseract process, so the language model is only loaded once per process
+TESSERACT_BATCH_ISLANDS = True
+
+# Add all of the text layers together once every island has been OCRed, with the layers panel frozen,
+# and only redraw the display once at the end. This is much faster when there are hundreds of layers
+# Set this to False to see the text layers appear as soon as each island has been OCRed
+OCR_BULK_INSERT = True
+
+# How far through the progress bar each stage of the OCR ends
+PROGRESS_EXPORTED = 0.2
+PROGRESS_RECOGNISED = 0.9
+
+# The name of the manifest written to the output folder by batch runs
+OCR_MANIFEST_NAME = "tesseract-ocr-manifest.jsonl"
+
+# Batch runs share the pages between GIMP processes, so each page only uses this many tesseract processes
+BATCH_TESSERACT_WORKERS = 1
+
+# When batch runs aren't given a balloon mask layer, balloons are found by selecting the white parts of the page,
+# then growing and shrinking the selection to fill in the lettering, and shrinking and growing it to drop small specks
+AUTO_DETECT_COLOR = (255, 255, 255)
+AUTO_DETECT_THRESHOLD = 24
+AUTO_DETECT_CLOSE_RADIUS = 8
+AUTO_DETECT_OPEN_RADIUS = 4
+
+# The text tesseract finds in each island is cached on disk, keyed by the island's pixels, so running OCR again
+# after editing a page only sends the islands which have changed to tesseract. Set the size to 0 to disable it
+OCR_RESULTS_CACHE_PATH = os.path.join(gimp.directory, "dan200-comictools", "ocr-results.json")
+OCR_RESULTS_CACHE_SIZE = 4096
+
+# Font metrics are measured by rendering text offscreen, which is slow, so the results are cached on disk
+# Delete this file if a font is changed or reinstalled
+FONT_METRICS_CACHE_PATH = os.path.join(gimp.directory, "dan200-comictools", "font-metrics.json")
+FONT_METRICS_CACHE_SIZE = 1024
+FONT_METRICS_TEST_SIZE = 100
+
+# The vertical extent of a line of text only depends on which glyphs it contains
+# Glyphs which share an ascender/descender class are measured once, using one representative glyph
+GLYPH_CLASSES = {
+    "x" : "acemnorsuvwxz",
+    "d" : "bdhkl",
+    "p" : "gpqy",
+    "H" : "ABCDEFGHIKLMNOPRSTUVWXYZ",
+    "0" : "0123456789",
+}
+# How autoSpacing measures the width and height of text
+# "table" adds up the advance of each glyph and the kerning between each pair, from a table measured for each font
+# at GLYPH_TABLE_REFERENCE_SIZE and kept in the font metrics cache. The glyphs and pairs in all of the recognised text
+# are measured in one batch before any of it is laid out
+# "pdb" asks GIMP to lay out each line instead, which is exact but needs a PDB call for each line
+# "compare" uses GIMP's measurements, but also works out the table's, and reports how far apart they were
+GLYPH_TABLE_MODE = "table"
+GLYPH_TABLE_REFERENCE_SIZE = 100
+
+GLYPH_CLASS_REPRESENTATIVES = {}
+for representative, glyphs in GLYPH_CLASSES.items():
+    for glyph in glyphs:
+        GLYPH_CLASS_REPRESENTATIVES[glyph] = representative
+
+fontMetricsCache = PersistentLRUCache(FONT_METRICS_CACHE_PATH, FONT_METRICS_CACHE_SIZE)
+ocrResultsCache = PersistentLRUCache(OCR_RESULTS_CACHE_PATH, OCR_RESULTS_CACHE_SIZE)
+glyphTables = {}
+glyphTableErrors = [MeasurementErrors("Line widths"), MeasurementErrors("Block heights")]
+tesseractVersion = None
+
 def add_text_layer(img, parentLayer, text, fontName, fontSize, x, y, w, h, letterSpacing, lineSpacing) :
     # Add the text
     textLayer = gimp.pdb.gimp_text_layer_new(img, text, fontName, fontSize, PIXELS)
@@ -31,42 +136,156 @@ def add_text_layer(img, parentLayer, text, fontName, fontSize, x, y, w, h, lette
     gimp.pdb.gimp_text_layer_set_letter_spacing(textLayer, letterSpacing)
     gimp.pdb.gimp_text_layer_set_line_spacing(textLayer, lineSpacing)
 
-def measure_font_metrics(fontName, testText) :
-    # Draw a line of text to an offscreen image
-    testFontSize = 100
+def measure_glyph_metrics(fontName, glyph) :
+    # Draw the glyph to an offscreen image
+    testFontSize = FONT_METRICS_TEST_SIZE
     padding = 1
-    w,h,a,d = gimp.pdb.gimp_text_get_extents_fontname(testText, testFontSize, PIXELS, fontName)
+    w,h,a,d = gimp.pdb.gimp_text_get_extents_fontname(glyph, testFontSize, PIXELS, fontName)
     tempImage = gimp.pdb.gimp_image_new(w + 2 * padding, h + 2 * padding, RGB)
     tempLayer = gimp.pdb.gimp_layer_new(tempImage, w + 2 * padding, h + 2 * padding, RGB_IMAGE, "temp", 100, 0)
     gimp.pdb.gimp_image_insert_layer(tempImage, tempLayer, None, 0)
     gimp.pdb.gimp_drawable_fill(tempLayer, FILL_WHITE)
-    tempFlt = gimp.pdb.gimp_text_fontname(tempImage, tempLayer, padding, padding, testText, -1, FALSE, testFontSize, PIXELS, fontName)
+    tempFlt = gimp.pdb.gimp_text_fontname(tempImage, tempLayer, padding, padding, glyph, -1, FALSE, testFontSize, PIXELS, fontName)
     gimp.pdb.gimp_floating_sel_anchor(tempFlt)
 
-    # Measure how many pixels the drawn text actually covers
+    # Measure how many pixels the drawn glyph actually covers
     gimp.pdb.gimp_image_select_contiguous_color(tempImage, CHANNEL_OP_REPLACE, tempLayer, 0, 0)
     gimp.pdb.gimp_selection_invert(tempImage)
     nonEmpty, x1, y1, x2, y2 = gimp.pdb.gimp_selection_bounds(tempImage)
-    x1 = x1 - padding
-    x2 = x2 - padding
     y1 = y1 - padding
     y2 = y2 - padding
     headerHeight = y1
-    textHeight = (y2 - y1)
     footerHeight = (h - y2)
 
     # Cleanup
     gimp.pdb.gimp_image_delete(tempImage)
+    return headerHeight, footerHeight, h
+
+def get_glyph_metrics(fontName, glyph) :
+    # Look for the glyph's class in the cache before measuring it
+    representative = GLYPH_CLASS_REPRESENTATIVES.get(glyph, glyph)
+    key = fontName + "|" + representative
+    metrics = fontMetricsCache.get(key)
+    if metrics is None:
+        with instrument.stage("font metrics"):
+            metrics = measure_glyph_metrics(fontName, representative)
+        fontMetricsCache.put(key, metrics)
+    return metrics
+
+def measure_font_metrics(fontName, testText) :
+    # Combine the metrics of every glyph in the text
+    headerHeight = None
+    footerHeight = None
+    h = None
+    for glyph in set(testText):
+        if glyph.isspace():
+            continue
+        glyphHeaderHeight, glyphFooterHeight, glyphHeight = get_glyph_metrics(fontName, glyph)
+        if headerHeight is None:
+            headerHeight, footerHeight, h = glyphHeaderHeight, glyphFooterHeight, glyphHeight
+        else:
+            headerHeight = min(headerHeight, glyphHeaderHeight)
+            footerHeight = min(footerHeight, glyphFooterHeight)
+            h = max(h, glyphHeight)
+    if h is None:
+        # The text is blank, so treat the whole line as text
+        _,h,_,_ = gimp.pdb.gimp_text_get_extents_fontname("x", FONT_METRICS_TEST_SIZE, PIXELS, fontName)
+        headerHeight = 0
+        footerHeight = 0
+    textHeight = h - headerHeight - footerHeight
 
     # Calculate and return some metrics to help with calculations
     result = {}
     result["headerLineHeightFraction"] = float(headerHeight) / float(h)
     result["textLineHeightFraction"] = float(textHeight) / float(h)
     result["footerLineHeightFraction"] = float(footerHeight) / float(h)
-    result["lineHeightToFontSize"] = float(testFontSize) / float(h)
+    result["lineHeightToFontSize"] = float(FONT_METRICS_TEST_SIZE) / float(h)
     return result
 
-def add_text_in_box(img, parentLayer, text, fontName, x, y, w, h, autoSpacing) :
+def measure_glyph_advance(fontName, glyph) :
+    referenceSize = GLYPH_TABLE_REFERENCE_SIZE
+    if glyph.isspace():
+        # Measure whitespace between two glyphs, in case it is trimmed from the ends of the text
+        spacedWidth,_,_,_ = gimp.pdb.gimp_text_get_extents_fontname("x" + glyph + "x", referenceSize, PIXELS, fontName)
+        unspacedWidth,_,_,_ = gimp.pdb.gimp_text_get_extents_fontname("xx", referenceSize, PIXELS, fontName)
+        return spacedWidth - unspacedWidth
+    w,_,_,_ = gimp.pdb.gimp_text_get_extents_fontname(glyph, referenceSize, PIXELS, fontName)
+    return w
+
+def get_glyph_table(fontName) :
+    # Find the font's table, in memory or in the font metrics cache, or start a new one
+    table = glyphTables.get(fontName)
+    if table == None:
+        data = fontMetricsCache.get(fontName + "|advances")
+        if data != None:
+            table = GlyphAdvanceTable.from_json(data)
+        if table == None or table.referenceSize != GLYPH_TABLE_REFERENCE_SIZE:
+            _,lineHeight,_,_ = gimp.pdb.gimp_text_get_extents_fontname("x", GLYPH_TABLE_REFERENCE_SIZE, PIXELS, fontName)
+            table = GlyphAdvanceTable(GLYPH_TABLE_REFERENCE_SIZE, lineHeight)
+        glyphTables[fontName] = table
+    return table
+
+def measure_glyph_table(fontName, lines) :
+    # Measure any glyphs or pairs of glyphs in the lines which the font's table doesn't have yet, in one batch
+    # They are kept in the font metrics cache, so each one is only ever measured once for each font
+    table = get_glyph_table(fontName)
+    text = "\n".join(lines)
+    missingGlyphs = table.get_missing_glyphs(text)
+    missingPairs = table.get_missing_pairs(text)
+    if len(missingGlyphs) > 0 or len(missingPairs) > 0:
+        with instrument.stage("glyph table"):
+            for glyph in missingGlyphs:
+                table.advances[glyph] = measure_glyph_advance(fontName, glyph)
+            for pair in missingPairs:
+                w,_,_,_ = gimp.pdb.gimp_text_get_extents_fontname(pair, GLYPH_TABLE_REFERENCE_SIZE, PIXELS, fontName)
+                table.kerning[pair] = w - table.advances[pair[0]] - table.advances[pair[1]]
+        fontMetricsCache.put(fontName + "|advances", table.to_json())
+    return table
+
+def measure_line_width(fontName, fontSize, line) :
+    if GLYPH_TABLE_MODE == "pdb":
+        w,_,_,_ = gimp.pdb.gimp_text_get_extents_fontname(line, fontSize, PIXELS, fontName)
+        return w
+    width = measure_glyph_table(fontName, [line]).get_line_width(line, fontSize)
+    if GLYPH_TABLE_MODE == "compare":
+        w,_,_,_ = gimp.pdb.gimp_text_get_extents_fontname(line, fontSize, PIXELS, fontName)
+        glyphTableErrors[0].add(width, w)
+        return w
+    return width
+
+def measure_block_height(fontName, fontSize, text) :
+    if GLYPH_TABLE_MODE == "pdb":
+        _,h,_,_ = gimp.pdb.gimp_text_get_extents_fontname(text, fontSize, PIXELS, fontName)
+        return h
+    height = get_glyph_table(fontName).get_block_height(len(text.split("\n")), fontSize)
+    if GLYPH_TABLE_MODE == "compare":
+        _,h,_,_ = gimp.pdb.gimp_text_get_extents_fontname(text, fontSize, PIXELS, fontName)
+        glyphTableErrors[1].add(height, h)
+        return h
+    return height
+
+def report_glyph_table_errors() :
+    if GLYPH_TABLE_MODE == "compare":
+        gimp.message("Glyph table compared to GIMP's text extents\n" + "\n".join([errors.summary() for errors in glyphTableErrors]))
+
+class TextLayerPlan(object) :
+    __slots__ = ("text", "fontName", "fontSize", "x", "y", "w", "h", "letterSpacing", "lineSpacing")
+
+    def __init__(self, text, fontName, fontSize, x, y, w, h, letterSpacing, lineSpacing) :
+        self.text = text
+        self.fontName = fontName
+        self.fontSize = fontSize
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.letterSpacing = letterSpacing
+        self.lineSpacing = lineSpacing
+
+def add_planned_text_layer(img, parentLayer, plan) :
+    add_text_layer(img, parentLayer, plan.text, plan.fontName, plan.fontSize, plan.x, plan.y, plan.w, plan.h, plan.letterSpacing, plan.lineSpacing)
+
+def plan_text_in_box(text, fontName, x, y, w, h, autoSpacing) :
     # Split the text into lines
     lines = text.splitlines()
 
@@ -75,8 +294,8 @@ def add_text_in_box(img, parentLayer, text, fontName, x, y, w, h, autoSpacing) :
         firstLineFontMetrics = measure_font_metrics(fontName, text)
         lastLineFontMetrics = firstLineFontMetrics
     else:
-        firstLineFontMetrics = measure_font_metrics(fontName, text[0])
-        lastLineFontMetrics = measure_font_metrics(fontName, text[len(lines) - 1])
+        firstLineFontMetrics = measure_font_metrics(fontName, lines[0])
+        lastLineFontMetrics = measure_font_metrics(fontName, lines[len(lines) - 1])
     visibleLines = len(lines) - firstLineFontMetrics["headerLineHeightFraction"] - lastLineFontMetrics["footerLineHeightFraction"]
     lineHeight = h / visibleLines
     header = lineHeight * firstLineFontMetrics["headerLineHeightFraction"]
@@ -88,12 +307,12 @@ def add_text_in_box(img, parentLayer, text, fontName, x, y, w, h, autoSpacing) :
     if autoSpacing:
         if len(lines) <= 1:
             longestLine = text
-            longestLineWidth,_,_,_ = gimp.pdb.gimp_text_get_extents_fontname(text, fontSize, PIXELS, fontName)
+            longestLineWidth = measure_line_width(fontName, fontSize, text)
         else:
             longestLine = ""
             longestLineWidth = 0
             for line in lines:
-                lineWidth,_,_,_ = gimp.pdb.gimp_text_get_extents_fontname(line, fontSize, PIXELS, fontName)
+                lineWidth = measure_line_width(fontName, fontSize, line)
                 if lineWidth > longestLineWidth:
                     longestLine = line
                     longestLineWidth = lineWidth
@@ -107,98 +326,427 @@ def add_text_in_box(img, parentLayer, text, fontName, x, y, w, h, autoSpacing) :
     if autoSpacing:
         if len(lines) > 1:
             numLineSpaces = len(lines) - 1
-            _,outputTextHeight,_,_ = gimp.pdb.gimp_text_get_extents_fontname(text, fontSize, PIXELS, fontName)
+            outputTextHeight = measure_block_height(fontName, fontSize, text)
             lineSpacing = float(fullHeight - outputTextHeight) / float(numLineSpaces)
 
-    # Add the text
+    # Position the text
     xPadding = 10
     yPadding = 5
-    add_text_layer(img, parentLayer, text, fontName, fontSize, x - xPadding, y - header, w + 2 * xPadding, fullHeight + yPadding, letterSpacing, lineSpacing)
-
-def get_box_from_xml_element(element) :
-    x = int(element.get("HPOS"))
-    y = int(element.get("VPOS"))
-    w = int(element.get("WIDTH"))
-    h = int(element.get("HEIGHT"))
-    return x, y, w, h
-
-def OCR_current_selection(img, inputLayer, outputLayerGroup, bgLayer, fontName, mode, autoSpacing) :
+    return TextLayerPlan(text, fontName, fontSize, x - xPadding, y - header, w + 2 * xPadding, fullHeight + yPadding, letterSpacing, lineSpacing)
+
+class OCRIsland(object) :
+    __slots__ = ("x", "y", "imagePath", "imageData", "cacheKey", "page", "scaleX", "scaleY")
+
+    def __init__(self, x, y, imagePath=None, imageData=None, cacheKey=None, page=None, scaleX=1.0, scaleY=1.0) :
+        self.x = x
+        self.y = y
+        self.imagePath = imagePath
+        self.imageData = imageData
+        self.cacheKey = cacheKey
+        self.page = page
+        self.scaleX = scaleX
+        self.scaleY = scaleY
+
+def get_tesseract_version() :
+    # Ask tesseract for its version, remembering the answer for each build of the executable
+    global tesseractVersion
+    if tesseractVersion == None:
+        stat = os.stat(TESSERACT_PATH)
+        versionKey = "version|" + TESSERACT_PATH + "|" + str(int(stat.st_mtime)) + "|" + str(stat.st_size)
+        tesseractVersion = ocrResultsCache.get(versionKey)
+        if tesseractVersion == None:
+            output = subprocess.check_output([TESSERACT_EXE, "--version"], executable=TESSERACT_PATH, stderr=subprocess.STDOUT)
+            instrument.count_subprocess()
+            lines = output.decode("utf-8", "replace").splitlines()
+            tesseractVersion = lines[0].strip() if len(lines) > 0 else ""
+            ocrResultsCache.put(versionKey, tesseractVersion)
+    return tesseractVersion
+
+def get_ocr_cache_key(imageData) :
+    # Anything which changes what tesseract would return for the image is part of the key
+    digest = hashlib.sha1()
+    digest.update((get_tesseract_version() + "|" + TESSERACT_LANGUAGE + "|" + TESSERACT_OUTPUT_FORMAT + "|").encode("utf-8"))
+    digest.update(imageData)
+    return digest.hexdigest()
+
+def read_selection_mask(img, x, y, w, h, finder=None) :
+    # Read part of the selection mask, a strip at a time, passing each strip to the island finder if there is one
+    rgn = img.selection.get_pixel_rgn(x, y, w, h, False, False)
+    strips = []
+    for stripY in range(y, y + h, SELECTION_STRIP_HEIGHT):
+        stripHeight = min(SELECTION_STRIP_HEIGHT, y + h - stripY)
+        strip = rgn[x:x + w, stripY:stripY + stripHeight]
+        if finder != None:
+            finder.add_rows(strip, stripHeight)
+        strips.append(strip)
+    return b"".join(strips)
+
+def export_masked_region(inputLayer, x, y, w, h, maskData) :
+    # Cut the part of the layer under the region straight out of its pixels, without using the clipboard
+    layerX, layerY = gimp.pdb.gimp_drawable_offsets(inputLayer)
+    x1, y1 = max(x, layerX), max(y, layerY)
+    x2, y2 = min(x + w, layerX + inputLayer.width), min(y + h, layerY + inputLayer.height)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    cropW, cropH = x2 - x1, y2 - y1
+    rgn = inputLayer.get_pixel_rgn(x1 - layerX, y1 - layerY, cropW, cropH, False, False)
+    pixelData = rgn[x1 - layerX:x2 - layerX, y1 - layerY:y2 - layerY]
+
+    # Hide everything outside the region's mask
+    if cropW != w or cropH != h:
+        maskData = crop_pixels(maskData, w, 1, x1 - x, y1 - y, cropW, cropH)
+    maskedData, bpp = apply_mask(pixelData, cropW, cropH, inputLayer.bpp, maskData)
+    island = OCRIsland(x1, y1)
+    if OCR_PREPROCESS:
+        with instrument.stage("preprocess"):
+            binary, ocrW, ocrH = preprocess_ocr_crop(maskedData, cropW, cropH, bpp, OCR_TARGET_LINE_HEIGHT, OCR_MIN_SCALE, OCR_MAX_SCALE)
+        island.scaleX, island.scaleY = float(cropW) / float(ocrW), float(cropH) / float(ocrH)
+        imageData = encode_pnm(binary, ocrW, ocrH, 1)
+    else:
+        imageData = encode_pnm(maskedData, cropW, cropH, bpp)
+
+    # Reuse the text found the last time an island with exactly the same pixels was OCRed
+    if OCR_RESULTS_CACHE_SIZE > 0:
+        island.cacheKey = get_ocr_cache_key(imageData)
+        cachedPage = ocrResultsCache.get(island.cacheKey)
+        if cachedPage != None:
+            island.page = decode_page(cachedPage)
+            return island
+
+    if TESSERACT_IO_MODE == "pipe" and tesseractPipesAvailable:
+        # Keep the pixels in memory, ready to be piped to tesseract
+        island.imageData = imageData
+    else:
+        # Save it to disk
+        island.imagePath = gimp.pdb.gimp_temp_name("pnm")
+        with open(island.imagePath, "wb") as imageFile:
+            imageFile.write(imageData)
+    return island
+
+def find_filled_islands(maskData, x, y, w, h, finder) :
+    # Fill in the holes in each island, like the lettering a magic wand leaves out of a balloon, and shrink it by a pixel
+    # Returns each island with its mask, and a mask of all of them together for drawing the background
+    selectionIslands = finder.finish()
+    islandHoles = [find_island_holes(selectionIsland) for selectionIsland in selectionIslands]
+    filledIslands = []
+    filledMask = bytearray(w * h)
+    for selectionIsland, holes in remove_enclosed_islands(selectionIslands, islandHoles):
+        islandMask, runs = get_filled_island_mask(selectionIsland, maskData, x, y, w, holes, OCR_SHRINK_ISLANDS)
+        if len(runs) == 0:
+            continue
+        for runY, runX1, runX2 in runs:
+            start = (runY - selectionIsland.y) * selectionIsland.w + (runX1 - selectionIsland.x)
+            filledStart = (runY - y) * w + (runX1 - x)
+            filledMask[filledStart:filledStart + (runX2 - runX1)] = islandMask[start:start + (runX2 - runX1)]
+        filledIslands.append((selectionIsland, islandMask))
+    return filledIslands, filledMask
+
+def fill_background(img, bgLayer, mask, x, y, w, h) :
+    # Fill the background under the mask, by selecting it from a temporary channel
+    channel = gimp.pdb.gimp_channel_new(img, img.width, img.height, "OCR Background", 100, (0, 0, 0))
+    gimp.pdb.gimp_image_insert_channel(img, channel, None, 0)
+    try:
+        rgn = channel.get_pixel_rgn(x, y, w, h, True, False)
+        rgn[x:x + w, y:y + h] = bytes(mask)
+        channel.flush()
+        gimp.pdb.gimp_image_select_item(img, CHANNEL_OP_REPLACE, channel)
+        gimp.pdb.gimp_drawable_edit_fill(bgLayer, FILL_BACKGROUND)
+    finally:
+        gimp.pdb.gimp_image_remove_channel(img, channel)
+    if not OCR_BULK_INSERT:
+        gimp.pdb.gimp_displays_flush()
+
+def export_current_selection(img, inputLayer, bgLayer) :
     # Get selection bounds
-    _, x1, y1, _, _ = gimp.pdb.gimp_selection_bounds(img)
-
-    # Copy the selection to a new image
-    gimp.pdb.gimp_edit_copy(inputLayer)
-    tempImage = gimp.pdb.gimp_edit_paste_as_new_image()
+    _, x1, y1, x2, y2 = gimp.pdb.gimp_selection_bounds(img)
+    finder = IslandFinder(x2 - x1, x1, y1)
+    maskData = read_selection_mask(img, x1, y1, x2 - x1, y2 - y1, finder)
+    _, filledMask = find_filled_islands(maskData, x1, y1, x2 - x1, y2 - y1, finder)
 
     # Draw the background
-    gimp.pdb.gimp_drawable_edit_fill(bgLayer, FILL_BACKGROUND)
-    gimp.pdb.gimp_displays_flush()
-
-    # Save it to disk
-    tempImagePath = gimp.pdb.gimp_temp_name("png")
-    gimp.pdb.file_png_save_defaults( tempImage, tempImage.active_drawable, tempImagePath, tempImagePath )
-
-    # OCR it
-    tempXMLPath = gimp.pdb.gimp_temp_name("xml")
-    process = subprocess.call([TESSERACT_EXE, tempImagePath, tempXMLPath[:-4], "alto"], executable=TESSERACT_PATH)
-
-    # Read in the OCR xml output
-    ocrResults = ""
-    ns = { "alto" : "http://www.loc.gov/standards/alto/ns-v3#" }
-    ocrXML = ET.parse(tempXMLPath)
-    rootObj = ocrXML.getroot()
-    layoutObj = rootObj.find("alto:Layout", ns)
-
-    # Add the text
+    fill_background(img, bgLayer, filledMask, x1, y1, x2 - x1, y2 - y1)
+
+    return export_masked_region(inputLayer, x1, y1, x2 - x1, y2 - y1, filledMask)
+
+def export_selection_islands(img, inputLayer, bgLayer) :
+    # Find every island of the selection from the selection mask, with one pass over its pixels
+    _, x1, y1, x2, y2 = gimp.pdb.gimp_selection_bounds(img)
+    with instrument.stage("find islands"):
+        finder = IslandFinder(x2 - x1, x1, y1)
+        maskData = read_selection_mask(img, x1, y1, x2 - x1, y2 - y1, finder)
+        filledIslands, filledMask = find_filled_islands(maskData, x1, y1, x2 - x1, y2 - y1, finder)
+
+    # Draw the background behind all of the islands at once
+    with instrument.stage("fill background"):
+        fill_background(img, bgLayer, filledMask, x1, y1, x2 - x1, y2 - y1)
+
+    # Export each island
+    islands = []
+    for index, (selectionIsland, islandMask) in enumerate(filledIslands):
+        with instrument.item("island " + str(index + 1)), instrument.stage("export"):
+            island = export_masked_region(inputLayer, selectionIsland.x, selectionIsland.y, selectionIsland.w, selectionIsland.h, islandMask)
+        if island != None:
+            islands.append(island)
+        update_progress(0.0, PROGRESS_EXPORTED, index + 1, len(filledIslands))
+    return islands
+
+class TesseractProcess(object) :
+    def __init__(self, islands, env=None) :
+        self.islands = islands
+        self.env = env
+        self.listPath = None
+        self.outputPath = None
+
+        # Start OCRing the islands in the background
+        self.usePipes = len(islands) == 1 and islands[0].imagePath == None and tesseractPipesAvailable
+        if self.usePipes:
+            self.start_with_pipes()
+        else:
+            self.start_with_files()
+
+    def start_with_pipes(self) :
+        # Stream the image to tesseract, and have it stream the OCR output back
+        self.process = subprocess.Popen([TESSERACT_EXE, "stdin", "stdout", "-l", TESSERACT_LANGUAGE, TESSERACT_OUTPUT_FORMAT], executable=TESSERACT_PATH, env=self.env, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        instrument.count_subprocess()
+        try:
+            self.process.stdin.write(self.islands[0].imageData)
+            self.process.stdin.close()
+        except (IOError, OSError):
+            # Tesseract stopped reading early, which is handled in finish()
+            pass
+
+    def start_with_files(self) :
+        # Save any islands which are only in memory to disk
+        for island in self.islands:
+            if island.imagePath == None:
+                island.imagePath = gimp.pdb.gimp_temp_name("pnm")
+                with open(island.imagePath, "wb") as imageFile:
+                    imageFile.write(island.imageData)
+
+        # If there is more than one image, pass tesseract a file containing a list of images
+        if len(self.islands) == 1:
+            inputPath = self.islands[0].imagePath
+        else:
+            self.listPath = gimp.pdb.gimp_temp_name("txt")
+            with open(self.listPath, "w") as listFile:
+                listFile.write("\n".join([island.imagePath for island in self.islands]) + "\n")
+            inputPath = self.listPath
+
+        extension = OCR_FORMAT_EXTENSIONS[TESSERACT_OUTPUT_FORMAT]
+        self.outputPath = gimp.pdb.gimp_temp_name(extension)
+        self.process = subprocess.Popen([TESSERACT_EXE, inputPath, self.outputPath[:-len(extension) - 1], "-l", TESSERACT_LANGUAGE, TESSERACT_OUTPUT_FORMAT], executable=TESSERACT_PATH, env=self.env)
+        instrument.count_subprocess()
+
+    def finish(self) :
+        global tesseractPipesAvailable
+
+        # Wait for tesseract to finish
+        try:
+            if self.usePipes:
+                with instrument.stage("tesseract"):
+                    output = self.process.stdout.read()
+                    self.process.wait()
+                if self.process.returncode == 0:
+                    try:
+                        with instrument.stage("parse"):
+                            return parse_ocr_data(output, TESSERACT_OUTPUT_FORMAT)
+                    except ValueError:
+                        pass
+
+                # This version of tesseract can't use pipes, so fall back to temporary files
+                tesseractPipesAvailable = False
+                self.usePipes = False
+                self.start_with_files()
+
+            with instrument.stage("tesseract"):
+                self.process.wait()
+
+            # Read in the OCR output, which contains one page for each image
+            with instrument.stage("parse"):
+                return parse_ocr_file(self.outputPath, TESSERACT_OUTPUT_FORMAT)
+
+        finally:
+            self.cleanup()
+
+    def cancel(self) :
+        if self.process.poll() == None:
+            self.process.kill()
+            self.process.wait()
+        self.cleanup()
+
+    def cleanup(self) :
+        if self.listPath != None and os.path.exists(self.listPath):
+            os.remove(self.listPath)
+        if self.outputPath != None and os.path.exists(self.outputPath):
+            os.remove(self.outputPath)
+
+def plan_ocr_page_text(page, x1, y1, fontName, mode, autoSpacing) :
     if mode == OCR_MODE_WORDS:
         # Extract each word individually
-        for pageObj in layoutObj.findall("alto:Page", ns):
-            for printSpaceObj in pageObj.findall("alto:PrintSpace", ns):
-                for composedBlockObj in printSpaceObj.findall("alto:ComposedBlock", ns):
-                    for textBlockObj in composedBlockObj.findall("alto:TextBlock", ns):
-                        for textLineObj in textBlockObj.findall("alto:TextLine", ns):
-                            for stringObj in textLineObj.findall("alto:String", ns):
-                                content = stringObj.get("CONTENT")
-                                x, y, w, h = get_box_from_xml_element(stringObj)
-                                add_text_in_box(img, outputLayerGroup, content, fontName, x1 + x, y1 + y, w, h, autoSpacing)
-                                gimp.pdb.gimp_displays_flush()
-
+        boxes = [word for block in page.blocks for line in block.lines for word in line.words]
     elif mode == OCR_MODE_LINES:
         # Extract each line individually
-        for pageObj in layoutObj.findall("alto:Page", ns):
-            for printSpaceObj in pageObj.findall("alto:PrintSpace", ns):
-                for composedBlockObj in printSpaceObj.findall("alto:ComposedBlock", ns):
-                    for textBlockObj in composedBlockObj.findall("alto:TextBlock", ns):
-                        for textLineObj in textBlockObj.findall("alto:TextLine", ns):
-                            content = ""
-                            x, y, w, h = get_box_from_xml_element(textLineObj)
-                            for stringObj in textLineObj.findall("alto:String", ns):
-                                content = content + stringObj.get("CONTENT") + " "
-                            content = content.strip(" ")
-                            add_text_in_box(img, outputLayerGroup, content, fontName, x1 + x, y1 + y, w, h, autoSpacing)
+        boxes = [line for block in page.blocks for line in block.lines]
+    else:
+        # Extract each block individually
+        boxes = page.blocks
+
+    return [plan_text_in_box(box.text, fontName, x1 + box.x, y1 + box.y, box.w, box.h, autoSpacing) for box in boxes]
+
+def add_planned_text_layers(img, outputLayerGroup, plans) :
+    for plan in plans:
+        add_planned_text_layer(img, outputLayerGroup, plan)
+
+def freeze_layers(img) :
+    # Freeze the layers panel while the text layers are added, so it is only updated once
+    # gimp_image_freeze_layers was added in GIMP 2.10.14, so older versions just update it for every layer
+    try:
+        gimp.pdb.gimp_image_freeze_layers(img)
+        return True
+    except AttributeError:
+        return False
+
+def update_progress(start, end, numDone, numTotal) :
+    gimp.progress_update(start + (end - start) * float(numDone) / float(max(numTotal, 1)))
+
+def OCR_exported_islands(img, outputLayerGroup, islands, fontName, mode, autoSpacing, numWorkers=1) :
+    gimp.pdb.gimp_progress_set_text("Recognising text ...")
+
+    # Split the islands which weren't found in the cache into batches, each of which is OCRed by one tesseract process
+    pendingIslands = [island for island in islands if island.page == None]
+    numWorkers = max(int(numWorkers), 1)
+    if TESSERACT_BATCH_ISLANDS and TESSERACT_IO_MODE != "pipe":
+        batchSize = max(int(math.ceil(float(len(pendingIslands)) / float(numWorkers))), 1)
+    else:
+        batchSize = 1
+    batches = [pendingIslands[batchStart:batchStart + batchSize] for batchStart in range(0, len(pendingIslands), batchSize)]
+
+    # The glyph table is measured for all of the recognised text at once, so then nothing is laid out until all of it is recognised
+    measureGlyphTable = autoSpacing and GLYPH_TABLE_MODE != "pdb"
+
+    # Stop each tesseract process using multiple threads when several of them are running at once
+    env = None
+    if numWorkers > 1 and len(batches) > 1:
+        env = dict(os.environ)
+        env["OMP_THREAD_LIMIT"] = "1"
+
+    processes = [None] * len(batches)
+    islandPlans = []
+    numStarted = 0
+    numFinished = 0
+    numLaidOut = 0
+    frozen = freeze_layers(img)
+    try:
+        while numLaidOut < len(islands):
+            # Keep up to numWorkers tesseract processes running
+            while numStarted < len(batches) and (numStarted - numFinished) < numWorkers:
+                batch = batches[numStarted]
+                with instrument.stage("start tesseract"):
+                    processes[numStarted] = TesseractProcess(batch, env)
+                numStarted = numStarted + 1
+
+            # Once the next island has no text yet, wait for the oldest batch
+            if numFinished < len(batches) and (islands[numLaidOut].page == None or measureGlyphTable):
+                batch = batches[numFinished]
+                pages = processes[numFinished].finish()
+                processes[numFinished] = None
+                numFinished = numFinished + 1
+                if len(pages) != len(batch):
+                    raise Exception("Tesseract returned " + str(len(pages)) + " pages for " + str(len(batch)) + " images")
+                for island, page in zip(batch, pages):
+                    island.page = page
+                    if island.cacheKey != None:
+                        ocrResultsCache.put(island.cacheKey, encode_page(page))
+
+            # Measure the glyph table once all of the text is recognised
+            if measureGlyphTable:
+                if numFinished < len(batches):
+                    continue
+                with instrument.stage("layout"):
+                    measure_glyph_table(fontName, [line.text for island in islands for block in island.page.blocks for line in block.lines])
+                measureGlyphTable = False
+
+            # Lay out the text of each island which is ready, in island order
+            while numLaidOut < len(islands) and islands[numLaidOut].page != None:
+                island = islands[numLaidOut]
+                numLaidOut = numLaidOut + 1
+                with instrument.item("island " + str(numLaidOut)):
+                    with instrument.stage("layout"):
+                        # Put the text back in the island's original coordinates if it was resized for tesseract
+                        page = island.page
+                        if island.scaleX != 1.0 or island.scaleY != 1.0:
+                            page = scale_page(page, island.scaleX, island.scaleY)
+                        plans = plan_ocr_page_text(page, island.x, island.y, fontName, mode, autoSpacing)
+                    if OCR_BULK_INSERT:
+                        islandPlans.append(plans)
+                    else:
+                        with instrument.stage("add text"):
+                            add_planned_text_layers(img, outputLayerGroup, plans)
+                        with instrument.stage("display flush"):
                             gimp.pdb.gimp_displays_flush()
+                update_progress(PROGRESS_EXPORTED, PROGRESS_RECOGNISED, numLaidOut, len(islands))
+
+        # Add all of the text layers
+        if OCR_BULK_INSERT:
+            gimp.pdb.gimp_progress_set_text("Adding text layers ...")
+            with instrument.stage("add text"):
+                for index, plans in enumerate(islandPlans):
+                    add_planned_text_layers(img, outputLayerGroup, plans)
+                    update_progress(PROGRESS_RECOGNISED, 1.0, index + 1, len(islandPlans))
+
+    finally:
+        # Clean up
+        if frozen:
+            gimp.pdb.gimp_image_thaw_layers(img)
+        for process in processes:
+            if process != None:
+                process.cancel()
+        for island in islands:
+            if island.imagePath != None and os.path.exists(island.imagePath):
+                os.remove(island.imagePath)
+
+    # Redraw the display once all of the text layers are added
+    if OCR_BULK_INSERT:
+        with instrument.stage("display flush"):
+            gimp.pdb.gimp_displays_flush()
 
-    elif mode == OCR_MODE_BLOCKS:
-        # Extract each block individually
-        for pageObj in layoutObj.findall("alto:Page", ns):
-            for printSpaceObj in pageObj.findall("alto:PrintSpace", ns):
-                for composedBlockObj in printSpaceObj.findall("alto:ComposedBlock", ns):
-                    content = ""
-                    x, y, w, h = get_box_from_xml_element(composedBlockObj)
-                    for textBlockObj in composedBlockObj.findall("alto:TextBlock", ns):
-                        for textLineObj in textBlockObj.findall("alto:TextLine", ns):                                
-                            for stringObj in textLineObj.findall("alto:String", ns):
-                                content = content + stringObj.get("CONTENT") + " "                                    
-                            content = content.strip(" ") + "\n"
-                    content = content.strip("\n")
-                    add_text_in_box(img, outputLayerGroup, content, fontName, x1 + x, y1 + y, w, h, autoSpacing)
-                    gimp.pdb.gimp_displays_flush()
-
-    # Clean up
-    os.remove(tempImagePath)
-    os.remove(tempXMLPath)
-
-def dan200_tesseract_ocr(img, layer, fontName, outputGroupName, lineByLine, autoSpacing) :
+def OCR_current_selection(img, inputLayer, outputLayerGroup, bgLayer, fontName, mode, autoSpacing) :
+    island = export_current_selection(img, inputLayer, bgLayer)
+    if island != None:
+        OCR_exported_islands(img, outputLayerGroup, [island], fontName, mode, autoSpacing)
+
+def OCR_selection_islands(img, layer, fontName, outputGroupName, lineByLine, autoSpacing, workers) :
+    # Create a layer group for storing the OCR output
+    ocrLayerGroup = gimp.pdb.gimp_image_get_layer_by_name(img, outputGroupName) 
+    if ocrLayerGroup == None:
+        ocrLayerGroup = gimp.pdb.gimp_layer_group_new(img)
+        gimp.pdb.gimp_layer_set_name(ocrLayerGroup, outputGroupName)
+        gimp.pdb.gimp_image_insert_layer(img, ocrLayerGroup, None, 0)
+
+    # Create a layer for drawing the background
+    bgLayer = None
+    numChildren, childIDs = gimp.pdb.gimp_item_get_children(ocrLayerGroup)
+    for childID in childIDs:
+        child = gimp.Item.from_id(childID)
+        if gimp.pdb.gimp_item_is_layer(child) and gimp.pdb.gimp_item_get_name(child) == "Background":
+            bgLayer = child
+            break
+    if bgLayer == None:
+        bgLayer = gimp.pdb.gimp_layer_new(img, img.width, img.height, RGBA_IMAGE, "Background", 100, 0)
+        gimp.pdb.gimp_image_insert_layer(img, bgLayer, ocrLayerGroup, 0)
+
+    # Export each island of the selection
+    islands = export_selection_islands(img, layer, bgLayer)
+
+    # OCR the exported selections
+    ocrMode = OCR_MODE_LINES if lineByLine else OCR_MODE_BLOCKS
+    OCR_exported_islands(img, ocrLayerGroup, islands, fontName, ocrMode, autoSpacing, workers)
+
+    # Deselect all
+    gimp.pdb.gimp_selection_none(img)
+    return len(islands)
+
+def dan200_tesseract_ocr(img, layer, fontName, outputGroupName, lineByLine, autoSpacing, workers) :
     # Check tesseract is installed
     if not os.path.exists(TESSERACT_PATH):
         gimp.message("Could not find " + TESSERACT_PATH + "\nTesseract OCR can be downloaded from https://github.com/tesseract-ocr/tesseract")
@@ -216,66 +764,134 @@ def dan200_tesseract_ocr(img, layer, fontName, outputGroupName, lineByLine, auto
         return
 
     # Start
-    gimp.progress_init("Please wait ...")
+    gimp.progress_init("Exporting selection islands ...")
+    instrument.start_run("tesseract-ocr", gimp)
     gimp.pdb.gimp_image_undo_group_start(img)
 
     try:
-        # Create a layer group for storing the OCR output
-        ocrLayerGroup = gimp.pdb.gimp_image_get_layer_by_name(img, outputGroupName) 
-        if ocrLayerGroup == None:
-            ocrLayerGroup = gimp.pdb.gimp_layer_group_new(img)
-            gimp.pdb.gimp_layer_set_name(ocrLayerGroup, "OCR")
-            gimp.pdb.gimp_image_insert_layer(img, ocrLayerGroup, None, 0)
-
-        # Create a layer for drawing the background
-        bgLayer = None
-        numChildren, childIDs = gimp.pdb.gimp_item_get_children(ocrLayerGroup)
-        for childID in childIDs:
-            child = gimp.Item.from_id(childID)
-            if gimp.pdb.gimp_item_is_layer(child) and gimp.pdb.gimp_item_get_name(child) == "Background":
-                bgLayer = child
-                break
-        if bgLayer == None:
-            bgLayer = gimp.pdb.gimp_layer_new(img, img.width, img.height, RGBA_IMAGE, "Background", 100, 0)
-            gimp.pdb.gimp_image_insert_layer(img, bgLayer, ocrLayerGroup, 0)
-
-        # Convert the selection to a path
-        gimp.pdb.plug_in_sel2path(img, layer)
-        wholeSelectionPath = img.vectors[0]
-
-        singleIslandPath = gimp.Vectors(img, "Selection Island")
-        gimp.pdb.gimp_image_add_vectors(img, singleIslandPath, 0)
-        
-        # For each stroke in the path
-        for wholeSelectionStroke in wholeSelectionPath.strokes:
-            # Convert the stroke to a new path
-            points, closed = wholeSelectionStroke.points
-            singleIslandStroke = gimp.VectorsBezierStroke(singleIslandPath, points, closed)
-
-            # Create a selection from the new path
-            gimp.pdb.gimp_image_select_item(img, CHANNEL_OP_REPLACE, singleIslandPath)
-            gimp.pdb.gimp_selection_shrink(img, 1)
-
-            # Delete the new path
-            singleIslandPath.remove_stroke(singleIslandStroke)
-
-            # OCR the new selection
-            ocrMode = OCR_MODE_LINES if lineByLine else OCR_MODE_BLOCKS
-            OCR_current_selection(img, layer, ocrLayerGroup, bgLayer, fontName, ocrMode, autoSpacing)
-
-        # Delete the temporary paths
-        gimp.pdb.gimp_image_remove_vectors(img, wholeSelectionPath)
-        gimp.pdb.gimp_image_remove_vectors(img, singleIslandPath)
-
-        # Deselect all
-        gimp.pdb.gimp_selection_none(img)
+        OCR_selection_islands(img, layer, fontName, outputGroupName, lineByLine, autoSpacing, workers)
 
     except Exception as err:
         gimp.message("Unexpected error: " + str(err))
 
     # Finish
+    fontMetricsCache.save()
+    ocrResultsCache.save()
+    report_glyph_table_errors()
     pdb.gimp_image_undo_group_end(img)
     pdb.gimp_progress_end()
+    instrument.finish_run()
+
+def select_balloons(img, layer, maskLayerName) :
+    if maskLayerName != "":
+        # Select everything painted on the mask layer
+        maskLayer = gimp.pdb.gimp_image_get_layer_by_name(img, maskLayerName)
+        if maskLayer == None:
+            raise Exception("No layer named " + maskLayerName)
+        gimp.pdb.gimp_image_select_item(img, CHANNEL_OP_REPLACE, maskLayer)
+        return
+
+    # Select the white parts of the layer, then fill in the lettering and drop any small specks
+    gimp.pdb.gimp_context_push()
+    try:
+        gimp.pdb.gimp_context_set_sample_threshold_int(AUTO_DETECT_THRESHOLD)
+        gimp.pdb.gimp_image_select_color(img, CHANNEL_OP_REPLACE, layer, AUTO_DETECT_COLOR)
+    finally:
+        gimp.pdb.gimp_context_pop()
+    gimp.pdb.gimp_selection_grow(img, AUTO_DETECT_CLOSE_RADIUS)
+    gimp.pdb.gimp_selection_shrink(img, AUTO_DETECT_CLOSE_RADIUS)
+    gimp.pdb.gimp_selection_shrink(img, AUTO_DETECT_OPEN_RADIUS)
+    gimp.pdb.gimp_selection_grow(img, AUTO_DETECT_OPEN_RADIUS)
+
+def OCR_page(pagePath, outputPath, layerName, maskLayerName, fontName, outputGroupName, lineByLine, autoSpacing) :
+    img = gimp.pdb.gimp_file_load(pagePath, pagePath)
+    try:
+        # There is nothing to undo in a batch, so don't spend memory on it
+        gimp.pdb.gimp_image_undo_disable(img)
+        layer = img.active_layer if layerName == "" else gimp.pdb.gimp_image_get_layer_by_name(img, layerName)
+        if layer == None:
+            raise Exception("No layer named " + layerName)
+        if gimp.pdb.gimp_item_is_text_layer(layer):
+            raise Exception("OCR can only be performed on bitmap layers")
+
+        # OCR the balloons, and save the page with the OCR layer group
+        select_balloons(img, layer, maskLayerName)
+        numIslands = 0
+        nonEmpty, _, _, _, _ = gimp.pdb.gimp_selection_bounds(img)
+        if nonEmpty:
+            numIslands = OCR_selection_islands(img, layer, fontName, outputGroupName, lineByLine, autoSpacing, BATCH_TESSERACT_WORKERS)
+        gimp.pdb.gimp_xcf_save(0, img, layer, outputPath, outputPath)
+        return numIslands
+    finally:
+        gimp.pdb.gimp_image_delete(img)
+
+def dan200_tesseract_ocr_batch(pages, outputDir, layerName, maskLayerName, fontName, outputGroupName, lineByLine, autoSpacing, workers) :
+    # Check tesseract is installed
+    if not os.path.exists(TESSERACT_PATH):
+        gimp.message("Could not find " + TESSERACT_PATH + "\nTesseract OCR can be downloaded from https://github.com/tesseract-ocr/tesseract")
+        return
+
+    # Find the pages
+    pagePaths = batch.find_pages(pages)
+    if len(pagePaths) == 0:
+        gimp.message("No pages found in " + pages)
+        return
+    outputDir = os.path.abspath(outputDir)
+    for pagePath in pagePaths:
+        if os.path.dirname(pagePath) == outputDir:
+            gimp.message("The output folder must be different to the folder containing the pages")
+            return
+    if not os.path.isdir(outputDir):
+        os.makedirs(outputDir)
+
+    # Skip any pages which a previous run has already finished
+    manifest = batch.Manifest(os.path.join(outputDir, OCR_MANIFEST_NAME))
+    settings = {
+        "layer" : layerName,
+        "mask" : maskLayerName,
+        "font" : fontName,
+        "group" : outputGroupName,
+        "lineByLine" : bool(lineByLine),
+        "autoSpacing" : bool(autoSpacing),
+    }
+    pendingPagePaths = [pagePath for pagePath in pagePaths if not manifest.is_done(pagePath, settings)]
+
+    gimp.progress_init("OCRing " + str(len(pendingPagePaths)) + " pages ...")
+    if workers > 1 and len(pendingPagePaths) > 1:
+        # Share the pages between several GIMP processes, each of which runs this procedure on its own share
+        listPaths = []
+        pythonCodes = []
+        try:
+            for shard in batch.split_into_shards(pendingPagePaths, workers):
+                listPath = gimp.pdb.gimp_temp_name("txt")
+                listPaths.append(listPath)
+                pythonCodes.append("pdb.python_fu_dan200_tesseract_ocr_batch(%r, %r, %r, %r, %r, %r, %d, %d, 1)" % (batch.write_page_list(shard, listPath), outputDir, layerName, maskLayerName, fontName, outputGroupName, lineByLine, autoSpacing))
+            batch.run_gimp_workers(pythonCodes)
+        finally:
+            for listPath in listPaths:
+                if os.path.exists(listPath):
+                    os.remove(listPath)
+        manifest.load()
+
+    else:
+        # OCR each page in turn, recording it in the manifest as soon as it is saved
+        for index, pagePath in enumerate(pendingPagePaths):
+            startTime = time.time()
+            try:
+                numIslands = OCR_page(pagePath, batch.get_output_path(pagePath, outputDir, ".xcf"), layerName, maskLayerName, fontName, outputGroupName, lineByLine, autoSpacing)
+                manifest.add_record(pagePath, "done", settings, islands=numIslands, seconds=time.time() - startTime)
+            except Exception as err:
+                manifest.add_record(pagePath, "failed", settings, error=str(err))
+            gimp.progress_update(float(index + 1) / float(len(pendingPagePaths)))
+        fontMetricsCache.save()
+        ocrResultsCache.save()
+        report_glyph_table_errors()
+
+    # Report the results
+    numDone = manifest.count(pagePaths, "done", settings)
+    numFailed = manifest.count(pagePaths, "failed", settings)
+    gimp.message("OCRed " + str(numDone) + " of " + str(len(pagePaths)) + " pages" + (", " + str(numFailed) + " failed" if numFailed > 0 else ""))
+    pdb.gimp_progress_end()
 
 register(
     "dan200-tesseract-ocr",
@@ -290,9 +906,35 @@ register(
         (PF_FONT, "fontName", "Output font", "Arial"),
         (PF_STRING, "outputGroupName", "Output layer group name", "OCR"),
         (PF_BOOL, "lineByLine", "Output each line seperately", False),
-        (PF_BOOL, "autoSpacing", "Adjust spacing automatically", False)
+        (PF_BOOL, "autoSpacing", "Adjust spacing automatically", False),
+        (PF_SPINNER, "workers", "Tesseract processes", 4, (1, 32, 1))
     ],
     [],
     dan200_tesseract_ocr)
 
-main()
+register(
+    "dan200-tesseract-ocr-batch",
+    "Convert the speech balloons on many pages into text layers using the Tesseract OCR engine",
+    "OCR the speech balloons on every page in a folder, or every page matching a pattern, and save them as XCF files in an output folder. The balloons are taken from a mask layer, or found automatically if no mask layer is given. Finished pages are recorded in a manifest in the output folder, so an interrupted run can be resumed",
+    "Daniel Ratcliffe",
+    "Daniel Ratcliffe",
+    "2022",
+    "Tesseract OCR (Batch)...",
+    "",
+    [
+        (PF_STRING, "pages", "Pages (folder or pattern)", ""),
+        (PF_DIRNAME, "outputDir", "Output folder", ""),
+        (PF_STRING, "layerName", "Text layer name (blank for the active layer)", ""),
+        (PF_STRING, "maskLayerName", "Balloon mask layer name (blank to find balloons automatically)", ""),
+        (PF_FONT, "fontName", "Output font", "Arial"),
+        (PF_STRING, "outputGroupName", "Output layer group name", "OCR"),
+        (PF_BOOL, "lineByLine", "Output each line seperately", False),
+        (PF_BOOL, "autoSpacing", "Adjust spacing automatically", False),
+        (PF_SPINNER, "workers", "GIMP processes", 4, (1, 32, 1)),
+    ],
+    [],
+    dan200_tesseract_ocr_batch,
+    menu="<Image>/Tools/Comic Tools")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
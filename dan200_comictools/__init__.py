@@ -0,0 +1,5 @@
+# --------------------
+# COMIC TOOLS
+# Shared helpers used by the Comic Tools plugins
+# Modules in this package do not import gimpfu, so they can be used outside of GIMP
+# --------------------
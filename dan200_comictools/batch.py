@@ -0,0 +1,100 @@
+# --------------------
+# BATCH
+# Helpers for running a plugin headlessly over many page files, spread across several GIMP processes,
+# with a manifest so that an interrupted run can resume without redoing finished pages
+# --------------------
+
+import glob
+import json
+import os
+import subprocess
+import time
+
+# The location of the GIMP console executable, used to run worker processes
+# Edit this variable if GIMP is installed in a different location
+GIMP_CONSOLE_PATH = "C:\\Program Files\\GIMP 2\\bin\\gimp-console-2.10.exe"
+
+PAGE_EXTENSIONS = (".xcf", ".png", ".tif", ".tiff")
+
+def find_pages(pattern) :
+    # The pattern can be a directory, a glob pattern, or "@" followed by the path of a file listing one page per line
+    if pattern.startswith("@"):
+        with open(pattern[1:], "r") as listFile:
+            paths = [line.strip() for line in listFile if line.strip() != ""]
+    elif os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern) if os.path.splitext(name)[1].lower() in PAGE_EXTENSIONS]
+    else:
+        paths = glob.glob(pattern)
+    return sorted(set([os.path.abspath(path) for path in paths]))
+
+def get_output_path(pagePath, outputDir, extension=None) :
+    name = os.path.basename(pagePath)
+    if extension != None:
+        name = os.path.splitext(name)[0] + extension
+    return os.path.join(outputDir, name)
+
+class Manifest(object) :
+    # The manifest is a file with one JSON record per line, which is only ever appended to,
+    # so several worker processes can record their progress in the same file
+    def __init__(self, path) :
+        self.path = path
+        self.records = {}
+        self.load()
+
+    def load(self) :
+        self.records = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as manifestFile:
+            for line in manifestFile:
+                try:
+                    record = json.loads(line)
+                    self.records[record["page"]] = record
+                except (ValueError, KeyError, TypeError):
+                    # Ignore any line which was only partly written when a run was interrupted
+                    pass
+
+    def is_done(self, pagePath, settings) :
+        record = self.records.get(pagePath)
+        return record != None and record.get("status") == "done" and record.get("settings") == settings
+
+    def add_record(self, pagePath, status, settings, **info) :
+        record = dict(info)
+        record["page"] = pagePath
+        record["status"] = status
+        record["settings"] = settings
+        record["time"] = time.time()
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.path, "a") as manifestFile:
+            manifestFile.write(json.dumps(record, sort_keys=True) + "\n")
+            manifestFile.flush()
+            os.fsync(manifestFile.fileno())
+        self.records[pagePath] = record
+
+    def count(self, pagePaths, status, settings) :
+        return len([pagePath for pagePath in pagePaths if self.records.get(pagePath, {}).get("status") == status and self.records[pagePath].get("settings") == settings])
+
+def split_into_shards(items, numShards) :
+    # Deal the items out in turn, so each shard gets a similar mix of pages
+    numShards = max(min(numShards, len(items)), 1)
+    return [items[shard::numShards] for shard in range(numShards)]
+
+def write_page_list(pagePaths, listPath) :
+    with open(listPath, "w") as listFile:
+        listFile.write("\n".join(pagePaths) + "\n")
+    return "@" + listPath
+
+def get_gimp_worker_command(pythonCode, loadFonts=True) :
+    # Run some python in a GIMP process without a user interface, then quit
+    command = [GIMP_CONSOLE_PATH, "--no-interface", "--no-data"]
+    if not loadFonts:
+        command.append("--no-fonts")
+    command = command + ["--batch-interpreter=python-fu-eval", "--batch", pythonCode, "--batch", "pdb.gimp_quit(1)"]
+    return command
+
+def run_gimp_workers(pythonCodes, loadFonts=True) :
+    # Start one GIMP process for each piece of code, and wait for them all to finish
+    processes = [subprocess.Popen(get_gimp_worker_command(pythonCode, loadFonts)) for pythonCode in pythonCodes]
+    return [process.wait() for process in processes]
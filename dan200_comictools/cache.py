@@ -0,0 +1,160 @@
+# --------------------
+# CACHE
+# Small least-recently-used caches which can be kept in memory or persisted to disk between GIMP sessions
+# --------------------
+
+import collections
+import json
+import os
+import shutil
+
+class LRUCache(object) :
+    def __init__(self, maxSize) :
+        self.maxSize = maxSize
+        self.entries = collections.OrderedDict()
+
+    def __len__(self) :
+        return len(self.entries)
+
+    def __contains__(self, key) :
+        return key in self.entries
+
+    def get(self, key, default=None) :
+        if key not in self.entries:
+            return default
+
+        # Move the entry to the most recently used end
+        value = self.entries.pop(key)
+        self.entries[key] = value
+        return value
+
+    def put(self, key, value) :
+        # Insert the entry at the most recently used end
+        if key in self.entries:
+            del self.entries[key]
+        self.entries[key] = value
+
+        # Evict the least recently used entries
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+class PersistentLRUCache(LRUCache) :
+    def __init__(self, path, maxSize) :
+        LRUCache.__init__(self, maxSize)
+        self.path = path
+        self.loaded = False
+        self.dirty = False
+
+    def load(self) :
+        # Read the entries from disk the first time the cache is used
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            for key, value in data["entries"]:
+                LRUCache.put(self, key, value)
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            # A missing or corrupt cache file just means we start again
+            self.entries.clear()
+
+    def __len__(self) :
+        self.load()
+        return LRUCache.__len__(self)
+
+    def __contains__(self, key) :
+        self.load()
+        return LRUCache.__contains__(self, key)
+
+    def get(self, key, default=None) :
+        # A hit only reorders the entries, which isn't worth rewriting the file for
+        # The new order is saved along with the next entry which is added
+        self.load()
+        return LRUCache.get(self, key, default)
+
+    def put(self, key, value) :
+        self.load()
+        LRUCache.put(self, key, value)
+        self.dirty = True
+
+    def save(self) :
+        if not self.dirty:
+            return
+
+        # Write the entries to a temporary file, then move it over the old one
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            tempPath = self.path + ".tmp"
+            with open(tempPath, "w") as f:
+                json.dump({ "entries" : [ [key, value] for key, value in self.entries.items() ] }, f)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tempPath, self.path)
+            self.dirty = False
+        except (IOError, OSError):
+            # The cache is only an optimisation, so failing to save it is not an error
+            pass
+
+class DirectoryCache(object) :
+    def __init__(self, path, maxBytes, extension) :
+        self.path = path
+        self.maxBytes = maxBytes
+        self.extension = extension
+
+    def get_entry_path(self, key) :
+        return os.path.join(self.path, key + "." + self.extension)
+
+    def get_path(self, key) :
+        # Return the path of the cached file, or None if there isn't one
+        if self.maxBytes <= 0:
+            return None
+        entryPath = self.get_entry_path(key)
+        if not os.path.exists(entryPath):
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(entryPath, None)
+        except OSError:
+            pass
+        return entryPath
+
+    def put_file(self, key, sourcePath) :
+        # Copy the file into the cache, then make room for it by evicting the least recently used entries
+        if self.maxBytes <= 0:
+            return
+        entryPath = self.get_entry_path(key)
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            tempPath = entryPath + ".tmp"
+            shutil.copyfile(sourcePath, tempPath)
+            if os.path.exists(entryPath):
+                os.remove(entryPath)
+            os.rename(tempPath, entryPath)
+            self.evict(entryPath)
+        except (IOError, OSError):
+            # The cache is only an optimisation, so failing to save to it is not an error
+            pass
+
+    def evict(self, keepPath=None) :
+        entries = []
+        totalBytes = 0
+        for name in os.listdir(self.path):
+            if not name.endswith("." + self.extension):
+                continue
+            entryPath = os.path.join(self.path, name)
+            stat = os.stat(entryPath)
+            entries.append((stat.st_mtime, entryPath, stat.st_size))
+            totalBytes = totalBytes + stat.st_size
+
+        entries.sort()
+        for _, entryPath, size in entries:
+            if totalBytes <= self.maxBytes:
+                break
+            if entryPath != keepPath:
+                os.remove(entryPath)
+                totalBytes = totalBytes - size
@@ -0,0 +1,214 @@
+# --------------------
+# INSTRUMENT
+# Optional timing of each stage of a plugin run, with counts of the PDB calls and subprocess launches made in
+# each stage, for each island or layer. A JSON and a CSV report are written at the end of each run
+# When it is disabled, the stage and item functions return a shared object which does nothing
+# --------------------
+
+import collections
+import csv
+import json
+import os
+import time
+
+# The folder the reports are written to. Leave empty to disable instrumentation
+# It can also be set with the DAN200_COMICTOOLS_PROFILE environment variable
+PROFILE_REPORT_PATH = os.environ.get("DAN200_COMICTOOLS_PROFILE", "")
+
+class NullScope(object) :
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, excType, excValue, traceback) :
+        return False
+
+nullScope = NullScope()
+
+class StageStats(object) :
+    __slots__ = ("seconds", "entries", "pdbCalls", "subprocesses")
+
+    def __init__(self) :
+        self.seconds = 0.0
+        self.entries = 0
+        self.pdbCalls = 0
+        self.subprocesses = 0
+
+class StageScope(object) :
+    def __init__(self, profiler, name) :
+        self.profiler = profiler
+        self.name = name
+        self.key = None
+        self.startTime = None
+
+    def __enter__(self) :
+        profiler = self.profiler
+        profiler.stageNames.append(self.name)
+        self.key = (profiler.itemName, "/".join(profiler.stageNames))
+        profiler.openStages.append(profiler.get_stats(self.key))
+        self.startTime = time.time()
+        return self
+
+    def __exit__(self, excType, excValue, traceback) :
+        profiler = self.profiler
+        stats = profiler.openStages.pop()
+        stats.seconds = stats.seconds + (time.time() - self.startTime)
+        stats.entries = stats.entries + 1
+        profiler.stageNames.pop()
+        return False
+
+class ItemScope(object) :
+    def __init__(self, profiler, name) :
+        self.profiler = profiler
+        self.name = name
+        self.previousName = None
+
+    def __enter__(self) :
+        self.previousName = self.profiler.itemName
+        self.profiler.itemName = self.name
+        return self
+
+    def __exit__(self, excType, excValue, traceback) :
+        self.profiler.itemName = self.previousName
+        return False
+
+class CountingPDB(object) :
+    # Passes each procedure call on to the real PDB, counting it first
+    def __init__(self, pdb, profiler) :
+        self.pdb = pdb
+        self.profiler = profiler
+        self.procedures = {}
+
+    def __getattr__(self, name) :
+        procedure = self.procedures.get(name)
+        if procedure == None:
+            realProcedure = getattr(self.pdb, name)
+            profiler = self.profiler
+            def procedure(*args) :
+                profiler.count_pdb_call(name)
+                return realProcedure(*args)
+            self.procedures[name] = procedure
+        return procedure
+
+class Profiler(object) :
+    def __init__(self, runName, reportPath) :
+        self.runName = runName
+        self.reportPath = reportPath
+        self.startTime = time.time()
+        self.stats = collections.OrderedDict()
+        self.pdbCalls = collections.Counter()
+        self.itemName = ""
+        self.stageNames = []
+        self.openStages = [self.get_stats(("", ""))]
+
+    def get_stats(self, key) :
+        stats = self.stats.get(key)
+        if stats == None:
+            stats = StageStats()
+            self.stats[key] = stats
+        return stats
+
+    def stage(self, name) :
+        return StageScope(self, name)
+
+    def item(self, name) :
+        return ItemScope(self, name)
+
+    def count_pdb_call(self, name) :
+        # Calls count towards every open stage, and the run as a whole
+        self.pdbCalls[name] += 1
+        for stats in self.openStages:
+            stats.pdbCalls = stats.pdbCalls + 1
+
+    def count_subprocess(self) :
+        for stats in self.openStages:
+            stats.subprocesses = stats.subprocesses + 1
+
+    def get_rows(self) :
+        rows = []
+        for (itemName, stageName), stats in self.stats.items():
+            rows.append({
+                "item" : itemName,
+                "stage" : stageName,
+                "seconds" : round(stats.seconds, 6),
+                "entries" : stats.entries,
+                "pdb_calls" : stats.pdbCalls,
+                "subprocesses" : stats.subprocesses,
+            })
+        return rows
+
+    def write_report(self) :
+        # The first row is the whole run
+        totals = self.stats[("", "")]
+        totals.seconds = time.time() - self.startTime
+        totals.entries = 1
+        rows = self.get_rows()
+        rows[0]["stage"] = "run"
+
+        if not os.path.isdir(self.reportPath):
+            os.makedirs(self.reportPath)
+        basePath = os.path.join(self.reportPath, self.runName + "-" + time.strftime("%Y%m%d-%H%M%S", time.localtime(self.startTime)))
+        report = {
+            "run" : self.runName,
+            "started" : self.startTime,
+            "seconds" : round(totals.seconds, 6),
+            "pdb_calls" : totals.pdbCalls,
+            "subprocesses" : totals.subprocesses,
+            "stages" : rows,
+            "procedures" : dict(self.pdbCalls),
+        }
+        with open(basePath + ".json", "w") as reportFile:
+            json.dump(report, reportFile, indent=1, sort_keys=True)
+        with open(basePath + ".csv", "w") as reportFile:
+            writer = csv.writer(reportFile, lineterminator="\n")
+            columns = ["item", "stage", "seconds", "entries", "pdb_calls", "subprocesses"]
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow([row[column] for column in columns])
+        return basePath + ".json"
+
+profiler = None
+realPDB = None
+gimpModule = None
+
+def is_enabled() :
+    return profiler != None
+
+def start_run(runName, gimp) :
+    # Start recording, counting every call made through gimp.pdb
+    global profiler, realPDB, gimpModule
+    if PROFILE_REPORT_PATH == "" or profiler != None:
+        return
+    profiler = Profiler(runName, PROFILE_REPORT_PATH)
+    gimpModule = gimp
+    realPDB = gimp.pdb
+    gimp.pdb = CountingPDB(realPDB, profiler)
+
+def finish_run() :
+    # Stop recording, and write the report. Returns the path of the JSON report
+    global profiler, realPDB, gimpModule
+    if profiler == None:
+        return None
+    gimpModule.pdb = realPDB
+    finishedProfiler = profiler
+    profiler = None
+    realPDB = None
+    gimpModule = None
+    try:
+        return finishedProfiler.write_report()
+    except (IOError, OSError):
+        # The report is only for diagnostics, so failing to write it shouldn't fail the run
+        return None
+
+def stage(name) :
+    if profiler == None:
+        return nullScope
+    return profiler.stage(name)
+
+def item(name) :
+    if profiler == None:
+        return nullScope
+    return profiler.item(name)
+
+def count_subprocess() :
+    if profiler != None:
+        profiler.count_subprocess()
@@ -0,0 +1,204 @@
+# --------------------
+# ISLANDS
+# Connected component labelling of selection masks, which finds every separate island of a selection in one pass
+# Each row is split into runs of selected pixels, and runs which touch a run in the row above (including
+# diagonally) are joined into the same island
+# --------------------
+
+import re
+
+SELECTED_RUN = re.compile(b"[^\x00]+")
+
+class MaskIsland(object) :
+    __slots__ = ("x", "y", "w", "h", "runs")
+
+    def __init__(self, x, y, w, h, runs) :
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.runs = runs
+
+class IslandFinder(object) :
+    # Feed the mask in a strip of rows at a time, then call finish() to get the islands
+    def __init__(self, width, x=0, y=0) :
+        self.width = width
+        self.x = x
+        self.nextY = y
+        self.parents = []
+        self.labelRuns = []
+        self.previousRuns = []
+
+    def find_root(self, label) :
+        parents = self.parents
+        while parents[label] != label:
+            parents[label] = parents[parents[label]]
+            label = parents[label]
+        return label
+
+    def add_rows(self, data, numRows) :
+        width = self.width
+        parents = self.parents
+        labelRuns = self.labelRuns
+        for row in range(numRows):
+            y = self.nextY
+            runs = []
+            for match in SELECTED_RUN.finditer(bytes(data[row * width:(row + 1) * width])):
+                x1, x2 = match.start(), match.end()
+
+                # Join the run to every run it touches in the row above
+                label = None
+                for previousX1, previousX2, previousLabel in self.previousRuns:
+                    if previousX1 > x2:
+                        break
+                    if previousX2 >= x1:
+                        root = self.find_root(previousLabel)
+                        if label == None:
+                            label = root
+                        elif root != label:
+                            parents[root] = label
+                if label == None:
+                    label = len(parents)
+                    parents.append(label)
+                    labelRuns.append([])
+                labelRuns[label].append((y, self.x + x1, self.x + x2))
+                runs.append((x1, x2, label))
+            self.previousRuns = runs
+            self.nextY = y + 1
+
+    def finish(self) :
+        # Gather the runs of each island, in the order the islands were first found
+        islandRuns = {}
+        order = []
+        for label, runs in enumerate(self.labelRuns):
+            root = self.find_root(label)
+            if root not in islandRuns:
+                islandRuns[root] = []
+                order.append(root)
+            islandRuns[root].extend(runs)
+
+        islands = []
+        for root in order:
+            runs = islandRuns[root]
+            runs.sort()
+            x1 = min([run[1] for run in runs])
+            x2 = max([run[2] for run in runs])
+            y1, y2 = runs[0][0], runs[-1][0] + 1
+            islands.append(MaskIsland(x1, y1, x2 - x1, y2 - y1, runs))
+        return islands
+
+def find_islands(maskData, width, height, x=0, y=0) :
+    finder = IslandFinder(width, x, y)
+    finder.add_rows(maskData, height)
+    return finder.finish()
+
+def get_island_mask(island, maskData, maskX, maskY, maskWidth) :
+    # Cut the island's bounding box out of the mask, leaving out any other islands which overlap it
+    islandMask = bytearray(island.w * island.h)
+    for y, x1, x2 in island.runs:
+        start = (y - maskY) * maskWidth + (x1 - maskX)
+        islandStart = (y - island.y) * island.w + (x1 - island.x)
+        islandMask[islandStart:islandStart + (x2 - x1)] = maskData[start:start + (x2 - x1)]
+    return islandMask
+
+def get_row_runs(runs) :
+    # Group runs by row, joining any which touch
+    rows = {}
+    for y, x1, x2 in sorted(runs):
+        rowRuns = rows.setdefault(y, [])
+        if len(rowRuns) > 0 and rowRuns[-1][1] >= x1:
+            rowRuns[-1] = (rowRuns[-1][0], max(rowRuns[-1][1], x2))
+        else:
+            rowRuns.append((x1, x2))
+    return rows
+
+def find_island_holes(island) :
+    # Find the unselected pixels which are completely surrounded by the island, such as lettering left out of a
+    # magic wand selection of a balloon. The gaps between the island's runs are joined to the gaps in the row above
+    # (not diagonally, so they can't leak between diagonally touching runs), and any group of gaps which reaches the
+    # edge of the island's bounding box is outside it. Returns the runs of the holes
+    x1, x2 = island.x, island.x + island.w
+    y1, y2 = island.y, island.y + island.h
+    rows = get_row_runs(island.runs)
+    parents = []
+    outside = []
+    gapRuns = []
+    previousGaps = []
+
+    def find_root(label) :
+        while parents[label] != label:
+            parents[label] = parents[parents[label]]
+            label = parents[label]
+        return label
+
+    for y in range(y1, y2):
+        gaps = []
+        gapStart = x1
+        for runX1, runX2 in rows.get(y, []) + [(x2, x2)]:
+            if runX1 > gapStart:
+                gaps.append((gapStart, runX1))
+            gapStart = runX2
+
+        labelledGaps = []
+        for gapX1, gapX2 in gaps:
+            label = len(parents)
+            parents.append(label)
+            outside.append(y == y1 or y == y2 - 1 or gapX1 == x1 or gapX2 == x2)
+            gapRuns.append((y, gapX1, gapX2))
+            for previousX1, previousX2, previousLabel in previousGaps:
+                if previousX1 >= gapX2:
+                    break
+                if previousX2 > gapX1:
+                    root, previousRoot = find_root(label), find_root(previousLabel)
+                    if root != previousRoot:
+                        parents[previousRoot] = root
+                        outside[root] = outside[root] or outside[previousRoot]
+            labelledGaps.append((gapX1, gapX2, label))
+        previousGaps = labelledGaps
+
+    return [run for label, run in enumerate(gapRuns) if not outside[find_root(label)]]
+
+def shrink_runs(runs) :
+    # Shrink the runs by one pixel, keeping only the pixels whose four neighbours are all in a run
+    # This matches shrinking a selection by one pixel in GIMP
+    rows = get_row_runs(runs)
+    shrunk = []
+    for y in sorted(rows):
+        above, below = rows.get(y - 1, []), rows.get(y + 1, [])
+        for x1, x2 in rows[y]:
+            candidates = [(x1 + 1, x2 - 1)]
+            for neighbours in (above, below):
+                candidates = [(max(cx1, nx1), min(cx2, nx2)) for cx1, cx2 in candidates for nx1, nx2 in neighbours if nx1 < cx2 and nx2 > cx1]
+            shrunk.extend([(y, cx1, cx2) for cx1, cx2 in candidates if cx2 > cx1])
+    return shrunk
+
+def get_filled_island_mask(island, maskData, maskX, maskY, maskWidth, holes, shrink) :
+    # Cut the island out of the mask like get_island_mask, with its holes fully selected, and optionally shrunk
+    # Returns the mask and the runs of the pixels in it which are selected
+    islandMask = get_island_mask(island, maskData, maskX, maskY, maskWidth)
+    for y, x1, x2 in holes:
+        islandStart = (y - island.y) * island.w + (x1 - island.x)
+        islandMask[islandStart:islandStart + (x2 - x1)] = b"\xff" * (x2 - x1)
+    runs = island.runs + holes
+    if not shrink:
+        return islandMask, runs
+
+    runs = shrink_runs(runs)
+    shrunkMask = bytearray(island.w * island.h)
+    for y, x1, x2 in runs:
+        islandStart = (y - island.y) * island.w + (x1 - island.x)
+        shrunkMask[islandStart:islandStart + (x2 - x1)] = islandMask[islandStart:islandStart + (x2 - x1)]
+    return shrunkMask, runs
+
+def remove_enclosed_islands(islands, islandHoles) :
+    # Drop any island which is inside a hole of another island, as it will be included when the hole is filled
+    holeRows = {}
+    for holes in islandHoles:
+        for y, x1, x2 in holes:
+            holeRows.setdefault(y, []).append((x1, x2))
+    kept = []
+    for island, holes in zip(islands, islandHoles):
+        y, x, _ = island.runs[0]
+        if not any([x1 <= x < x2 for x1, x2 in holeRows.get(y, [])]):
+            kept.append((island, holes))
+    return kept
@@ -0,0 +1,50 @@
+# --------------------
+# LAYER TREE
+# Snapshots an image's layer tree in one walk, recording each layer's kind, position, size and the groups it is in,
+# so plugins can plan their work on every layer up front without asking GIMP for the same things again
+# The gimp module is passed in, so this can be used outside of GIMP
+# --------------------
+
+LAYER_KIND_GROUP = "group"
+LAYER_KIND_TEXT = "text"
+LAYER_KIND_RASTER = "raster"
+
+class LayerRecord(object) :
+    __slots__ = ("id", "layer", "kind", "x", "y", "w", "h", "groupPath")
+
+    def __init__(self, layer, kind, x, y, w, h, groupPath) :
+        self.id = layer.ID
+        self.layer = layer
+        self.kind = kind
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.groupPath = groupPath
+
+def snapshot_layer(gimp, layer, groupPath, records) :
+    # pygimp gives groups their own type, but text layers are only told apart by asking the PDB
+    if isinstance(layer, gimp.GroupLayer):
+        kind = LAYER_KIND_GROUP
+    elif gimp.pdb.gimp_item_is_text_layer(layer):
+        kind = LAYER_KIND_TEXT
+    else:
+        kind = LAYER_KIND_RASTER
+    x, y = layer.offsets
+    records.append(LayerRecord(layer, kind, x, y, layer.width, layer.height, groupPath))
+
+    if kind == LAYER_KIND_GROUP:
+        # Groups come before their children, in the same order as the layers dialog
+        childGroupPath = groupPath + (layer.name,)
+        for child in layer.layers:
+            snapshot_layer(gimp, child, childGroupPath, records)
+
+def snapshot_layer_tree(gimp, layers) :
+    # Returns a list of LayerRecords for the layers and everything inside them
+    records = []
+    for layer in layers:
+        snapshot_layer(gimp, layer, (), records)
+    return records
+
+def get_layer_records(records, kind) :
+    return [record for record in records if record.kind == kind]
@@ -0,0 +1,53 @@
+# --------------------
+# LOW MEMORY
+# The low memory mode of the upscale and mirror bleed plugins works on a duplicate of the image with undo disabled,
+# so GIMP doesn't keep a copy of every layer the plugin replaces. The original image is left untouched, to go back to
+# GIMP can't say how big an undo stack is, so the plugins estimate the memory saved from the layer buffers they replace,
+# less the memory the duplicate itself needs while the original is still open
+# The gimp module is passed in, so this can be used outside of GIMP
+# --------------------
+
+def get_image_bytes(gimp, img) :
+    # The size of the pixels of every layer in the image, including the projection of each layer group
+    numBytes = 0
+    layers = list(img.layers)
+    while len(layers) > 0:
+        layer = layers.pop()
+        numBytes = numBytes + layer.width * layer.height * layer.bpp
+        if isinstance(layer, gimp.GroupLayer):
+            layers.extend(layer.layers)
+    return numBytes
+
+def start_low_memory_run(gimp, img, layer) :
+    # Returns the duplicate of the image, the duplicate of the layer in it, and roughly how much memory the duplicate needs
+    tattoo = gimp.pdb.gimp_item_get_tattoo(layer)
+    duplicate = gimp.pdb.gimp_image_duplicate(img)
+    gimp.pdb.gimp_image_undo_disable(duplicate)
+    return duplicate, gimp.pdb.gimp_image_get_layer_by_tattoo(duplicate, tattoo), get_image_bytes(gimp, img)
+
+def finish_low_memory_run(gimp, duplicate, undoBytes, duplicateBytes) :
+    # Show the finished duplicate, with undo enabled again for any further editing
+    gimp.pdb.gimp_image_undo_enable(duplicate)
+    try:
+        gimp.pdb.gimp_display_new(duplicate)
+        gimp.pdb.gimp_displays_flush()
+        result = "opened as a new image"
+    except gimp.error:
+        # There are no displays when GIMP is run non-interactively, so the duplicate is just left open for the caller
+        result = "left open as image " + str(duplicate.ID)
+    savedBytes = undoBytes - duplicateBytes
+    if savedBytes > 0:
+        gimp.message("The result has been " + result + ". Working without undo saved about " + format_size(savedBytes) + " of memory")
+    else:
+        gimp.message("The result has been " + result + ". Working without undo saved no memory, as the duplicate needs as much as the undo steps would have")
+
+def cancel_low_memory_run(gimp, duplicate) :
+    gimp.pdb.gimp_image_delete(duplicate)
+
+def format_size(numBytes) :
+    size = float(numBytes)
+    for unit in ("bytes", "KB", "MB"):
+        if size < 1024.0:
+            return ("%d %s" if unit == "bytes" else "%.1f %s") % (size, unit)
+        size = size / 1024.0
+    return "%.1f GB" % size
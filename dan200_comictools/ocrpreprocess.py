@@ -0,0 +1,67 @@
+# --------------------
+# OCR PREPROCESSING
+# Prepares a crop for tesseract: flattens it over white, converts it to greyscale, scales it so its lines of text
+# are a height tesseract reads well, and binarizes it with Otsu's threshold. Coloured balloons and large scans
+# both make tesseract slower without making it any more accurate
+# --------------------
+
+from dan200_comictools.islands import find_islands
+from dan200_comictools.pixels import flatten_to_greyscale, get_otsu_threshold, resize_greyscale, threshold_greyscale
+
+# Glyphs are the groups of connected black pixels which don't touch the edge of the crop, aren't more than half as
+# big as it both ways, and aren't much longer than they are wide. Anything else is taken to be a balloon outline,
+# a tail, a panel border or a rule, which would otherwise be mistaken for a very tall or very short line of text
+GLYPH_MAX_FRACTION = 0.5
+GLYPH_MAX_ASPECT = 6
+GLYPH_MIN_HEIGHT = 4
+
+# The line height is only trusted when it is measured from at least this many glyphs, and is at least this high
+LINE_HEIGHT_MIN_GLYPHS = 3
+LINE_HEIGHT_MIN = 8
+
+INVERT_BINARY = bytes(bytearray([255 - value for value in range(256)]))
+
+def is_glyph(component, width, height) :
+    x1, y1, x2, y2 = component.x, component.y, component.x + component.w, component.y + component.h
+    if x1 == 0 or y1 == 0 or x2 == width or y2 == height:
+        return False
+    if component.w > width * GLYPH_MAX_FRACTION and component.h > height * GLYPH_MAX_FRACTION:
+        return False
+    if max(component.w, component.h) > GLYPH_MAX_ASPECT * min(component.w, component.h):
+        return False
+    return component.h >= GLYPH_MIN_HEIGHT
+
+def estimate_line_height(binary, width, height) :
+    # Find the glyphs, and join the ones whose rows overlap into lines of text
+    # Returns the median height of the lines, or None if there isn't enough text to tell
+    components = find_islands(bytes(binary).translate(INVERT_BINARY), width, height)
+    glyphRows = sorted([(component.y, component.y + component.h) for component in components if is_glyph(component, width, height)])
+    if len(glyphRows) < LINE_HEIGHT_MIN_GLYPHS:
+        return None
+    lines = []
+    for y1, y2 in glyphRows:
+        if len(lines) > 0 and y1 < lines[-1][1]:
+            lines[-1][1] = max(lines[-1][1], y2)
+        else:
+            lines.append([y1, y2])
+    heights = sorted([y2 - y1 for y1, y2 in lines])
+    lineHeight = heights[len(heights) // 2]
+    if lineHeight < LINE_HEIGHT_MIN:
+        return None
+    return lineHeight
+
+def preprocess_ocr_crop(data, width, height, bpp, targetLineHeight, minScale, maxScale) :
+    # Returns the binarized greyscale pixels and their new size
+    grey = flatten_to_greyscale(data, width, height, bpp)
+    threshold = get_otsu_threshold(grey)
+    scale = 1.0
+    if targetLineHeight > 0:
+        # Measure the text on a binarized copy at the original size, then resize the greyscale pixels
+        lineHeight = estimate_line_height(threshold_greyscale(grey, threshold), width, height)
+        if lineHeight != None:
+            scale = min(max(float(targetLineHeight) / float(lineHeight), minScale), maxScale)
+    newWidth, newHeight = max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)
+    if (newWidth, newHeight) != (width, height):
+        grey = resize_greyscale(grey, width, height, newWidth, newHeight)
+        threshold = get_otsu_threshold(grey)
+    return threshold_greyscale(grey, threshold), newWidth, newHeight
@@ -0,0 +1,265 @@
+# --------------------
+# OCR RESULTS
+# A compact model of Tesseract's OCR output, and single-pass parsers for its ALTO, TSV and hOCR output formats
+# Each parser returns a list of OCRPages, one for each image that was OCRed
+# --------------------
+
+import io
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+OCR_FORMATS = ("alto", "tsv", "hocr")
+
+# The extension tesseract gives to its output files in each format
+OCR_FORMAT_EXTENSIONS = {
+    "alto" : "xml",
+    "tsv" : "tsv",
+    "hocr" : "hocr",
+}
+
+class OCRWord(object) :
+    __slots__ = ("text", "x", "y", "w", "h")
+
+    def __init__(self, text, x, y, w, h) :
+        self.text = text
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+
+class OCRLine(object) :
+    __slots__ = ("x", "y", "w", "h", "words")
+
+    def __init__(self, x, y, w, h) :
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.words = []
+
+    @property
+    def text(self) :
+        return " ".join([word.text for word in self.words])
+
+class OCRBlock(object) :
+    __slots__ = ("x", "y", "w", "h", "lines")
+
+    def __init__(self, x, y, w, h) :
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.lines = []
+
+    @property
+    def text(self) :
+        return "\n".join([line.text for line in self.lines])
+
+class OCRPage(object) :
+    __slots__ = ("width", "height", "blocks")
+
+    def __init__(self, width, height) :
+        self.width = width
+        self.height = height
+        self.blocks = []
+
+def get_alto_box(element) :
+    # Tesseract always writes integers, but other ALTO producers may not
+    attrib = element.attrib
+    try:
+        return int(attrib["HPOS"]), int(attrib["VPOS"]), int(attrib["WIDTH"]), int(attrib["HEIGHT"])
+    except ValueError:
+        return int(float(attrib["HPOS"])), int(float(attrib["VPOS"])), int(float(attrib["WIDTH"])), int(float(attrib["HEIGHT"]))
+
+def parse_alto(source) :
+    # Only end events are used: words, lines and text blocks are collected as they finish, then claimed by their parent
+    pages = []
+    page = OCRPage(0, 0)
+    textBlocks = []
+    lines = []
+    words = []
+    localNames = {}
+    for _, element in ET.iterparse(source):
+        # Strip the namespace from the tag, so any version of the format can be read
+        tag = element.tag
+        name = localNames.get(tag)
+        if name == None:
+            name = tag[tag.rfind("}") + 1:]
+            localNames[tag] = name
+
+        if name == "String":
+            x, y, w, h = get_alto_box(element)
+            words.append(OCRWord(element.get("CONTENT"), x, y, w, h))
+
+        elif name == "TextLine":
+            line = OCRLine(*get_alto_box(element))
+            line.words = words
+            words = []
+            lines.append(line)
+            element.clear()
+
+        elif name == "TextBlock":
+            block = OCRBlock(*get_alto_box(element))
+            block.lines = lines
+            lines = []
+            textBlocks.append(block)
+
+        elif name == "ComposedBlock":
+            # Tesseract puts its TextBlocks in ComposedBlocks, which become one block each
+            # Any earlier TextBlocks which were not in a ComposedBlock are blocks on their own
+            numChildren = len([child for child in element if localNames.get(child.tag) == "TextBlock"])
+            numOrphans = len(textBlocks) - numChildren
+            page.blocks.extend(textBlocks[:numOrphans])
+            block = OCRBlock(*get_alto_box(element))
+            for textBlock in textBlocks[numOrphans:]:
+                block.lines.extend(textBlock.lines)
+            page.blocks.append(block)
+            textBlocks = []
+            element.clear()
+
+        elif name == "Page":
+            page.blocks.extend(textBlocks)
+            textBlocks = []
+            page.width = int(float(element.get("WIDTH", 0)))
+            page.height = int(float(element.get("HEIGHT", 0)))
+            pages.append(page)
+            page = OCRPage(0, 0)
+            element.clear()
+    return pages
+
+def parse_tsv(source) :
+    pages = []
+    page = None
+    block = None
+    line = None
+    for row in source:
+        if not isinstance(row, type(u"")):
+            row = row.decode("utf-8")
+        fields = row.rstrip("\r\n").split("\t", 11)
+        if len(fields) < 11 or fields[0] == "level":
+            continue
+
+        # Every row has a level, followed by some indices, then a box
+        level = int(fields[0])
+        x, y, w, h = int(fields[6]), int(fields[7]), int(fields[8]), int(fields[9])
+        if level == 1:
+            page = OCRPage(w, h)
+            pages.append(page)
+        elif level == 2:
+            block = OCRBlock(x, y, w, h)
+            page.blocks.append(block)
+        elif level == 4:
+            line = OCRLine(x, y, w, h)
+            block.lines.append(line)
+        elif level == 5:
+            text = fields[11] if len(fields) > 11 else ""
+            if text.strip() != "":
+                line.words.append(OCRWord(text, x, y, w, h))
+    return pages
+
+def get_hocr_box(element) :
+    # Find the bbox property in the element's title, which is a list of properties separated by semicolons
+    for prop in element.get("title", "").split(";"):
+        values = prop.split()
+        if len(values) == 5 and values[0] == "bbox":
+            x1, y1, x2, y2 = int(values[1]), int(values[2]), int(values[3]), int(values[4])
+            return x1, y1, x2 - x1, y2 - y1
+    return 0, 0, 0, 0
+
+HOCR_LINE_CLASSES = ("ocr_line", "ocr_caption", "ocr_header", "ocr_textfloat")
+
+def parse_hocr(source) :
+    pages = []
+    page = None
+    block = None
+    line = None
+    for event, element in ET.iterparse(source, events=("start", "end")):
+        cssClass = element.get("class")
+        if cssClass == None:
+            continue
+        if event == "start":
+            if cssClass == "ocr_page":
+                _, _, w, h = get_hocr_box(element)
+                page = OCRPage(w, h)
+            elif cssClass == "ocr_carea":
+                block = OCRBlock(*get_hocr_box(element))
+            elif cssClass in HOCR_LINE_CLASSES:
+                line = OCRLine(*get_hocr_box(element))
+
+        else:
+            if cssClass == "ocrx_word":
+                x, y, w, h = get_hocr_box(element)
+                line.words.append(OCRWord("".join(element.itertext()), x, y, w, h))
+            elif cssClass in HOCR_LINE_CLASSES:
+                block.lines.append(line)
+                line = None
+                element.clear()
+            elif cssClass == "ocr_carea":
+                page.blocks.append(block)
+                block = None
+            elif cssClass == "ocr_page":
+                pages.append(page)
+                page = None
+                element.clear()
+    return pages
+
+OCR_FORMAT_PARSERS = {
+    "alto" : parse_alto,
+    "tsv" : parse_tsv,
+    "hocr" : parse_hocr,
+}
+
+def parse_ocr_stream(stream, outputFormat) :
+    try:
+        return OCR_FORMAT_PARSERS[outputFormat](stream)
+    except (SyntaxError, AttributeError, IndexError, KeyError, TypeError) as err:
+        raise ValueError("Could not parse " + outputFormat + " output: " + str(err))
+
+def parse_ocr_file(path, outputFormat) :
+    with open(path, "rb") as f:
+        return parse_ocr_stream(f, outputFormat)
+
+def parse_ocr_data(data, outputFormat) :
+    return parse_ocr_stream(io.BytesIO(data), outputFormat)
+
+def scale_page(page, scaleX, scaleY) :
+    # Return a copy of the page with every box scaled, for images which were resized before they were OCRed
+    def scale_box(item, scaled) :
+        scaled.x = int(round(item.x * scaleX))
+        scaled.y = int(round(item.y * scaleY))
+        scaled.w = int(round((item.x + item.w) * scaleX)) - scaled.x
+        scaled.h = int(round((item.y + item.h) * scaleY)) - scaled.y
+        return scaled
+    scaledPage = OCRPage(int(round(page.width * scaleX)), int(round(page.height * scaleY)))
+    for block in page.blocks:
+        scaledBlock = scale_box(block, OCRBlock(0, 0, 0, 0))
+        for line in block.lines:
+            scaledLine = scale_box(line, OCRLine(0, 0, 0, 0))
+            scaledLine.words = [scale_box(word, OCRWord(word.text, 0, 0, 0, 0)) for word in line.words]
+            scaledBlock.lines.append(scaledLine)
+        scaledPage.blocks.append(scaledBlock)
+    return scaledPage
+
+def encode_page(page) :
+    # Convert a page to nested lists, which can be stored as JSON
+    return [page.width, page.height, [
+        [block.x, block.y, block.w, block.h, [
+            [line.x, line.y, line.w, line.h, [
+                [word.text, word.x, word.y, word.w, word.h] for word in line.words
+            ]] for line in block.lines
+        ]] for block in page.blocks
+    ]]
+
+def decode_page(data) :
+    width, height, blocks = data
+    page = OCRPage(width, height)
+    for x, y, w, h, lines in blocks:
+        block = OCRBlock(x, y, w, h)
+        for x, y, w, h, words in lines:
+            line = OCRLine(x, y, w, h)
+            line.words = [OCRWord(*word) for word in words]
+            block.lines.append(line)
+        page.blocks.append(block)
+    return page
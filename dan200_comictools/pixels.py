@@ -0,0 +1,272 @@
+# --------------------
+# PIXELS
+# Helpers for working with raw pixel data read from GIMP pixel regions
+# Pixel data is a byte string of interleaved channels, with alpha last if present
+# NumPy is used when it is installed, but everything also works without it
+# --------------------
+
+import array
+import re
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+UNSELECTED_RUN = re.compile(b"\x00+")
+
+# Lookup table for compositing a channel value over white, indexed by (value << 8) | alpha
+_blendOverWhiteTable = None
+
+def get_blend_over_white_table() :
+    global _blendOverWhiteTable
+    if _blendOverWhiteTable == None:
+        table = bytearray(256 * 256)
+        for value in range(256):
+            for alpha in range(256):
+                table[(value << 8) | alpha] = (value * alpha + 255 * (255 - alpha) + 127) // 255
+        _blendOverWhiteTable = table
+    return _blendOverWhiteTable
+
+def flatten_over_white(data, width, height, bpp) :
+    # Remove the alpha channel, compositing the pixels over a white background
+    # Returns the flattened data and the new number of channels
+    if bpp == 1 or bpp == 3:
+        return bytearray(data), bpp
+    numChannels = bpp - 1
+
+    if numpy != None:
+        pixels = numpy.frombuffer(bytes(data), dtype=numpy.uint8).reshape(height * width, bpp).astype(numpy.uint32)
+        alpha = pixels[:, numChannels:bpp]
+        flattened = (pixels[:, 0:numChannels] * alpha + 255 * (255 - alpha) + 127) // 255
+        return bytearray(flattened.astype(numpy.uint8).tobytes()), numChannels
+
+    data = bytearray(data)
+    table = get_blend_over_white_table()
+    alpha = data[numChannels::bpp]
+    flattened = bytearray(width * height * numChannels)
+    for channel in range(numChannels):
+        flattened[channel::numChannels] = bytearray(table[(value << 8) | a] for value, a in zip(data[channel::bpp], alpha))
+    return flattened, numChannels
+
+def apply_mask(data, width, height, bpp, mask) :
+    # Multiply the alpha channel by a mask with one byte per pixel, adding an alpha channel if there isn't one
+    # Returns the masked data and the new number of channels
+    hasAlpha = (bpp == 2 or bpp == 4)
+    maskedBpp = bpp if hasAlpha else bpp + 1
+
+    if numpy != None:
+        pixels = numpy.frombuffer(bytes(data), dtype=numpy.uint8).reshape(height * width, bpp)
+        maskValues = numpy.frombuffer(bytes(mask), dtype=numpy.uint8).astype(numpy.uint32)
+        masked = numpy.empty((height * width, maskedBpp), dtype=numpy.uint8)
+        if hasAlpha:
+            masked[:, 0:bpp - 1] = pixels[:, 0:bpp - 1]
+            masked[:, bpp - 1] = (pixels[:, bpp - 1].astype(numpy.uint32) * maskValues + 127) // 255
+        else:
+            masked[:, 0:bpp] = pixels
+            masked[:, bpp] = maskValues
+        return bytearray(masked.tobytes()), maskedBpp
+
+    masked = bytearray(width * height * maskedBpp)
+    for channel in range(maskedBpp - 1):
+        masked[channel::maskedBpp] = bytearray(data[channel::bpp])
+    if not hasAlpha:
+        masked[bpp::maskedBpp] = bytearray(mask)
+    elif len(bytes(mask).translate(None, b"\x00\xff")) == 0:
+        # The mask is only fully selected or unselected pixels, so clear the alpha of the unselected runs
+        alpha = bytearray(data[bpp - 1::bpp])
+        for run in UNSELECTED_RUN.finditer(bytes(mask)):
+            alpha[run.start():run.end()] = bytearray(run.end() - run.start())
+        masked[bpp - 1::maskedBpp] = alpha
+    else:
+        masked[bpp - 1::maskedBpp] = bytearray((a * m + 127) // 255 for a, m in zip(bytearray(data[bpp - 1::bpp]), bytearray(mask)))
+    return masked, maskedBpp
+
+def blend_over(src, dst, width, height, bpp, columnWeights, rowWeights) :
+    # Composite src over dst, where both have the same channels, fading src in by a weight from 0 to 1
+    # The weight of each pixel is the weight of its column multiplied by the weight of its row
+    hasAlpha = (bpp == 2 or bpp == 4)
+    numColours = bpp - 1 if hasAlpha else bpp
+
+    if numpy != None:
+        srcPixels = numpy.frombuffer(bytes(src), dtype=numpy.uint8).reshape(height, width, bpp).astype(numpy.float64)
+        dstPixels = numpy.frombuffer(bytes(dst), dtype=numpy.uint8).reshape(height, width, bpp).astype(numpy.float64)
+        alpha = numpy.outer(numpy.array(rowWeights, dtype=numpy.float64), numpy.array(columnWeights, dtype=numpy.float64))[:, :, None]
+        if hasAlpha:
+            alpha = alpha * srcPixels[:, :, bpp - 1:bpp] / 255.0
+            dstAlpha = dstPixels[:, :, bpp - 1:bpp] / 255.0
+            outAlpha = alpha + dstAlpha * (1.0 - alpha)
+            colours = (srcPixels[:, :, 0:numColours] * alpha + dstPixels[:, :, 0:numColours] * dstAlpha * (1.0 - alpha)) / numpy.maximum(outAlpha, 1e-9)
+            blended = numpy.concatenate((colours, outAlpha * 255.0), axis=2)
+            blended = numpy.where(outAlpha > 0.0, blended, dstPixels)
+        else:
+            blended = srcPixels * alpha + dstPixels * (1.0 - alpha)
+        return bytearray(numpy.floor(blended + 0.5).astype(numpy.uint8).tobytes())
+
+    src = bytearray(src)
+    blended = bytearray(dst)
+    for row in range(height):
+        rowWeight = rowWeights[row]
+        for column in range(width):
+            i = (row * width + column) * bpp
+            alpha = columnWeights[column] * rowWeight
+            if hasAlpha:
+                alpha = alpha * src[i + bpp - 1] / 255.0
+                dstAlpha = blended[i + bpp - 1] / 255.0
+                outAlpha = alpha + dstAlpha * (1.0 - alpha)
+                if outAlpha <= 0.0:
+                    continue
+                for channel in range(numColours):
+                    blended[i + channel] = int((src[i + channel] * alpha + blended[i + channel] * dstAlpha * (1.0 - alpha)) / outAlpha + 0.5)
+                blended[i + bpp - 1] = int(outAlpha * 255.0 + 0.5)
+            else:
+                for channel in range(numColours):
+                    blended[i + channel] = int(src[i + channel] * alpha + blended[i + channel] * (1.0 - alpha) + 0.5)
+    return blended
+
+def get_luminance(r, g, b) :
+    # The Rec. 601 weights, in 8 bit fixed point
+    return (r * 77 + g * 150 + b * 29 + 128) >> 8
+
+def flatten_to_greyscale(data, width, height, bpp) :
+    # Composite the pixels over white and convert them to one luminance channel
+    if bpp == 1:
+        return bytearray(data)
+
+    if numpy != None:
+        flattened, numChannels = flatten_over_white(data, width, height, bpp)
+        if numChannels == 1:
+            return flattened
+        pixels = numpy.frombuffer(bytes(flattened), dtype=numpy.uint8).reshape(height * width, numChannels).astype(numpy.uint32)
+        grey = (pixels[:, 0] * 77 + pixels[:, 1] * 150 + pixels[:, 2] * 29 + 128) >> 8
+        return bytearray(grey.astype(numpy.uint8).tobytes())
+
+    # Without NumPy, read each pixel as one integer and convert each distinct value only once
+    # Artwork has far fewer distinct colours than pixels, so the per pixel work is a dictionary lookup done in C
+    data = bytearray(data)
+    numPixels = width * height
+    if bpp == 2:
+        typecode, packed = "H", data
+    else:
+        typecode = "I" if array.array("I").itemsize == 4 else "L"
+        if bpp == 3:
+            packed = bytearray(numPixels * 4)
+            for channel in range(3):
+                packed[channel::4] = data[channel::3]
+            packed[3::4] = b"\xff" * numPixels
+        else:
+            packed = data
+    pixels = array.array(typecode, bytes(packed))
+    table = get_blend_over_white_table()
+    shifts = [8 * index for index in range(len(packed) // numPixels)]
+    if sys.byteorder == "big":
+        shifts.reverse()
+    luminance = {}
+    for value in set(pixels):
+        channels = [(value >> shift) & 255 for shift in shifts]
+        alpha = channels[-1]
+        flattened = [table[(channel << 8) | alpha] for channel in channels[:-1]]
+        luminance[value] = flattened[0] if len(flattened) == 1 else get_luminance(*flattened)
+    return bytearray(map(luminance.__getitem__, pixels))
+
+def resize_greyscale(data, width, height, newWidth, newHeight) :
+    # Shrink by averaging the box of pixels under each new pixel, or grow by repeating pixels
+    if (newWidth, newHeight) == (width, height):
+        return bytearray(data)
+
+    if numpy != None:
+        pixels = numpy.frombuffer(bytes(data), dtype=numpy.uint8).reshape(height, width)
+        if newWidth <= width and newHeight <= height:
+            # Sum each box from an integral image
+            integral = numpy.zeros((height + 1, width + 1), dtype=numpy.int64)
+            integral[1:, 1:] = pixels.astype(numpy.int64).cumsum(axis=0).cumsum(axis=1)
+            xs = numpy.round(numpy.arange(newWidth + 1) * (float(width) / newWidth)).astype(numpy.int64)
+            ys = numpy.round(numpy.arange(newHeight + 1) * (float(height) / newHeight)).astype(numpy.int64)
+            sums = integral[ys[1:]][:, xs[1:]] - integral[ys[:-1]][:, xs[1:]] - integral[ys[1:]][:, xs[:-1]] + integral[ys[:-1]][:, xs[:-1]]
+            areas = numpy.outer(ys[1:] - ys[:-1], xs[1:] - xs[:-1])
+            return bytearray(((sums + areas // 2) // areas).astype(numpy.uint8).tobytes())
+        columns = numpy.minimum(((numpy.arange(newWidth) + 0.5) * (float(width) / newWidth)).astype(numpy.int64), width - 1)
+        rows = numpy.minimum(((numpy.arange(newHeight) + 0.5) * (float(height) / newHeight)).astype(numpy.int64), height - 1)
+        return bytearray(pixels[rows][:, columns].tobytes())
+
+    # Without NumPy, take the pixel nearest the centre of each new pixel
+    data = bytes(data)
+    columns = [min(int((column + 0.5) * width / float(newWidth)), width - 1) for column in range(newWidth)]
+    resized = bytearray(newWidth * newHeight)
+    for row in range(newHeight):
+        sourceRow = min(int((row + 0.5) * height / float(newHeight)), height - 1)
+        rowData = bytearray(data[sourceRow * width:(sourceRow + 1) * width])
+        resized[row * newWidth:(row + 1) * newWidth] = bytearray([rowData[column] for column in columns])
+    return resized
+
+def get_otsu_threshold(data) :
+    # Find the threshold which best separates the histogram of a greyscale image into dark and light pixels
+    data = bytes(data)
+    if numpy != None:
+        histogram = numpy.bincount(numpy.frombuffer(data, dtype=numpy.uint8), minlength=256).tolist()
+    else:
+        # Only count the values which appear
+        histogram = [0] * 256
+        for value in set(bytearray(data)):
+            histogram[value] = data.count(bytes(bytearray([value])))
+    total = sum(histogram)
+    totalSum = sum([value * count for value, count in enumerate(histogram)])
+    bestThreshold, bestVariance = 128, -1.0
+    darkCount, darkSum = 0, 0
+    for value in range(256):
+        darkCount = darkCount + histogram[value]
+        darkSum = darkSum + value * histogram[value]
+        lightCount = total - darkCount
+        if darkCount == 0 or lightCount == 0:
+            continue
+        darkMean = float(darkSum) / darkCount
+        lightMean = float(totalSum - darkSum) / lightCount
+        variance = float(darkCount) * lightCount * (darkMean - lightMean) ** 2
+        if variance > bestVariance:
+            bestThreshold, bestVariance = value + 1, variance
+    return bestThreshold
+
+def threshold_greyscale(data, threshold) :
+    # Make every pixel darker than the threshold black, and every other pixel white
+    table = bytes(bytearray([0 if value < threshold else 255 for value in range(256)]))
+    return bytearray(bytes(data).translate(table))
+
+def encode_pnm(data, width, height, bpp) :
+    # Encode the pixels as a binary PGM or PPM image, which most tools can read without any decompression
+    flattened, numChannels = flatten_over_white(data, width, height, bpp)
+    magic = "P5" if numChannels == 1 else "P6"
+    header = (magic + "\n" + str(width) + " " + str(height) + "\n255\n").encode("ascii")
+    return bytes(header) + bytes(flattened)
+
+def flip_vertical(data, width, height, bpp) :
+    # Reverse the order of the rows
+    if numpy != None:
+        pixels = numpy.frombuffer(bytes(data), dtype=numpy.uint8).reshape(height, width * bpp)
+        return bytearray(pixels[::-1].tobytes())
+
+    stride = width * bpp
+    data = bytearray(data)
+    flipped = bytearray(len(data))
+    for row in range(height):
+        flipped[row * stride:(row + 1) * stride] = data[(height - 1 - row) * stride:(height - row) * stride]
+    return flipped
+
+def flip_horizontal(data, width, height, bpp) :
+    # Reverse the order of the pixels in each row
+    if numpy != None:
+        pixels = numpy.frombuffer(bytes(data), dtype=numpy.uint8).reshape(height, width, bpp)
+        return bytearray(pixels[:, ::-1, :].tobytes())
+
+    # Reversing the whole buffer rotates the pixels by 180 degrees, but also reverses the channels in each pixel
+    # Put the channels back in order, then flip the rows back over
+    reversedData = bytearray(data)[::-1]
+    rotated = bytearray(len(reversedData))
+    for channel in range(bpp):
+        rotated[channel::bpp] = reversedData[(bpp - 1 - channel)::bpp]
+    return flip_vertical(rotated, width, height, bpp)
+
+def crop_pixels(data, width, bpp, x, y, w, h) :
+    # Cut a rectangle out of pixel data which is width pixels wide
+    stride = width * bpp
+    return b"".join([bytes(data[(y + row) * stride + x * bpp:(y + row) * stride + (x + w) * bpp]) for row in range(h)])
@@ -0,0 +1,73 @@
+# --------------------
+# TEXT METRICS
+# Tables of the advance of each glyph of a font and the kerning between pairs of glyphs, measured once at a
+# reference size and scaled linearly, so the size of a line or block of text can be worked out without asking
+# GIMP to lay it out
+# --------------------
+
+class GlyphAdvanceTable(object) :
+    def __init__(self, referenceSize, lineHeight, advances=None, kerning=None) :
+        self.referenceSize = referenceSize
+        self.lineHeight = lineHeight
+        self.advances = advances if advances != None else {}
+        self.kerning = kerning if kerning != None else {}
+
+    def get_missing_glyphs(self, text) :
+        return set([glyph for glyph in text if glyph != "\n" and glyph not in self.advances])
+
+    def get_missing_pairs(self, text) :
+        missing = set()
+        for line in text.split("\n"):
+            for index in range(len(line) - 1):
+                pair = line[index:index + 2]
+                if pair not in self.kerning:
+                    missing.add(pair)
+        return missing
+
+    def get_line_width(self, line, fontSize) :
+        # Every glyph and pair in the line must have been measured
+        width = 0.0
+        for index, glyph in enumerate(line):
+            width = width + self.advances[glyph]
+            if index > 0:
+                width = width + self.kerning[line[index - 1:index + 1]]
+        return width * float(fontSize) / float(self.referenceSize)
+
+    def get_block_height(self, numLines, fontSize) :
+        return self.lineHeight * max(numLines, 1) * float(fontSize) / float(self.referenceSize)
+
+    def to_json(self) :
+        return {
+            "referenceSize" : self.referenceSize,
+            "lineHeight" : self.lineHeight,
+            "advances" : self.advances,
+            "kerning" : self.kerning,
+        }
+
+    @staticmethod
+    def from_json(data) :
+        try:
+            return GlyphAdvanceTable(data["referenceSize"], data["lineHeight"], dict(data["advances"]), dict(data["kerning"]))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+class MeasurementErrors(object) :
+    # Collects how far the table's measurements are from GIMP's, for comparison runs
+    def __init__(self, name) :
+        self.name = name
+        self.count = 0
+        self.totalError = 0.0
+        self.totalRelativeError = 0.0
+        self.maxError = 0.0
+
+    def add(self, estimate, actual) :
+        error = abs(float(estimate) - float(actual))
+        self.count = self.count + 1
+        self.totalError = self.totalError + error
+        self.totalRelativeError = self.totalRelativeError + error / max(float(actual), 1.0)
+        self.maxError = max(self.maxError, error)
+
+    def summary(self) :
+        if self.count == 0:
+            return self.name + ": nothing measured"
+        return "%s: %d measured, mean error %.2f px (%.1f%%), max error %.2f px" % (self.name, self.count, self.totalError / self.count, 100.0 * self.totalRelativeError / self.count, self.maxError)